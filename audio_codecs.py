@@ -0,0 +1,221 @@
+"""
+Codecs de payload RTP compartidos por cliente y servidor.
+
+- "l16": PCM s16le crudo (el modo de siempre, 1920 bytes por frame).
+- "pcmu": G.711 μ-law, 1 byte por sample (2x más chico). Encoder y decoder
+  vectorizados con numpy mediante tablas de búsqueda.
+- "adpcm": IMA/DVI ADPCM, 4 bits por sample (4x más chico). Cada paquete lleva
+  la cabecera de estado de DVI4 (RFC 3551, 4.5.1: predictor int16 + índice de
+  paso + reservado), así se decodifica sin depender de paquetes anteriores y una
+  pérdida no arrastra error. La adaptación del paso es secuencial por naturaleza:
+  se usa audioop cuando está disponible (C) y si no un bucle con tablas; el
+  empaquetado de nibbles es vectorizado.
+
+El codec se anuncia en la metadata del canal y cada uno usa su payload type
+dinámico, así el servidor también lo reconoce por paquete.
+"""
+import struct
+import warnings
+
+import numpy as np
+
+from config import PAYLOAD_TYPE
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop  # Quitado en Python 3.13: ahí se puede instalar `audioop-lts`
+except ImportError:
+    audioop = None
+
+# --- G.711 μ-law ---
+ULAW_BIAS = 0x84
+ULAW_CLIP = 32635
+
+
+def _build_ulaw_tables():
+    # Decoder: los 256 códigos posibles
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = (((codes & 0x0F) << 3) + ULAW_BIAS) << ((codes & 0x70) >> 4)
+    decode = np.where(codes & 0x80, ULAW_BIAS - magnitude, magnitude - ULAW_BIAS).astype("<i2")
+    # Encoder: los 65536 samples posibles, indexados por el sample visto como uint16.
+    # Se trabaja en 14 bits como la implementación de referencia (y audioop)
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), ULAW_CLIP >> 2) + (ULAW_BIAS >> 2)
+    segment = np.zeros(65536, dtype=np.int32)
+    for segment_end in (0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF):
+        segment += magnitude > segment_end
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    encode = (((segment << 4) | mantissa) ^ mask).astype(np.uint8)
+    return encode, decode
+
+
+ULAW_ENCODE_TABLE, ULAW_DECODE_TABLE = _build_ulaw_tables()
+
+# --- IMA/DVI ADPCM ---
+ADPCM_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+ADPCM_STEP_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+]
+DVI4_HEADER = struct.Struct("!hBx")  # Predictor, índice de paso, reservado
+
+
+def _build_adpcm_decode_tables():
+    # Para cada (índice de paso, nibble): diferencia a sumar al predictor y próximo índice
+    vpdiff = []
+    next_index = []
+    for index, step in enumerate(ADPCM_STEP_TABLE):
+        for delta in range(16):
+            diff = step >> 3
+            if delta & 4:
+                diff += step
+            if delta & 2:
+                diff += step >> 1
+            if delta & 1:
+                diff += step >> 2
+            vpdiff.append(-diff if delta & 8 else diff)
+            next_index.append(min(88, max(0, index + ADPCM_INDEX_TABLE[delta])))
+    return vpdiff, next_index
+
+
+ADPCM_VPDIFF, ADPCM_NEXT_INDEX = _build_adpcm_decode_tables()
+
+
+def _adpcm_encode_samples(samples, valpred, index):
+    """Encoder IMA (mismo algoritmo que audioop.lin2adpcm). Devuelve (nibbles, valpred, index)."""
+    step_table = ADPCM_STEP_TABLE
+    index_table = ADPCM_INDEX_TABLE
+    nibbles = bytearray(len(samples))
+    step = step_table[index]
+    for i, sample in enumerate(samples):
+        diff = sample - valpred
+        if diff < 0:
+            sign = 8
+            diff = -diff
+        else:
+            sign = 0
+        delta = 0
+        vpdiff = step >> 3
+        if diff >= step:
+            delta = 4
+            diff -= step
+            vpdiff += step
+        half = step >> 1
+        if diff >= half:
+            delta |= 2
+            diff -= half
+            vpdiff += half
+        quarter = step >> 2
+        if diff >= quarter:
+            delta |= 1
+            vpdiff += quarter
+        if sign:
+            valpred -= vpdiff
+            if valpred < -32768:
+                valpred = -32768
+        else:
+            valpred += vpdiff
+            if valpred > 32767:
+                valpred = 32767
+        delta |= sign
+        index += index_table[delta]
+        if index < 0:
+            index = 0
+        elif index > 88:
+            index = 88
+        step = step_table[index]
+        nibbles[i] = delta
+    return nibbles, valpred, index
+
+
+def _adpcm_decode_nibbles(nibbles, valpred, index):
+    vpdiff_table = ADPCM_VPDIFF
+    next_index = ADPCM_NEXT_INDEX
+    out = np.empty(len(nibbles), dtype="<i2")
+    for i, delta in enumerate(nibbles):
+        key = (index << 4) | delta
+        valpred += vpdiff_table[key]
+        if valpred > 32767:
+            valpred = 32767
+        elif valpred < -32768:
+            valpred = -32768
+        index = next_index[key]
+        out[i] = valpred
+    return out
+
+
+class L16Codec:
+    """PCM s16le sin comprimir."""
+    name = "l16"
+    payload_type = PAYLOAD_TYPE
+
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, payload):
+        return payload
+
+
+class PCMUCodec:
+    """G.711 μ-law por tabla: un byte por sample."""
+    name = "pcmu"
+    payload_type = 97
+
+    def encode(self, pcm):
+        return ULAW_ENCODE_TABLE[np.frombuffer(pcm, dtype="<u2")].tobytes()
+
+    def decode(self, payload):
+        return ULAW_DECODE_TABLE[np.frombuffer(payload, dtype=np.uint8)].tobytes()
+
+
+class ADPCMCodec:
+    """
+    IMA/DVI ADPCM con cabecera DVI4 por paquete. El encoder mantiene el estado
+    entre paquetes (continuidad); el decoder arranca cada paquete de su cabecera.
+    """
+    name = "adpcm"
+    payload_type = 98
+
+    def __init__(self):
+        self.valpred = 0
+        self.index = 0
+
+    def encode(self, pcm):
+        header = DVI4_HEADER.pack(self.valpred, self.index)
+        if audioop is not None:
+            data, (self.valpred, self.index) = audioop.lin2adpcm(pcm, 2, (self.valpred, self.index))
+            return header + data
+        samples = np.frombuffer(pcm, dtype="<i2")
+        nibbles, self.valpred, self.index = _adpcm_encode_samples(samples.tolist(), self.valpred, self.index)
+        # Dos samples por byte, el primero en el nibble alto (igual que DVI4 y audioop)
+        packed = np.frombuffer(nibbles, dtype=np.uint8)
+        if len(packed) % 2:
+            packed = np.append(packed, 0)
+        return header + ((packed[0::2] << 4) | packed[1::2]).tobytes()
+
+    def decode(self, payload):
+        valpred, index = DVI4_HEADER.unpack_from(payload)
+        data = payload[DVI4_HEADER.size:]
+        if audioop is not None:
+            pcm, _ = audioop.adpcm2lin(data, 2, (valpred, index))
+            return pcm
+        packed = np.frombuffer(data, dtype=np.uint8)
+        nibbles = np.empty(2 * len(packed), dtype=np.uint8)
+        nibbles[0::2] = packed >> 4
+        nibbles[1::2] = packed & 0x0F
+        return _adpcm_decode_nibbles(nibbles.tolist(), valpred, index).tobytes()
+
+
+CODECS = {codec.name: codec for codec in (L16Codec, PCMUCodec, ADPCMCodec)}
+CODECS_BY_PAYLOAD_TYPE = {codec.payload_type: codec for codec in CODECS.values()}
+
+
+def get_codec(name):
+    """Instancia nueva del codec (cada stream necesita la suya: ADPCM guarda estado)."""
+    return CODECS[name]()
@@ -0,0 +1,129 @@
+"""
+Benchmark de los modos de captura del cliente: ffmpeg, parec y native
+(libpulse-simple en el proceso). Mide CPU y memoria por canal.
+
+Arma un entorno local: N null-sinks (uno por canal) con un tono reproducido en
+cada uno por `pacat`, y N sesiones capturando el .monitor de su sink y enviando
+RTP a un socket UDP local que no se lee. Para cada modo se corre DURATION
+segundos y se reporta CPU (% de un core, proceso Python + hijos de captura) y RSS
+(Python + hijos) divididos por canal. Los `pacat` del tono no se cuentan.
+
+Necesita un servidor PulseAudio o pipewire-pulse corriendo (p. ej. `pulseaudio
+--start` en una sesión sin audio real alcanza: los null-sinks no usan hardware).
+
+Uso:
+    python benchmarks/bench_capture.py [--channels 4] [--duration 20] [--modes ffmpeg parec native]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import psutil
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "client"))
+from config import SAMPLE_RATE
+import audio_client_session
+import rtp_client
+from audio_client_session import AudioClientSession, load_null_sink, unload_module
+from pulse_native import native_capture_available
+
+
+def start_tone(sink_name, frequency):
+    """Reproduce un tono continuo en el sink con pacat (se alimenta desde un hilo)."""
+    player = subprocess.Popen(["pacat", "--playback", f"--device={sink_name}", "--format=s16le",
+                               f"--rate={SAMPLE_RATE}", "--channels=1", "--latency-msec=100"],
+                              stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    second = (8000 * np.sin(2 * np.pi * frequency * t)).astype("<i2").tobytes()
+
+    def feed():
+        try:
+            while True:
+                player.stdin.write(second)
+        except (BrokenPipeError, ValueError):
+            pass
+
+    threading.Thread(target=feed, daemon=True).start()
+    return player
+
+
+def run_mode(formato, sinks, duration):
+    process = psutil.Process()
+    sessions = []
+    for index, sink_name in enumerate(sinks):
+        session = AudioClientSession(70000 + index)
+        session.waiting_audio = False
+        session.start_audio_recording(sink_name, formato)
+        sessions.append(session)
+    time.sleep(2)  # Arranque de los hijos de captura fuera de la medición
+
+    def tree():
+        return [process] + [child for child in process.children(recursive=True) if child.name() != "pacat"]
+
+    procs = tree()
+    cpu_start = sum(sum(p.cpu_times()[:2]) for p in procs)
+    start = time.monotonic()
+    rss_samples = []
+    while time.monotonic() - start < duration:
+        time.sleep(1)
+        rss_samples.append(sum(p.memory_info().rss for p in tree()))
+    procs = tree()
+    cpu = sum(sum(p.cpu_times()[:2]) for p in procs) - cpu_start
+    elapsed = time.monotonic() - start
+    for session in sessions:
+        session.cleanup()
+    channels = len(sinks)
+    return 100 * cpu / elapsed / channels, max(rss_samples) / channels / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--modes", nargs="+", default=["ffmpeg", "parec", "native"])
+    args = parser.parse_args()
+
+    if "native" in args.modes and not native_capture_available():
+        print("libpulse-simple no disponible: se omite el modo native")
+        args.modes.remove("native")
+    # El log por paquete es igual en todos los modos y escribiría en client/logs
+    rtp_client.log_and_save = audio_client_session.log_and_save = lambda *args: None
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    dest = sink.getsockname()
+    audio_client_session.create_rtp_sender = lambda ssrc, sequence_number=0, sock=None, placement=None: \
+        rtp_client.RTPSender(ssrc, sequence_number, dest=dest, sock=sock)
+
+    sinks = []
+    players = []
+    try:
+        for index in range(args.channels):
+            sink_name, module_id = load_null_sink()
+            if not sink_name:
+                sys.exit("No se pudo crear el null-sink (¿está corriendo PulseAudio?)")
+            sinks.append((sink_name, module_id))
+            players.append(start_tone(sink_name, 300 + 110 * index))
+
+        print(f"{args.channels} canales, {args.duration:.0f} s por modo")
+        print(f"{'modo':<10}{'CPU %/canal':>14}{'RSS MB/canal':>14}")
+        for formato in args.modes:
+            cpu, rss = run_mode(formato, [name for name, _ in sinks], args.duration)
+            print(f"{formato:<10}{cpu:>14.2f}{rss:>14.1f}")
+    finally:
+        for player in players:
+            player.kill()
+        for _, module_id in sinks:
+            unload_module(module_id)
+        sink.close()
+
+
+if __name__ == "__main__":
+    main()
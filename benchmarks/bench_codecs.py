@@ -0,0 +1,72 @@
+"""
+Benchmark de los codecs de payload (audio_codecs.py): throughput de encoder y
+decoder por frame de 20 ms, en MB/s de PCM, veces tiempo real y % de un core
+por stream. ADPCM se mide con audioop (si está) y con el camino sin audioop.
+
+Uso:
+    python benchmarks/bench_codecs.py [--frames 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from config import FRAME_SIZE, SAMPLE_RATE
+import audio_codecs
+from audio_codecs import get_codec
+
+FRAME_BYTES = FRAME_SIZE * 2
+
+
+def synth_frames(count, seed=1234):
+    rng = np.random.default_rng(seed)
+    t = np.arange(count * FRAME_SIZE) / SAMPLE_RATE
+    signal = 6000 * np.sin(2 * np.pi * 440 * t) + 3000 * np.sin(2 * np.pi * 1250 * t) + rng.normal(0, 500, t.size)
+    pcm = signal.clip(-32768, 32767).astype("<i2").tobytes()
+    return [pcm[i:i + FRAME_BYTES] for i in range(0, len(pcm), FRAME_BYTES)]
+
+
+def throughput(func, items):
+    start = time.process_time()
+    for item in items:
+        func(item)
+    return (time.process_time() - start) / len(items)
+
+
+def report(label, direction, per_frame):
+    realtime = (FRAME_SIZE / SAMPLE_RATE) / per_frame
+    mb_s = FRAME_BYTES / per_frame / 1e6
+    print(f"{label:<18}{direction:<8}{per_frame * 1e6:>10.1f}{mb_s:>10.1f}{realtime:>12.0f}{100 / realtime:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    frames = synth_frames(args.frames)
+    variants = [("pcmu", "pcmu", audio_codecs.audioop)]
+    if audio_codecs.audioop is not None:
+        variants.append(("adpcm (audioop)", "adpcm", audio_codecs.audioop))
+    variants.append(("adpcm (python)", "adpcm", None))
+
+    print(f"{'codec':<18}{'':<8}{'us/frame':>10}{'MB/s':>10}{'x realtime':>12}{'CPU %/str':>12}")
+    fast_path = audio_codecs.audioop
+    for label, name, backend in variants:
+        audio_codecs.audioop = backend
+        try:
+            encoder = get_codec(name)
+            packets = [encoder.encode(frame) for frame in frames]
+            report(label, "encode", throughput(get_codec(name).encode, frames))
+            report(label, "decode", throughput(get_codec(name).decode, packets))
+        finally:
+            audio_codecs.audioop = fast_path
+        print(f"{'':<18}payload {len(packets[0])} bytes/frame ({FRAME_BYTES / len(packets[0]):.1f}x más chico)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark del receptor RTP del servidor: compara paquetes/seg procesados por el
+listener con hilo bloqueante ("thread") contra el receptor asyncio por lotes y
+el listener recv_into con pool de buffers preasignados.
+
+Cada modo corre en un proceso propio (estado de clientes limpio) recibiendo en
+127.0.0.1 desde un proceso emisor que inyecta tráfico RTP de N SSRCs tan rápido
+como puede. Los WAV se escriben en un directorio temporal que se borra al final.
+
+Uso:
+    python benchmarks/bench_receiver.py [--streams 50] [--seconds 5] [--modes thread asyncio recv_into]
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "server"))
+from config import FRAME_SIZE
+
+RTP_HEADER = struct.Struct("!BBHII")
+PAYLOAD = b"\x01\x00" * FRAME_SIZE
+WARMUP_SECONDS = 1.0
+
+
+def blast(port, streams, stop_event):
+    """Envía paquetes RTP en round-robin sobre `streams` SSRCs hasta stop_event."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect(("127.0.0.1", port))
+    seqs = [0] * streams
+    ssrcs = [10000 + i for i in range(streams)]
+    while not stop_event.is_set():
+        for i in range(streams):
+            seq = seqs[i]
+            header = RTP_HEADER.pack(0x80, 96, seq, (seq * FRAME_SIZE) & 0xFFFFFFFF, ssrcs[i])
+            try:
+                sock.send(header + PAYLOAD)
+            except OSError:
+                pass  # ENOBUFS: el receptor no da abasto, se sigue intentando
+            seqs[i] = (seq + 1) & 0xFFFF
+    sock.close()
+
+
+def run_receiver(mode, streams, seconds, results):
+    workdir = tempfile.mkdtemp(prefix="bench-rx-")
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, "w")  # el log por paquete no debe ensuciar la salida
+    import rtp_server
+
+    sock = rtp_server.create_rtp_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    threading.Thread(target=rtp_server.RECEIVERS[mode], args=(sock,), daemon=True).start()
+
+    ctx = multiprocessing.get_context("fork")
+    stop_event = ctx.Event()
+    sender = ctx.Process(target=blast, args=(port, streams, stop_event), daemon=True)
+    sender.start()
+
+    time.sleep(WARMUP_SECONDS)
+    gc_start = sum(stat["collections"] for stat in gc.get_stats())
+    packets_start = rtp_server.rx_stats['packets']
+    batches_start = rtp_server.rx_stats['batches']
+    cpu_start = time.process_time()
+    t_start = time.perf_counter()
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - t_start
+    cpu = time.process_time() - cpu_start
+    packets = rtp_server.rx_stats['packets'] - packets_start
+    batches = rtp_server.rx_stats['batches'] - batches_start
+    gc_runs = sum(stat["collections"] for stat in gc.get_stats()) - gc_start
+
+    stop_event.set()
+    sender.join(timeout=2)
+    shutil.rmtree(workdir, ignore_errors=True)
+    results.put({
+        "mode": mode,
+        "pps": packets / elapsed,
+        "cpu_pct": 100.0 * cpu / elapsed,
+        "avg_batch": (packets / batches) if batches else 1.0,
+        "gc_runs": gc_runs,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--modes", nargs="+", default=["thread", "asyncio", "recv_into"])
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    rows = []
+    for mode in args.modes:
+        proc = ctx.Process(target=run_receiver, args=(mode, args.streams, args.seconds, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{args.streams} SSRCs, {args.seconds:.0f}s por modo (cada stream real = 50 pps)")
+    print(f"{'modo':<10}{'paquetes/s':>14}{'streams@50pps':>16}{'CPU %':>9}{'lote medio':>12}{'GC runs':>9}")
+    for row in rows:
+        print(f"{row['mode']:<10}{row['pps']:>14.0f}{row['pps'] / 50:>16.1f}{row['cpu_pct']:>9.1f}{row['avg_batch']:>12.1f}{row['gc_runs']:>9}")
+
+
+if __name__ == "__main__":
+    main()
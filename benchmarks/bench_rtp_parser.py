@@ -0,0 +1,66 @@
+"""
+Micro-benchmark del parseo RTP en el servidor: librería `rtp`
+(RTP().fromBytearray(bytearray(data))) contra server/rtp_parser.parse_rtp_header.
+
+Mide ns/paquete para un paquete de audio típico (12 + 1920 bytes) y para el
+datagrama de texto "HANDSHAKE:<ssrc>" que el cliente envía al puerto RTP.
+
+Uso:
+    python benchmarks/bench_rtp_parser.py [--number 200000]
+"""
+import argparse
+import os
+import struct
+import sys
+import timeit
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "server"))
+from config import FRAME_SIZE
+from rtp_parser import parse_rtp_header
+
+AUDIO_PACKET = struct.pack("!BBHII", 0x80, 96, 1234, 1234 * FRAME_SIZE, 54321) + b"\x01\x00" * FRAME_SIZE
+HANDSHAKE_PACKET = b"HANDSHAKE:54321"
+
+
+def parse_with_rtp_library(data):
+    """Camino anterior del servidor (sin el log de error)."""
+    from rtp import RTP
+    try:
+        rtp_packet = RTP()
+        rtp_packet.fromBytearray(bytearray(data))
+        return rtp_packet
+    except Exception:
+        return None
+
+
+def bench(func, data, number):
+    best = min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+    return best / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    ssrc, seq, timestamp, _, _, payload = parse_rtp_header(AUDIO_PACKET)
+    assert (ssrc, seq, len(payload)) == (54321, 1234, FRAME_SIZE * 2)
+    assert parse_rtp_header(HANDSHAKE_PACKET) is None
+
+    print(f"{'paquete':<12}{'parser':<14}{'ns/paquete':>12}{'speedup':>10}")
+    for label, data in (("audio", AUDIO_PACKET), ("handshake", HANDSHAKE_PACKET)):
+        try:
+            slow = bench(parse_with_rtp_library, data, args.number)
+        except ImportError:
+            slow = None
+        fast = bench(parse_rtp_header, data, args.number)
+        if slow is not None:
+            print(f"{label:<12}{'rtp (lib)':<14}{slow:>12.0f}{'':>10}")
+        speedup = f"{slow / fast:.1f}x" if slow else "-"
+        print(f"{label:<12}{'rtp_parser':<14}{fast:>12.0f}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark del camino de envío del cliente: CPU por stream antes y después.
+
+- antes: process.stdout.read(BUFFER_SIZE), `leftover + data` por lectura y
+  send_rtp_stream_to_server (objeto rtp.RTP + bytearray + toBytearray + sendto),
+  copiado acá desde el rtp_client.py anterior como referencia.
+- después: readinto sobre un buffer reutilizable con memoryview y RTPSender
+  (cabecera preasignada + sendmsg por socket conectado).
+
+La captura se simula con un BytesIO de PCM y los paquetes van a un socket UDP
+local que no se lee. Se reporta CPU por frame y % de un core por stream (50 pps).
+
+Uso:
+    python benchmarks/bench_rtp_sender.py [--frames 100000]
+"""
+import argparse
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "client"))
+from config import BUFFER_SIZE, FRAME_SIZE, SAMPLE_RATE, RTP_VERSION
+import my_logger
+from my_logger import flush_logs, log_and_save
+import rtp_client
+from rtp_client import FRAME_BYTES, RTPSender
+
+SSRC = 54321
+sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
+def create_rtp_packet(payload, sequence_number, ssrc):
+    """create_rtp_packet del rtp_client.py anterior."""
+    from rtp import RTP, PayloadType
+    if not isinstance(payload, bytearray):
+        payload = bytearray(payload)
+    timestamp = sequence_number * FRAME_SIZE
+    return RTP(
+        version=RTP_VERSION,
+        payloadType=PayloadType.DYNAMIC_96,
+        sequenceNumber=sequence_number,
+        timestamp=timestamp % 2**32,
+        ssrc=ssrc,
+        payload=payload
+    )
+
+
+def send_rtp_stream_to_server(data, ssrc, sequence_number, dest):
+    """send_rtp_stream_to_server del rtp_client.py anterior (con el destino como argumento)."""
+    total_len = len(data)
+    offset = 0
+    frame_bytes = FRAME_SIZE * 2
+    while offset < total_len:
+        frame = data[offset:offset + frame_bytes]
+        if not frame:
+            break
+        rtp_packet = create_rtp_packet(bytearray(frame), sequence_number, ssrc)
+        sock.sendto(rtp_packet.toBytearray(), dest)
+        if sequence_number % 50 == 0:
+            log_and_save(f"📤 Enviado paquete seq {sequence_number} (raw stream)", "DEBUG", ssrc)
+        sequence_number = (sequence_number + 1) % 65536
+        offset += frame_bytes
+    return sequence_number
+
+
+def legacy_path(pipe, dest):
+    """Camino anterior de AudioClientSession.record_audio."""
+    sequence_number = 0
+    leftover = b""
+    while True:
+        data = pipe.read(BUFFER_SIZE)
+        if not data:
+            break
+        data = leftover + data
+        offset = 0
+        while offset + FRAME_BYTES <= len(data):
+            frame = data[offset:offset + FRAME_BYTES]
+            sequence_number = send_rtp_stream_to_server(frame, SSRC, sequence_number, dest)
+            offset += FRAME_BYTES
+        leftover = data[offset:]
+
+
+def fast_path(pipe, dest):
+    """Camino actual: readinto + RTPSender."""
+    sender = RTPSender(SSRC, dest=dest)
+    buffer = bytearray(BUFFER_SIZE + FRAME_BYTES)
+    view = memoryview(buffer)
+    fill = 0
+    while True:
+        nbytes = pipe.readinto(view[fill:fill + BUFFER_SIZE])
+        if not nbytes:
+            break
+        fill += nbytes
+        offset = 0
+        while offset + FRAME_BYTES <= fill:
+            sender.send_frame(view[offset:offset + FRAME_BYTES])
+            offset += FRAME_BYTES
+        view[:fill - offset] = view[offset:fill]
+        fill -= offset
+    sender.close()
+
+
+def measure(path, pcm, dest):
+    pipe = io.BytesIO(pcm)
+    start = time.process_time()
+    path(pipe, dest)
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100000)
+    args = parser.parse_args()
+
+    # Se mide solo el envío: sin el log cada 50 paquetes del camino anterior ni el
+    # log_rate_limited del actual. Lo que se loguee igual va a un directorio temporal,
+    # no a client/logs del repo
+    global log_and_save
+    log_dir = tempfile.mkdtemp(prefix="bench-rtp-sender-")
+    my_logger.LOG_DIR = log_dir
+    log_and_save = rtp_client.log_and_save = rtp_client.log_rate_limited = lambda *args, **kwargs: None
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    dest = sink.getsockname()
+    pcm = bytes(range(256)) * (args.frames * FRAME_BYTES // 256)
+    frames = len(pcm) // FRAME_BYTES
+    frames_per_second = SAMPLE_RATE / FRAME_SIZE
+
+    print(f"{'camino':<10}{'us/frame':>10}{'CPU %/stream':>14}{'streams/core':>14}")
+    results = {}
+    for label, path in (("antes", legacy_path), ("después", fast_path)):
+        cpu = measure(path, pcm, dest)
+        per_frame = cpu / frames
+        results[label] = per_frame
+        cpu_pct = 100 * per_frame * frames_per_second
+        print(f"{label:<10}{per_frame * 1e6:>10.2f}{cpu_pct:>14.3f}{100 / cpu_pct:>14.0f}")
+    print(f"speedup: {results['antes'] / results['después']:.1f}x")
+    sink.close()
+    flush_logs()
+    shutil.rmtree(log_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark de los escritores de segmento del servidor (server/segment_writer.py):
+WAV con buffer, FLAC en el proceso (soundfile/libsndfile) y FLAC con encoder
+externo (FLAC_ENCODER_CMD).
+
+Escribe `--seconds` de audio tipo voz/música (tonos con envolvente + ruido) en
+bloques de DISK_BLOCK_BYTES, igual que el hilo de disco, y reporta por formato:
+tasa de compresión, CPU de codificación como % de un core por stream en tiempo
+real y cuántos streams entran en un core.
+
+Uso:
+    python benchmarks/bench_segment_writers.py [--seconds 120] [--formats wav flac flac-process]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, "server"))
+from config import SAMPLE_RATE, CHANNELS, DISK_BLOCK_BYTES
+from segment_writer import SEGMENT_WRITERS, open_segment_writer
+
+
+def synth_audio(seconds, seed=1234):
+    """PCM s16le intercalado con contenido parecido a una transmisión (no comprime trivialmente)."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 0.7 * t) ** 2
+    signal = sum(np.sin(2 * np.pi * f * t + rng.uniform(0, np.pi)) / (i + 1)
+                 for i, f in enumerate((220, 330, 440, 1250, 3100)))
+    channels = [envelope * signal * 6000 + rng.normal(0, 300, t.size) for _ in range(CHANNELS)]
+    return np.stack(channels, axis=1).clip(-32768, 32767).astype("<i2").tobytes()
+
+
+def run(segment_format, pcm, directory):
+    writer = open_segment_writer(os.path.join(directory, f"bench-{segment_format}"), segment_format)
+    view = memoryview(pcm)
+    start = time.perf_counter()
+    for offset in range(0, len(pcm), DISK_BLOCK_BYTES):
+        writer.writeframes(view[offset:offset + DISK_BLOCK_BYTES])
+        writer.maybe_flush()
+    writer.close()
+    wall = time.perf_counter() - start
+    return writer.encoding_stats(), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--formats", nargs="+", default=list(SEGMENT_WRITERS), choices=list(SEGMENT_WRITERS))
+    args = parser.parse_args()
+
+    pcm = synth_audio(args.seconds)
+    print(f"{'formato':<14}{'MB':>8}{'compresión':>12}{'CPU %/stream':>14}{'streams/core':>14}{'wall s':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for segment_format in args.formats:
+            try:
+                stats, wall = run(segment_format, pcm, directory)
+            except (ImportError, OSError) as e:
+                print(f"{segment_format:<14}no disponible: {e}")
+                continue
+            cpu_pct = stats['cpu_pct_per_stream']
+            streams = f"{100 / cpu_pct:.0f}" if cpu_pct else "-"
+            print(f"{segment_format:<14}{stats['file_bytes'] / 1e6:>8.1f}{stats['compression_ratio']:>11.2f}x"
+                  f"{cpu_pct:>14.3f}{streams:>14}{wall:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
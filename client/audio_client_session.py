@@ -1,18 +1,54 @@
 import os
 import random
+import select
 import subprocess
 import sys
-import tempfile
 import threading
 import time
 
-from rtp_client import send_rtp_stream_to_server 
+from rtp_client import FRAME_BYTES, VoiceActivityDetector, create_rtp_sender
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 
-from my_logger import log, log_and_save
-from config import BUFFER_SIZE
-FRAME_BYTES = 1920
+from my_logger import log_and_save
+from config import BUFFER_SIZE, READINESS_AUDIO_GATE, HOT_SWAP_SWITCH_TIMEOUT, WATCHDOG_QUIET_DBFS
+import pulse_native
+from placement import apply_to_current_thread
+from pulse_native import NativeCapture
+
+def load_null_sink(ssrc=None):
+    """Carga un module-null-sink con nombre único. Devuelve (sink_name, module_id) o (None, None)."""
+    sink_name = f"audio-sink-{random.randint(10000, 99999)}"
+    log_and_save(f"🎧 Creating audio sink: {sink_name}", "INFO", ssrc)
+
+    try:
+        if pulse_native.sink_management_available():
+            module_id = pulse_native.load_module("module-null-sink", f"sink_name={sink_name}")
+        else:
+            result = subprocess.run([
+                "pactl", "load-module", "module-null-sink",
+                f"sink_name={sink_name}"
+            ], capture_output=True, text=True, check=True)
+            module_id = result.stdout.strip()
+
+        log_and_save(f"✅ Audio sink created with module ID: {module_id}", "INFO", ssrc)
+        return sink_name, module_id
+
+    except Exception as e:
+        log_and_save(f"❌ Failed to create audio sink: {e}", "ERROR", ssrc)
+        return None, None
+
+
+def unload_module(module_id, ssrc=None):
+    log_and_save(f"🎧 Unloading PulseAudio module: {module_id}", "INFO", ssrc)
+    try:
+        if pulse_native.sink_management_available():
+            pulse_native.unload_module(module_id)
+        else:
+            subprocess.run(["pactl", "unload-module", module_id], check=True)
+    except Exception as e:
+        log_and_save(f"⚠️ Failed to unload PulseAudio module: {e}", "ERROR", ssrc)
+
 
 class AudioClientSession:
     def __init__(self, id_instance):
@@ -21,91 +57,347 @@ class AudioClientSession:
         self.recording_thread = None
 
         self.sequence_number = 0
+        self.sender = None
+        self.capture_process = None
         self.id_instance = id_instance
         self.output_dir = None
         self.stop_event = threading.Event()
+        self.placement = None  # placement.Placement: cores/prioridad del camino de audio
+
+        # Readiness: milisegundos desde el arranque hasta cada hito
+        self.started_at = time.monotonic()
+        self.readiness = {}
+        self.waiting_audio = READINESS_AUDIO_GATE
+        self.audio_detector = VoiceActivityDetector(hangover=0)
+        self.frames_before_audio = 0
+
+        # Hot-swap: captura nueva que el hilo de grabación toma en el próximo ciclo
+        self.next_capture = None
+        self.capture_switched = threading.Event()
+        self.swap_lock = threading.Lock()
+
+        # Pausas del audio: solo se miden mientras el watchdog espera un momento para reciclar
+        self.track_quiet = False
+        self.quiet_detector = VoiceActivityDetector(WATCHDOG_QUIET_DBFS, hangover=0)
+        self.quiet_since = None
+
+    def mark_ready(self, event):
+        """Registra un hito de arranque (ms desde que se creó la sesión) y lo loguea como métrica."""
+        if event in self.readiness:
+            return
+        elapsed_ms = round(1000 * (time.monotonic() - self.started_at))
+        self.readiness[event] = elapsed_ms
+        log_and_save(f"⏱️ Readiness {event}: {elapsed_ms} ms desde el arranque", "INFO", self.id_instance)
+
+    def sink_index(self, sink_name=None):
+        """Índice de nuestro sink (o de `sink_name`) en PulseAudio, o None."""
+        sink_name = sink_name or self.sink_name
+        if pulse_native.sink_management_available():
+            return pulse_native.sink_index(sink_name)
+        result = subprocess.run(["pactl", "list", "short", "sinks"], capture_output=True, text=True)
+        for line in result.stdout.splitlines():
+            fields = line.split("\t")
+            if len(fields) > 1 and fields[1] == sink_name:
+                return fields[0]
+        return None
+
+    def has_sink_input(self, sink_index):
+        """True si algún stream de reproducción (sink-input) está conectado a nuestro sink."""
+        if pulse_native.sink_management_available():
+            return pulse_native.has_sink_input(sink_index)
+        result = subprocess.run(["pactl", "list", "short", "sink-inputs"], capture_output=True, text=True)
+        return any(len(fields) > 1 and fields[1] == sink_index
+                   for fields in (line.split("\t") for line in result.stdout.splitlines()))
+
+    def wait_for_sink_input(self, timeout, poll=0.1, sink_name=None):
+        """
+        Espera a que el navegador abra su stream de audio en nuestro module-null-sink
+        (o en `sink_name`). Devuelve True apenas aparece el sink-input, False si pasó
+        `timeout` o se pidió parar.
+        """
+        sink_name = sink_name or self.sink_name
+        sink_index = self.sink_index(sink_name)
+        if sink_index is None:
+            log_and_save(f"⚠️ No se encontró el sink {sink_name} en PulseAudio", "WARN", self.id_instance)
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self.stop_event.is_set():
+            if self.has_sink_input(sink_index):
+                self.mark_ready("sink_input")
+                return True
+            time.sleep(poll)
+        log_and_save(f"⚠️ Sin sink-input en {sink_name} tras {timeout}s", "WARN", self.id_instance)
+        return False
+
+    def load_null_sink(self):
+        return load_null_sink(self.id_instance)
+
+    def unload_module(self, module_id):
+        unload_module(module_id, self.id_instance)
 
     def create_pulse_sink(self):
         """Crea un sink de audio único."""
+        self.sink_name, self.module_id = self.load_null_sink()
+        return self.sink_name
 
-        self.sink_name = f"audio-sink-{random.randint(10000, 99999)}"
-        log_and_save(f"🎧 Creating audio sink: {self.sink_name}", "INFO", self.id_instance)
+    def adopt_sink(self, sink_name, module_id):
+        """Toma como propio un sink ya creado (navegador del pool): se descarga en cleanup."""
+        self.sink_name, self.module_id = sink_name, module_id
 
-        try:
-            result = subprocess.run([
-                "pactl", "load-module", "module-null-sink",
-                f"sink_name={self.sink_name}"
-            ], capture_output=True, text=True, check=True)
 
-            self.module_id = result.stdout.strip()
-            log_and_save(f"✅ Audio sink created with module ID: {self.module_id}", "INFO", self.id_instance)
+    def spawn_capture(self, pulse_device, formato):
+        """
+        Abre la captura de `pulse_device`: en el proceso con libpulse-simple ("native")
+        o con un proceso hijo ffmpeg/parec. Ambos se usan igual (stdout.readinto, poll...).
+        """
+        if formato == "native":
+            return NativeCapture(pulse_device, f"capture-{self.id_instance}")
+        cmd = self.capture_command(pulse_device, formato)
+        if self.placement:
+            cmd = self.placement.audio_prefix() + cmd
+        # bufsize=0: stdout sin buffer de Python, readinto escribe directo en nuestro buffer
+        return subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
 
-            return self.sink_name
+    def capture_command(self, pulse_device, formato):
+        """Comando de captura PCM s16le 48 kHz mono por stdout (ffmpeg o parec)."""
+        # Grabacion con ffmpeg
+        if formato == "ffmpeg":
+            return [
+                "ffmpeg",
+                "-y",
+                "-f", "pulse",
+                "-i", pulse_device,
+                "-acodec", "pcm_s16le",
+                "-ar", "48000",
+                "-ac", "1",
+                "-f", "s16le",     # ⚠️ NO "wav"
+                "-loglevel", "error",
+                "pipe:1"
+            ]
+        # Grabacion con parec
+        if formato == "parec":
+            return [
+                "parec",
+                "-d", pulse_device,
+                "--rate=48000",
+                "--channels=1",
+                "--format=s16le"
+            ]
+        raise ValueError(f"Formato de captura no soportado: {formato}")
 
-        except subprocess.CalledProcessError as e:
-            log_and_save(f"❌ Failed to create audio sink: {e}", "ERROR", self.id_instance)
+    def open_capture(self, pulse_device, formato, sock=None):
+        """
+        Lanza el proceso de captura y prepara el emisor RTP. `sock` permite compartir
+        un socket de envío entre varias sesiones (modo multi-canal).
+        """
+        log_and_save(f"🚀 Starting {formato.upper()} streaming...", "INFO", self.id_instance)
+        self.sender = create_rtp_sender(self.id_instance, self.sequence_number, sock=sock, placement=self.placement)
+        # Buffer de captura reutilizable: lo leído se encuadra con memoryview, y el resto
+        # de frame incompleto se mueve al principio para la próxima lectura
+        self.capture_buffer = bytearray(BUFFER_SIZE + FRAME_BYTES)
+        self.capture_view = memoryview(self.capture_buffer)
+        self.capture_fill = 0
+        self.capture_process = self.spawn_capture(pulse_device, formato)
+        self.mark_ready("capture_started")
+        return self.capture_process
+
+    def pump_capture(self):
+        """
+        Lee lo disponible en el pipe de captura y envía los frames completos.
+        Devuelve False cuando el proceso de captura terminó (EOF).
+        """
+        view = self.capture_view
+        fill = self.capture_fill
+        nbytes = self.capture_process.stdout.readinto(view[fill:fill + BUFFER_SIZE])
+        if not nbytes:
+            return False
+        fill += nbytes
+        offset = 0
+        while offset + FRAME_BYTES <= fill:
+            frame = view[offset:offset + FRAME_BYTES]
+            offset += FRAME_BYTES
+            if self.waiting_audio:
+                # Hasta que llega audio real no se envía nada: el primer paquete ya es audio
+                if not self.audio_detector.is_active(frame):
+                    self.frames_before_audio += 1
+                    continue
+                self.waiting_audio = False
+                self.mark_ready("first_packet")
+                log_and_save(f"🔊 Primer audio tras {self.frames_before_audio} frames de silencio descartados",
+                             "INFO", self.id_instance)
+            if self.track_quiet:
+                self.note_quiet(frame)
+            self.sender.send_frame(frame)
+        view[:fill - offset] = view[offset:fill]
+        self.capture_fill = fill - offset
+        return True
+
+    def note_quiet(self, frame):
+        if self.quiet_detector.is_active(frame):
+            self.quiet_since = None
+        elif self.quiet_since is None:
+            self.quiet_since = time.monotonic()
+
+    def set_quiet_tracking(self, enabled):
+        self.quiet_since = None
+        self.track_quiet = enabled
+
+    def quiet_seconds(self):
+        """Hace cuánto el audio está en pausa (0 si suena o no se está midiendo)."""
+        quiet_since = self.quiet_since
+        return time.monotonic() - quiet_since if quiet_since is not None else 0.0
+
+    def close_capture(self):
+        """Cierra el emisor y detiene el proceso de captura si sigue vivo."""
+        if self.sender:
+            self.sender.close()
+            self.sequence_number = self.sender.sequence_number
+            self.sender = None
+        with self.swap_lock:
+            pending, self.next_capture = self.next_capture, None
+        if pending:
+            self.stop_capture_process(pending[0])
+        process = self.capture_process
+        if process is None:
+            return
+        self.capture_process = None
+        self.stop_capture_process(process)
+
+    def stop_capture_process(self, process):
+        if process.poll() is None:
+            log_and_save("Stopping FFmpeg...", "INFO", self.id_instance)
+            process.terminate()
+            try:
+                process.communicate(timeout=5)
+                log_and_save("✅ FFmpeg stopped successfully.", "SUCCESS", self.id_instance)
+            except Exception:
+                pass
+        process.stdout.close()
+        process.wait()
+
+    def switch_capture(self):
+        """
+        Hilo de grabación: pasa a la captura preparada por hot_swap. El emisor RTP no
+        se toca, así SSRC, secuencia y timestamp siguen sin saltos; lo que quedó de
+        frame incompleto de la captura vieja se descarta.
+        """
+        with self.swap_lock:
+            if not self.next_capture:
+                return
+            process, pending = self.next_capture
+            self.next_capture = None
+        old_process, self.capture_process = self.capture_process, process
+        self.capture_view[:len(pending)] = pending
+        self.capture_fill = len(pending)
+        self.capture_switched.set()
+        # La captura vieja se cierra en otro hilo: communicate() puede tardar hasta 5 s
+        # y el hilo de grabación tiene que seguir leyendo la nueva sin hueco
+        threading.Thread(target=self.stop_capture_process, args=(old_process,),
+                         name="stop-old-capture", daemon=True).start()
+        log_and_save("🔀 Captura conmutada al navegador nuevo", "SUCCESS", self.id_instance)
+
+    def read_capture_chunk(self, process, timeout):
+        """Lectura con timeout para el pre-roll. None si no hubo datos, b"" en EOF."""
+        if isinstance(process, NativeCapture):
+            # El monitor entrega un frame cada 20 ms: no hace falta select
+            chunk = bytearray(FRAME_BYTES)
+            return bytes(chunk[:process.readinto(chunk)])
+        readable, _, _ = select.select([process.stdout], [], [], timeout)
+        if not readable:
             return None
+        return os.read(process.stdout.fileno(), BUFFER_SIZE)
 
+    def preroll_capture(self, process, timeout):
+        """
+        Lee la captura nueva hasta el primer frame con audio (el navegador nuevo ya
+        reproduce). Devuelve los bytes desde ese frame, o None si no llegó audio.
+        """
+        detector = VoiceActivityDetector(hangover=0)
+        data = bytearray()
+        offset = 0
+        deadline = time.monotonic() + timeout
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            chunk = self.read_capture_chunk(process, remaining)
+            if chunk is None:
+                continue
+            if not chunk:
+                return None
+            data += chunk
+            while offset + FRAME_BYTES <= len(data):
+                if detector.is_active(memoryview(data)[offset:offset + FRAME_BYTES]):
+                    # Siempre entra en el buffer de captura: < un frame pendiente + una lectura
+                    return bytes(data[offset:])
+                offset += FRAME_BYTES
+            # Los frames de silencio ya revisados no hacen falta
+            del data[:offset]
+            offset = 0
+        return None
+
+    def hot_swap(self, sink_name, module_id, formato, timeout):
+        """
+        Conmuta la captura al sink de un navegador de reemplazo sin cortar el stream.
+        Lanza la captura del sink nuevo, espera a que tenga audio y se la entrega al
+        hilo de grabación. Devuelve el module_id del sink viejo (para descargarlo tras
+        cerrar el navegador viejo) o None si no se pudo; en ese caso sigue todo igual.
+        """
+        if not self.recording_thread or not self.recording_thread.is_alive():
+            log_and_save("⚠️ Hot-swap sin captura activa", "WARN", self.id_instance)
+            return None
+        try:
+            process = self.spawn_capture(f"{sink_name}.monitor", formato)
+        except Exception as e:
+            log_and_save(f"⚠️ No se pudo abrir la captura de {sink_name}: {e}", "ERROR", self.id_instance)
+            return None
+        try:
+            pending = self.preroll_capture(process, timeout)
+        except Exception as e:
+            log_and_save(f"⚠️ Error leyendo la captura nueva: {e}", "ERROR", self.id_instance)
+            pending = None
+        if pending is None:
+            log_and_save(f"⚠️ El sink {sink_name} no produjo audio en {timeout}s", "WARN", self.id_instance)
+            self.stop_capture_process(process)
+            return None
+        self.capture_switched.clear()
+        with self.swap_lock:
+            self.next_capture = (process, pending)
+        if not self.capture_switched.wait(HOT_SWAP_SWITCH_TIMEOUT):
+            # El hilo de grabación quedó colgado en la captura vieja o terminó
+            with self.swap_lock:
+                pending, self.next_capture = self.next_capture, None
+            if pending:
+                self.stop_capture_process(process)
+                log_and_save("⚠️ El hilo de captura no tomó el stream nuevo", "WARN", self.id_instance)
+                return None
+            self.capture_switched.wait(HOT_SWAP_SWITCH_TIMEOUT)
+        old_module_id = self.module_id
+        self.sink_name, self.module_id = sink_name, module_id
+        return old_module_id
 
     def record_audio(self, pulse_device, formato):
         """Graba y envía un stream continuo de audio usando ffmpeg sin segmentación, con afinidad/prioridad si es Linux."""
         log_and_save("🎵 Starting continuous audio streaming (sin segmentación)", "INFO", self.id_instance)
-        from flags_nav_ffmpeg.flags_comunes import CPU_FLAGS
-        import platform
+        if self.placement:
+            apply_to_current_thread(self.placement, self.id_instance)
         try:
-            # Grabacion con ffmpeg
-            if formato == "ffmpeg":
-                cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-f", "pulse",
-                    "-i", pulse_device,
-                    "-acodec", "pcm_s16le",
-                    "-ar", "48000",
-                    "-ac", "1",
-                    "-f", "s16le",     # ⚠️ NO "wav"
-                    "-loglevel", "error",
-                    "pipe:1"
-                ]
-                # Grabacion con parec
-            if formato == "parec":
-                cmd = [
-                    "parec",
-                    "-d", pulse_device,
-                    "--rate=48000",
-                    "--channels=1",
-                    "--format=s16le"
-                ]
-
-            log_and_save(f"🚀 Starting {formato.upper()} streaming...", "INFO", self.id_instance)
-            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
-                try:
-                    leftover = b""
-                    while not self.stop_event.is_set():
-                        data = process.stdout.read(BUFFER_SIZE)
-                        if not data:
-                            break
-                        data = leftover + data
-                        offset = 0
-                        try:
-                            while offset + FRAME_BYTES <= len(data):
-                                frame = data[offset:offset+FRAME_BYTES]
-                                self.sequence_number = send_rtp_stream_to_server(frame, self.id_instance, self.sequence_number)
-                                offset += FRAME_BYTES
-                            leftover = data[offset:]
-                        except Exception as e:
-                            log_and_save(f"⚠️ Error enviando audio: {e}", "ERROR", self.id_instance)
+            self.open_capture(pulse_device, formato)
+            try:
+                while not self.stop_event.is_set():
+                    try:
+                        alive = self.pump_capture()
+                        if self.next_capture:
+                            self.switch_capture()
+                        elif not alive:
                             break
-                    if process.poll() is None:
-                        log_and_save("Stopping FFmpeg...", "INFO", self.id_instance)
-                        process.terminate()
-                        try:
-                            process.communicate(timeout=5)
-                            log_and_save("✅ FFmpeg stopped successfully.", "SUCCESS", self.id_instance)
-                        except Exception:
-                            pass
-                except Exception as e:
-                    log_and_save(f"❌ Error in continuous streaming: {e}", "ERROR", self.id_instance)
+                    except Exception as e:
+                        log_and_save(f"⚠️ Error enviando audio: {e}", "ERROR", self.id_instance)
+                        break
+            except Exception as e:
+                log_and_save(f"❌ Error in continuous streaming: {e}", "ERROR", self.id_instance)
+            finally:
+                self.close_capture()
         except Exception as e:
             log_and_save(f"❌ Error in continuous streaming: {e}", "ERROR", self.id_instance)
 
@@ -137,11 +429,7 @@ class AudioClientSession:
 
         # Descargar módulo PulseAudio
         if self.module_id:
-            log_and_save(f"🎧 Unloading PulseAudio module: {self.module_id}", "INFO", self.id_instance)
-            try:
-                subprocess.run(["pactl", "unload-module", self.module_id], check=True)
-            except Exception as e:
-                log_and_save(f"⚠️ Failed to unload PulseAudio module: {e}", "ERROR", self.id_instance)
+            self.unload_module(self.module_id)
 
         log_and_save("✅ Cleanup: Audio Client Session complete.", "SUCCESS", self.id_instance)
 
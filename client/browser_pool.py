@@ -0,0 +1,125 @@
+"""
+Pool de navegadores pre-lanzados.
+
+Mantiene BROWSER_POOL_SIZE navegadores ociosos (about:blank), cada uno ya con su
+propio null-sink de PulseAudio y su perfil. Una sesión que arranca o recicla
+reclama uno con claim(): se le abre la URL en el proceso existente y se lleva el
+navegador junto con su sink, sin esperar un arranque en frío. Un hilo repone el
+pool de a un navegador por vez, espaciados, para no juntar picos de CPU cuando
+arrancan muchos canales a la vez.
+"""
+import collections
+import os
+import sys
+import threading
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from my_logger import log
+from config import BROWSER_POOL_SIZE, BROWSER_POOL_LAUNCH_DELAY
+
+from client.audio_client_session import load_null_sink, unload_module
+from navigator_manager import Navigator
+
+
+class PooledBrowser:
+    """Navegador ocioso con su sink."""
+
+    def __init__(self, navigator, sink_name, module_id):
+        self.navigator = navigator
+        self.sink_name = sink_name
+        self.module_id = module_id
+
+    def alive(self):
+        process = self.navigator.browser_process
+        return process is not None and process.poll() is None
+
+    def discard(self):
+        self.navigator.cleanup()
+        unload_module(self.module_id)
+
+
+class BrowserPool:
+    def __init__(self, navigator_name, size=BROWSER_POOL_SIZE):
+        self.navigator_name = navigator_name
+        self.size = size
+        self.idle = collections.deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.size <= 0:
+            return self
+        self.thread = threading.Thread(target=self.refill, name="browser-pool", daemon=True)
+        self.thread.start()
+        return self
+
+    def launch_idle(self):
+        """Lanza un navegador ocioso en un sink nuevo. Devuelve el PooledBrowser o None."""
+        sink_name, module_id = load_null_sink()
+        if not sink_name:
+            return None
+        navigator = Navigator(self.navigator_name, sink_name, None)
+        if navigator.create_navigator_profile() and navigator.launch_navigator("about:blank"):
+            return PooledBrowser(navigator, sink_name, module_id)
+        navigator.cleanup()
+        unload_module(module_id)
+        return None
+
+    def refill(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                # Los que murieron estando ociosos no cuentan
+                dead = [browser for browser in self.idle if not browser.alive()]
+                for browser in dead:
+                    self.idle.remove(browser)
+                missing = self.size - len(self.idle)
+            for browser in dead:
+                browser.discard()
+            if missing <= 0:
+                self.wakeup.wait(BROWSER_POOL_LAUNCH_DELAY)
+                self.wakeup.clear()
+                continue
+            browser = self.launch_idle()
+            if browser and self.stop_event.is_set():
+                browser.discard()
+            elif browser:
+                with self.lock:
+                    self.idle.append(browser)
+                log(f"🧊 [Pool] Navegador ocioso listo ({len(self.idle)}/{self.size})", "INFO")
+            # Espaciado entre lanzamientos, para no sumar arranques en frío simultáneos
+            self.stop_event.wait(BROWSER_POOL_LAUNCH_DELAY)
+
+    def claim(self, url, ssrc):
+        """
+        Reclama un navegador ocioso y le abre `url`. Devuelve el PooledBrowser (el
+        llamador pasa a ser dueño del navegador y del sink) o None si el pool está
+        vacío, en cuyo caso se lanza uno en frío como siempre.
+        """
+        while True:
+            with self.lock:
+                browser = self.idle.popleft() if self.idle else None
+            if browser is None:
+                return None
+            self.wakeup.set()
+            if not browser.alive():
+                browser.discard()
+                continue
+            browser.navigator.ssrc = ssrc
+            if browser.navigator.open_url(url):
+                log(f"♨️ [Pool] Navegador pre-lanzado asignado a {ssrc}", "INFO")
+                return browser
+            browser.discard()
+
+    def close(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join(timeout=10)
+        with self.lock:
+            idle, self.idle = list(self.idle), collections.deque()
+        for browser in idle:
+            browser.discard()
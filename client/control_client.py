@@ -0,0 +1,67 @@
+"""
+Cliente del plano de control del servidor (server/control_plane.py).
+
+Cada pedido lleva un id y se reintenta hasta CONTROL_RETRIES veces si no llega la
+respuesta con ese id (los comandos son idempotentes del lado del servidor). Las
+respuestas viejas de un intento anterior se descartan.
+"""
+import itertools
+import json
+import os
+import socket
+import sys
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import log_and_save
+from config import DEST_IP, CONTROL_PORT, CONTROL_TIMEOUT, CONTROL_RETRIES
+
+request_ids = itertools.count(1)
+
+
+def control_request(cmd, ssrc, timeout=CONTROL_TIMEOUT, retries=CONTROL_RETRIES, **fields):
+    """
+    Envía un pedido al plano de control y espera su respuesta.
+    Devuelve el dict de respuesta (con "ok" y, si falló, "error") o None si el servidor nunca contestó.
+    """
+    request_id = next(request_ids)
+    msg = json.dumps({"id": request_id, "cmd": cmd, "ssrc": ssrc, **fields}).encode()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        for attempt in range(1, retries + 1):
+            sock.sendto(msg, (DEST_IP, CONTROL_PORT))
+            try:
+                while True:
+                    data, _ = sock.recvfrom(4096)
+                    reply = json.loads(data.decode())
+                    if reply.get("id") == request_id:
+                        if not reply.get("ok"):
+                            log_and_save(f"❌ {cmd} rechazado por el servidor: {reply.get('error')}", "ERROR", ssrc)
+                        return reply
+            except socket.timeout:
+                log_and_save(f"⏳ Sin respuesta a {cmd} (intento {attempt}/{retries})", "WARN", ssrc)
+            except (OSError, ValueError) as e:
+                log_and_save(f"⚠️ Error esperando respuesta a {cmd}: {e}", "WARN", ssrc)
+    finally:
+        sock.close()
+    return None
+
+
+def register_channel(ssrc, channel_name, codec):
+    """Registro acknowledged ssrc -> canal. True si el servidor lo confirmó."""
+    reply = control_request("REGISTER", ssrc, channel=str(channel_name), codec=codec)
+    return bool(reply and reply.get("ok"))
+
+
+def acquire_display(ssrc, prefer=None, renew=False):
+    """Lease de display (GET_DISPLAY o RENEW_DISPLAY). Devuelve el número o None."""
+    reply = control_request("RENEW_DISPLAY" if renew else "GET_DISPLAY", ssrc, prefer=prefer)
+    if reply and reply.get("ok"):
+        return reply["display"]
+    return None
+
+
+def release_display(ssrc):
+    reply = control_request("RELEASE_DISPLAY", ssrc)
+    return bool(reply and reply.get("ok"))
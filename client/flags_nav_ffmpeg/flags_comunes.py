@@ -8,7 +8,6 @@ CPU_FLAGS = {
 }
 CHROME_CHROMIUM_COMMON_FLAGS = [
     "--window-size=1920,1080",  # Tamaño de ventana
-    "--incognito",  # Modo incógnito -> Ignora el perfil creado
     "--autoplay-policy=no-user-gesture-required",  # Permitir autoplay sin interacción del usuario
     "--disable-notifications",  # Desactivar notificaciones
     "--disable-popup-blocking",  # Desactivar bloqueo de ventanas emergentes
@@ -25,6 +24,12 @@ CHROME_CHROMIUM_COMMON_FLAGS = [
     "--start-minimized",
 ]
 
+# Solo con perfil vacío: con un perfil clonado de la plantilla el incógnito ignoraría
+# lo que trae tibio (caché, cookies, permisos del sitio, decisión de autoplay)
+INCOGNITO_FLAGS = [
+    "--incognito",  # Modo incógnito -> Ignora el perfil creado
+]
+
 GRAPHICS_MIN_FLAGS = [
     "--disable-gpu", # Desactivar GPU -> Util si no se posee GPU
     #"--disable-accelerated-2d-canvas",  # Desactivar aceleración de canvas 2D
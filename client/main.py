@@ -10,17 +10,25 @@ import random
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
-from my_logger import log_and_save
-from config import DEST_IP, DEST_PORT, METADATA_PORT, XVFB_DISPLAY, NUM_DISPLAY_PORT
+from my_logger import flush_logs, log_and_save
+from config import DEST_IP, DEST_PORT, XVFB_DISPLAY, AUDIO_CODEC
+from config import READINESS_TIMEOUT, BROWSER_RECYCLE_MODE, BROWSER_POOL_SIZE
+from config import SUPERVISOR_EXIT_RECYCLE, PLACEMENT_ENABLED, WATCHDOG_MAX_PSS_MB, WATCHDOG_MAX_RUNTIME
+from config import DISPLAY_RENEW_INTERVAL
 
 from client.audio_client_session import AudioClientSession
+from browser_pool import BrowserPool
+from control_client import acquire_display, register_channel, release_display
 from navigator_manager import Navigator
+from placement import apply_to_tree, plan, session_slot
+from watchdog import ResourceWatchdog
 from xvfb_manager import Xvfb_manager
 
 
 audio_client_session = None
 navigator_manager = None
 xvfb_manager = None
+browser_pool = None
 HEADLESS = False
 shutdown_event = threading.Event()
 # Variable para distinguir si el shutdown fue por relanzamiento automático o por señal del usuario
@@ -39,73 +47,115 @@ def extract_channel_name(url):
     return match.group(1) if match else "unknown"
 
 def send_channel_metadata(channel_name, ssrc):
-    import socket
-    import json
-    msg = json.dumps({"ssrc": ssrc, "channel": str(channel_name)})
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    log_and_save(f"📡 Enviando metadata: {msg}", "INFO", ssrc)
-    sock.sendto(msg.encode(), (DEST_IP, METADATA_PORT))
-    sock.close()
-
-def udp_handshake(ssrc):
-    import socket
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    handshake_msg = f"HANDSHAKE:{ssrc}"
-    sock.sendto(handshake_msg.encode(), (DEST_IP, DEST_PORT))
-    # (Opcional) Esperar respuesta del server
-    try:
-        sock.settimeout(2)
-        data, _ = sock.recvfrom(1024)
-        print(f"Handshake response: {data.decode()}")
-    except socket.timeout:
-        print("No handshake response from server.")
-    sock.close()
-
-
-def return_display_number(ssrc):
-    import socket
-    import json
-    msg = json.dumps({"cmd": "GET_DISPLAY_NUM", "ssrc": ssrc})
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.sendto(msg.encode(), (DEST_IP, NUM_DISPLAY_PORT))
+    """
+    Registra ssrc -> canal en el plano de control del servidor y espera su ack
+    (con reintentos). Devuelve False si el servidor nunca confirmó: el cliente
+    sigue igual y, cuando el registro llegue, el servidor mueve a la carpeta del
+    canal los segmentos que haya abierto a nombre del SSRC.
+    """
+    # El codec del payload se negocia acá: el servidor decodifica cada SSRC con el suyo
+    log_and_save(f"📡 Registrando canal: {ssrc} -> {channel_name} ({AUDIO_CODEC})", "INFO", ssrc)
+    if register_channel(ssrc, channel_name, AUDIO_CODEC):
+        return True
+    log_and_save("❌ El servidor no confirmó el registro del canal", "ERROR", ssrc)
+    return False
+
+
+def return_display_number(ssrc, prefer=None):
     log_and_save(f"🖥️ Display solicitado por el cliente: {ssrc}", "INFO", ssrc)
-    try:
-        data, _ = sock.recvfrom(1024)  # Espera la respuesta del servidor
-        display_num = int(data.decode())
-        log_and_save(f"✅ Display asignado por el servidor: :{display_num}", "INFO", ssrc)
-        display_str = f":{display_num}"
-        sock.close()
-        return display_str
-    except socket.timeout:
-        log_and_save("❌ No se recibió respuesta del servidor para el display", "ERROR", ssrc)
-        sock.close()
+    display_num = acquire_display(ssrc, prefer)
+    if display_num is None:
+        log_and_save("❌ El servidor no asignó un display", "ERROR", ssrc)
         return None
+    log_and_save(f"✅ Display asignado por el servidor: :{display_num}", "INFO", ssrc)
+    return f":{display_num}"
 
 
-def monitor_browser_process(browser_process, max_ram_mb=500, max_runtime_sec=7200):
+def renovar_display(ssrc, display_str):
+    """
+    Renueva el lease del display hasta el shutdown; sin renovación el servidor lo reasigna.
+    El navegador sigue en este display pase lo que pase: si el lease venció y ya no
+    hay lugar, se reintenta seguido hasta recuperarlo (nunca se toma otro).
+    """
+    display_num = int(display_str.lstrip(":"))
+    interval = DISPLAY_RENEW_INTERVAL
+    while not shutdown_event.wait(interval):
+        if acquire_display(ssrc, display_num, renew=True) == display_num:
+            interval = DISPLAY_RENEW_INTERVAL
+        else:
+            log_and_save(f"⚠️ No se pudo renovar el lease de {display_str}, reintentando", "WARN", ssrc)
+            interval = DISPLAY_RENEW_INTERVAL / 6
+
+
+def monitor_browser_process(browser_process, max_pss_mb=WATCHDOG_MAX_PSS_MB, max_runtime_sec=WATCHDOG_MAX_RUNTIME,
+                            reciclar=None):
+    """
+    Vigila memoria (PSS de todo el árbol) y CPU del navegador con ResourceWatchdog.
+    Recicla antes de que se cruce un límite, en un momento de bajo impacto, usando
+    `reciclar` (hot-swap: devuelve el proceso del navegador nuevo o None); si no hay
+    `reciclar` o falla, relanza el script entero.
+    """
     import psutil
-    start_time = time.time()
     try:
-        p = psutil.Process(browser_process.pid)
-        log_and_save("🔍 Iniciando monitor de uso de RAM del navegador...", "INFO", ssrc)
-    except Exception:
+        watchdog = ResourceWatchdog(browser_process.pid, ssrc, max_pss_mb, max_runtime_sec)
+    except psutil.NoSuchProcess:
         log_and_save("❌ Error al obtener el proceso del navegador", "ERROR", ssrc)
         return  # Proceso ya terminó
 
-    while not shutdown_event.is_set():
-        try:
-            ram_mb = p.memory_info().rss / 1024 / 1024
-            if ram_mb > max_ram_mb - 20 or (time.time() - start_time) > max_runtime_sec - 15:
-                log_and_save(f"🛑 Navegador cerca del límite de RAM ({ram_mb:.1f} MB) o tiempo. Relanzando script...", "WARN", ssrc)
-                log_and_save(f"Memoria al finalizar: {ram_mb:.1f} MB", "INFO", ssrc)
-                shutdown_reason['auto'] = True
-                shutdown_event.set()
-                break
-            time.sleep(10)
-        except psutil.NoSuchProcess:
-            log_and_save("❌ El proceso del navegador ya no existe.", "WARN", ssrc)
-            shutdown_event.set()
-            break  # El navegador ya terminó
+    try:
+        reason = watchdog.run(shutdown_event, reciclar or (lambda: None), audio_client_session.quiet_seconds,
+                              audio_client_session.set_quiet_tracking)
+    except psutil.NoSuchProcess:
+        log_and_save("❌ El proceso del navegador ya no existe.", "WARN", ssrc)
+        shutdown_event.set()
+        return  # El navegador ya terminó
+    if reason:
+        log_and_save(f"🛑 {reason}. Relanzando script...", "WARN", ssrc)
+        shutdown_reason['auto'] = True
+        shutdown_event.set()
+
+
+def reciclar_navegador(url, navigator_name, formato):
+    """
+    Hot-swap del navegador: lanza uno nuevo en un segundo sink, conmuta la captura
+    cuando ya reproduce y recién ahí cierra el viejo. El emisor RTP es el mismo, así
+    el servidor no ve cortes ni un SSRC nuevo. Devuelve el proceso nuevo o None.
+    """
+    global navigator_manager
+    pooled = browser_pool.claim(url, ssrc) if browser_pool else None
+    if pooled:
+        # Navegador pre-lanzado del pool: sin arranque en frío
+        sink_name, module_id = pooled.sink_name, pooled.module_id
+        nuevo_navegador = pooled.navigator
+        nuevo_proceso = nuevo_navegador.browser_process
+        if navigator_manager.placement:
+            apply_to_tree(nuevo_proceso.pid, navigator_manager.placement.browser_cores,
+                          navigator_manager.placement.browser_nice)
+    else:
+        sink_name, module_id = audio_client_session.load_null_sink()
+        if not sink_name:
+            return None
+        nuevo_navegador = Navigator(navigator_name, sink_name, ssrc)
+        nuevo_navegador.placement = navigator_manager.placement
+        nuevo_proceso = None
+        if nuevo_navegador.create_navigator_profile():
+            nuevo_proceso = nuevo_navegador.launch_navigator(url)
+    old_module_id = None
+    if nuevo_proceso:
+        threading.Thread(target=minimizar_navegador, args=(nuevo_proceso.pid, READINESS_TIMEOUT), daemon=True).start()
+        if audio_client_session.wait_for_sink_input(READINESS_TIMEOUT, sink_name=sink_name):
+            old_module_id = audio_client_session.hot_swap(sink_name, module_id, formato, READINESS_TIMEOUT)
+    if not old_module_id:
+        log_and_save("❌ Falló el hot-swap del navegador", "ERROR", ssrc)
+        nuevo_navegador.cleanup()
+        audio_client_session.unload_module(module_id)
+        return None
+    # El viejo se cierra antes de descargar su sink: si no, Pulse movería su audio al sink por defecto
+    navigator_manager.cleanup()
+    navigator_manager = nuevo_navegador
+    audio_client_session.unload_module(old_module_id)
+    log_and_save(f"✅ Navegador reciclado sin cortar el stream (SSRC {ssrc})", "SUCCESS", ssrc)
+    return nuevo_proceso
 
 
 def levantar_script_misma_terminal():
@@ -115,6 +165,7 @@ def levantar_script_misma_terminal():
     args = [sys.executable] + sys.argv
     log_and_save(f"[RELAUNCH] Relanzando en la misma terminal: {' '.join(args)}", "INFO", ssrc)
     time.sleep(2)
+    flush_logs()
     os.execv(sys.executable, args)
 
 def print_subprocess_tree(pid):
@@ -128,6 +179,33 @@ def print_subprocess_tree(pid):
         print(f"Error: {e}")
 
 
+def buscar_ventana_navegador(pid, timeout):
+    """
+    Espera a que el navegador mapee su ventana (xdotool search --sync) en lugar de
+    dormir un tiempo fijo y tomar la ventana activa. Devuelve el ID o None.
+    """
+    try:
+        result = subprocess.run(
+            ["xdotool", "search", "--sync", "--onlyvisible", "--pid", str(pid)],
+            capture_output=True, text=True, timeout=timeout
+        )
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        log_and_save(f"⚠️ No apareció la ventana del navegador: {e}", "WARN", ssrc)
+        return None
+    ids = result.stdout.split()
+    return ids[-1] if ids else None
+
+
+def minimizar_navegador(pid, timeout):
+    """Hilo: minimiza la ventana del navegador apenas existe."""
+    window_id = buscar_ventana_navegador(pid, timeout)
+    log_and_save(f"ID de ventana obtenida: {window_id}", "INFO", ssrc)
+    if window_id:
+        minimizar_ventana_por_id(window_id, delay=0)
+    else:
+        log_and_save("❌ No se pudo obtener el ID de la ventana", "ERROR", ssrc)
+
+
 def minimizar_ventana_por_id(window_id, delay=5):
     """
     Minimiza la ventana asociada a un ID específico que contenga el nombre del canal en el título.
@@ -150,7 +228,7 @@ def minimizar_ventana_por_id(window_id, delay=5):
 
 def main():
     """Función principal."""
-    global audio_client_session, navigator_manager, xvfb_manager, XVFB_DISPLAY, HEADLESS, ssrc
+    global audio_client_session, navigator_manager, xvfb_manager, browser_pool, XVFB_DISPLAY, HEADLESS, ssrc
 
     # 1. Validar argumentos de línea de comandos
     if len(sys.argv) != 4:
@@ -164,6 +242,7 @@ def main():
 
     # Variables globales para cleanup
     id_instance = random.randint(10000, 100000)
+    ssrc = id_instance
 
     # Controlador de sesión de audio
     audio_client_session = AudioClientSession(id_instance)
@@ -179,48 +258,50 @@ def main():
     # 2.1 Crear el manager de browser
     # Manager del navegador
     navigator_manager = Navigator(navigator_name, sink_name, id_instance)
+    # 2.2 Cores y prioridad del navegador y del camino de audio de esta sesión
+    if PLACEMENT_ENABLED:
+        navigator_manager.placement = audio_client_session.placement = plan(session_slot(id_instance))
     # 3. Crear perfil del Navegador (con autoplay)
     navigator_profile_dir = navigator_manager.create_navigator_profile()
     if not navigator_profile_dir:
         audio_client_session.cleanup()
         navigator_manager.cleanup()
         sys.exit(1)
-    # 3.1 Crear Display de XVFB con el numero asignado por el servidor -> No lo necesitamos
+    # 3.1 Crear Display de XVFB con el numero asignado por el servidor (lease compartido con otros clientes)
+    if HEADLESS:
+        XVFB_DISPLAY = return_display_number(id_instance)
+        xvfb_manager = Xvfb_manager(XVFB_DISPLAY) if XVFB_DISPLAY else None
+        if not xvfb_manager or not xvfb_manager.start_xvfb():
+            if XVFB_DISPLAY:
+                release_display(id_instance)
+            audio_client_session.cleanup()
+            navigator_manager.cleanup()
+            sys.exit(1)
+        threading.Thread(target=renovar_display, args=(id_instance, XVFB_DISPLAY), daemon=True).start()
     # 3.1 Además obtener el nombre del canal para crear la carpeta con su nombre
     channel_name = extract_channel_name(url)
 
 
-    send_channel_metadata(channel_name, id_instance)
-    time.sleep(1)  # Esperar un poco para que el servidor procese la metadata
+    # Registro con ack en el plano de control: no hace falta esperar un tiempo fijo
+    if send_channel_metadata(channel_name, id_instance):
+        audio_client_session.mark_ready("registered")
     log_and_save(f"✅ Canal extraído: {channel_name}", "INFO", id_instance)
 
 
     # 4. Lanzar Navegador con sink preconfigurado y perfil optimizado
     navigator_process = navigator_manager.launch_navigator(url)
     log_and_save(f"Proceso de navegador: {navigator_process}", "INFO", id_instance)
-
-    time.sleep(5)  # darle tiempo a que se abra la ventana
-    result = subprocess.run(
-        ["xdotool", "getactivewindow"],
-        capture_output=True, text=True
-    )
-    window_id = result.stdout.strip()
-
-    # Minimizar la ventana del navegador tras 5 segundos (solo Linux con xdotool)
-    if navigator_process and window_id:
-        threading.Thread(target=minimizar_ventana_por_id, args=(window_id, 5), daemon=True).start()
-    else:
-        log_and_save("❌ No se pudo obtener el ID de la ventana", "ERROR", id_instance)
-    
-    log_and_save(f"ID de ventana obtenida: {window_id}", "INFO", id_instance)
     if not navigator_process:
         audio_client_session.cleanup()
         navigator_manager.cleanup()
         sys.exit(1)
 
-    # 5. Esperar un poco para que Chrome inicie y luego configurar control de ads
-    log_and_save(f"⏳ Esperando que {navigator_name} se inicie completamente...", "INFO", id_instance)
-    time.sleep(5)
+    # Minimizar la ventana del navegador apenas se mapea (solo Linux con xdotool)
+    threading.Thread(target=minimizar_navegador, args=(navigator_process.pid, READINESS_TIMEOUT), daemon=True).start()
+
+    # 5. Esperar a que el navegador abra su stream de audio en nuestro sink
+    log_and_save(f"⏳ Esperando que {navigator_name} empiece a reproducir...", "INFO", id_instance)
+    audio_client_session.wait_for_sink_input(READINESS_TIMEOUT)
 
     # 6. Iniciar captura y grabación de audio
     log_and_save("🎵 Iniciando captura de audio...", "INFO", id_instance)
@@ -229,7 +310,14 @@ def main():
 
     # 6.1 Iniciar Hilo que controla los mb del browser
     log_and_save("🔍 Iniciando monitor de uso de RAM del navegador...", "INFO", id_instance)
-    thread_monitor_browser = threading.Thread(target=monitor_browser_process, args=(navigator_process, 1000, 250))
+    reciclar = None
+    if BROWSER_RECYCLE_MODE == "hot-swap":
+        reciclar = lambda: reciclar_navegador(url, navigator_name, formato)
+        # Reemplazos pre-lanzados: el reciclado no espera un arranque en frío
+        if BROWSER_POOL_SIZE > 0:
+            browser_pool = BrowserPool(navigator_name).start()
+    thread_monitor_browser = threading.Thread(target=monitor_browser_process,
+                                              args=(navigator_process, WATCHDOG_MAX_PSS_MB, WATCHDOG_MAX_RUNTIME, reciclar))
     thread_monitor_browser.start()
 
     log_and_save("🎯 System initialized successfully!", "INFO", id_instance)
@@ -255,15 +343,25 @@ def main():
     if navigator_manager:
         log_and_save("Cerrando navigator_manager...", "INFO", id_instance)
         navigator_manager.cleanup()
+    if browser_pool:
+        log_and_save("Cerrando pool de navegadores...", "INFO", id_instance)
+        browser_pool.close()
     if HEADLESS and xvfb_manager:
         log_and_save("Cerrando xvfb_manager...", "INFO", id_instance)
         xvfb_manager.stop_xvfb()
+        release_display(id_instance)
     log_and_save("✅ Todos los programas cerrados. Saliendo...", "INFO", id_instance)
     # Si el shutdown fue por RAM/tiempo (no por Ctrl+C), relanzar
     if shutdown_reason['auto'] and not shutdown_reason['sigint']:
+        if os.environ.get("AUDIO_CLIENT_SUPERVISED"):
+            # Bajo client/supervisor.py el relanzamiento lo hace el supervisor
+            log_and_save("♻️ Pidiendo relanzamiento al supervisor", "INFO", id_instance)
+            flush_logs()
+            os._exit(SUPERVISOR_EXIT_RECYCLE)
         levantar_script_misma_terminal()
 
     # Forzar salida de todos los hilos y procesos hijos
+    flush_logs()
     os._exit(0)
 
 if __name__ == "__main__":
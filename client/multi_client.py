@@ -0,0 +1,237 @@
+"""
+Cliente multi-canal en un solo proceso.
+
+En lugar de un intérprete de client/main.py por URL (levantar_varios_clientes.py),
+corre N AudioClientSession en un único proceso: un hilo lanza los navegadores de
+a uno, y el hilo principal atiende todas las capturas con un selector, leyendo
+de cada pipe solo cuando tiene datos. Todas las sesiones envían por un único
+socket UDP compartido, cada una con su propio SSRC y su metadata de canal.
+
+Uso:
+    python multi_client.py <Navegador> <Formato> <URL> [<URL> ...]
+    python multi_client.py Chromium ffmpeg "https://www.youtube.com/@luzutv/live" "https://www.youtube.com/@C5N/live"
+"""
+import os
+import queue
+import random
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+
+import psutil
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import flush_logs, log
+from config import MULTI_CLIENT_LAUNCH_DELAY, MULTI_CLIENT_STATS_INTERVAL, READINESS_TIMEOUT, BROWSER_POOL_SIZE
+from config import PLACEMENT_ENABLED
+
+from client.audio_client_session import AudioClientSession
+from pulse_native import NativeCapture
+from browser_pool import BrowserPool
+from main import extract_channel_name, send_channel_metadata
+from navigator_manager import Navigator
+from placement import apply_to_current_thread, apply_to_tree, plan
+
+
+class Channel:
+    """Estado de un canal: su sesión de audio, su navegador y su SSRC."""
+
+    def __init__(self, url, ssrc):
+        self.url = url
+        self.ssrc = ssrc
+        self.name = extract_channel_name(url)
+        self.session = AudioClientSession(ssrc)
+        self.navigator = None
+
+
+class MultiChannelClient:
+    def __init__(self, navigator_name, formato, urls):
+        self.navigator_name = navigator_name
+        self.formato = formato
+        self.urls = urls
+        self.channels = []
+        self.ready = queue.SimpleQueue()  # Canales con captura lanzada, pendientes de registrar en el selector
+        self.selector = selectors.DefaultSelector()
+        self.native_channels = set()  # Canales con captura nativa, atendidos por su propio hilo
+        self.shutdown_event = threading.Event()
+        self.pool = BrowserPool(navigator_name).start() if BROWSER_POOL_SIZE > 0 else None
+        # Un único socket de envío para todas las sesiones
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4<<20)
+
+    def new_ssrc(self):
+        used = {channel.ssrc for channel in self.channels}
+        while True:
+            ssrc = random.randint(10000, 100000)
+            if ssrc not in used:
+                return ssrc
+
+    def start_channel(self, url, slot=0):
+        """Crea sink, perfil y navegador del canal y lanza su captura. Devuelve el Channel o None."""
+        channel = Channel(url, self.new_ssrc())
+        self.channels.append(channel)
+        placement = plan(slot) if PLACEMENT_ENABLED else None
+        channel.session.placement = placement
+        if send_channel_metadata(channel.name, channel.ssrc):
+            channel.session.mark_ready("registered")
+        pooled = self.pool.claim(url, channel.ssrc) if self.pool else None
+        if pooled:
+            # Navegador pre-lanzado: ya tiene su sink, que pasa a ser de la sesión
+            channel.session.adopt_sink(pooled.sink_name, pooled.module_id)
+            channel.navigator = pooled.navigator
+            sink_name = pooled.sink_name
+            if placement:
+                apply_to_tree(channel.navigator.browser_process.pid, placement.browser_cores, placement.browser_nice)
+        else:
+            sink_name = channel.session.create_pulse_sink()
+            if not sink_name:
+                return None
+            channel.navigator = Navigator(self.navigator_name, sink_name, channel.ssrc)
+            channel.navigator.placement = placement
+            if not channel.navigator.create_navigator_profile():
+                return None
+            if not channel.navigator.launch_navigator(url):
+                return None
+        channel.session.wait_for_sink_input(READINESS_TIMEOUT)
+        channel.session.open_capture(f"{sink_name}.monitor", self.formato, sock=self.sock)
+        return channel
+
+    def launch_all(self):
+        """Hilo lanzador: arranca los canales de a uno, espaciados para no saturar la máquina."""
+        for index, url in enumerate(self.urls):
+            if self.shutdown_event.is_set():
+                return
+            log(f"🚀 [Multi] Canal {index + 1}/{len(self.urls)}: {url}", "INFO")
+            try:
+                channel = self.start_channel(url, index)
+            except Exception as e:
+                log(f"❌ [Multi] Error iniciando {url}: {e}", "ERROR")
+                channel = None
+            if channel:
+                self.ready.put(channel)
+            else:
+                log(f"❌ [Multi] No se pudo iniciar el canal {url}", "ERROR")
+            if index + 1 < len(self.urls):
+                self.shutdown_event.wait(MULTI_CLIENT_LAUNCH_DELAY)
+
+    def register_ready(self):
+        while True:
+            try:
+                channel = self.ready.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(channel.session.capture_process, NativeCapture):
+                # La captura nativa no tiene fd para el selector: se lee en su propio hilo
+                threading.Thread(target=self.pump_native, args=(channel,), name=f"capture-{channel.ssrc}",
+                                 daemon=True).start()
+            else:
+                self.selector.register(channel.session.capture_process.stdout, selectors.EVENT_READ, channel)
+            log(f"🎵 [Multi] Capturando {channel.name} (SSRC {channel.ssrc})", "INFO")
+
+    def pump_native(self, channel):
+        """Hilo de captura nativa: cada lectura bloquea hasta el próximo frame de 20 ms."""
+        if channel.session.placement:
+            apply_to_current_thread(channel.session.placement, channel.ssrc)
+        self.native_channels.add(channel)
+        try:
+            while not self.shutdown_event.is_set() and channel.session.pump_capture():
+                pass
+        except Exception as e:
+            log(f"⚠️ [Multi] Error enviando audio de {channel.name}: {e}", "ERROR")
+        finally:
+            self.native_channels.discard(channel)
+        if not self.shutdown_event.is_set():
+            log(f"⚠️ [Multi] La captura de {channel.name} terminó", "WARN")
+            channel.session.close_capture()
+
+    def drop_capture(self, channel):
+        try:
+            self.selector.unregister(channel.session.capture_process.stdout)
+        except (KeyError, ValueError):
+            pass  # Lanzada pero todavía no registrada, o captura nativa
+        channel.session.close_capture()
+
+    def log_usage(self, process):
+        active = len(self.selector.get_map()) + len(self.native_channels)
+        if not active:
+            return
+        rss_mb = process.memory_info().rss / 1024 / 1024
+        cpu = process.cpu_percent(interval=None)
+        log(f"📊 [Multi] {active} canales: {rss_mb:.1f} MB ({rss_mb / active:.1f} MB/canal), "
+            f"CPU {cpu:.1f}% ({cpu / active:.2f}%/canal)", "INFO")
+
+    def run(self):
+        """Bucle principal: atiende todas las capturas listas en un solo hilo."""
+        threading.Thread(target=self.launch_all, name="multi-launcher", daemon=True).start()
+        if PLACEMENT_ENABLED:
+            # Este hilo envía el audio de todas las capturas por pipe
+            apply_to_current_thread(plan(0))
+        process = psutil.Process()
+        process.cpu_percent(interval=None)
+        last_stats = time.monotonic()
+        while not self.shutdown_event.is_set():
+            self.register_ready()
+            if not self.selector.get_map():
+                if self.native_channels and time.monotonic() - last_stats >= MULTI_CLIENT_STATS_INTERVAL:
+                    last_stats = time.monotonic()
+                    self.log_usage(process)
+                self.shutdown_event.wait(0.5)
+                continue
+            for key, _ in self.selector.select(timeout=0.5):
+                channel = key.data
+                try:
+                    alive = channel.session.pump_capture()
+                except Exception as e:
+                    log(f"⚠️ [Multi] Error enviando audio de {channel.name}: {e}", "ERROR")
+                    alive = False
+                if not alive:
+                    log(f"⚠️ [Multi] La captura de {channel.name} terminó", "WARN")
+                    self.drop_capture(channel)
+            now = time.monotonic()
+            if now - last_stats >= MULTI_CLIENT_STATS_INTERVAL:
+                last_stats = now
+                self.log_usage(process)
+
+    def cleanup(self):
+        log("🛑 [Multi] Cerrando todos los canales...", "WARN")
+        if self.pool:
+            self.pool.close()
+        self.register_ready()
+        for channel in self.channels:
+            if channel.session.capture_process is not None:
+                self.drop_capture(channel)
+            channel.session.cleanup()
+            if channel.navigator:
+                channel.navigator.cleanup()
+        self.selector.close()
+        self.sock.close()
+        log("✅ [Multi] Todos los canales cerrados.", "SUCCESS")
+
+
+def main():
+    if len(sys.argv) < 4:
+        print(f"Usage: {sys.argv[0]} <Navegador> <Formato> <URL> [<URL> ...]")
+        print(f"\nExample: {sys.argv[0]} Chromium ffmpeg 'https://www.youtube.com/@todonoticias/live' 'https://www.youtube.com/@C5N/live'")
+        sys.exit(1)
+
+    client = MultiChannelClient(sys.argv[1], sys.argv[2].lower(), sys.argv[3:])
+
+    def signal_handler(sig, frame):
+        client.shutdown_event.set()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    try:
+        client.run()
+    finally:
+        client.cleanup()
+    flush_logs()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
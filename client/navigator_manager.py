@@ -2,14 +2,15 @@ import subprocess
 import os
 import random
 import sys
-import tempfile
 import psutil
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 
 from my_logger import log_and_save
-from flags_nav_ffmpeg.flags_comunes import CHROME_CHROMIUM_COMMON_FLAGS, GRAPHICS_MIN_FLAGS, PRODUCTION_FLAGS
+from config import PROFILE_TEMPLATE_ENABLED
+from flags_nav_ffmpeg.flags_comunes import CHROME_CHROMIUM_COMMON_FLAGS, GRAPHICS_MIN_FLAGS, INCOGNITO_FLAGS, PRODUCTION_FLAGS
+from profile_template import browser_binary, clone_profile, ensure_profile_template
 
 class Navigator():
     def __init__(self, name, sink_name, ssrc, headless = None):
@@ -18,9 +19,11 @@ class Navigator():
         self.sink_name = sink_name
         self.headless = headless
         self.ssrc = ssrc
+        self.placement = None  # placement.Placement: cores/nice del árbol del navegador
 
         self.browser_process = None
         self.navigator_profile_dir = None
+        self.profile_cloned = False  # Perfil copiado de la plantilla tibia: sin --incognito
 
         self.random_id = random.randint(10000, 99999)
 
@@ -43,6 +46,12 @@ class Navigator():
         else:
             profile_name = f"chrome-chromium-autoplay-{self.random_id}"
         self.navigator_profile_dir = os.path.join(base_dir, profile_name)
+        # Copia de la plantilla tibia si está habilitada; si no, perfil vacío como siempre
+        template = ensure_profile_template(self.navigator_name) if PROFILE_TEMPLATE_ENABLED else None
+        if template and not os.path.exists(self.navigator_profile_dir) \
+                and clone_profile(template, self.navigator_profile_dir):
+            self.profile_cloned = True
+            log_and_save(f"📋 Perfil clonado de la plantilla {template}", "INFO", self.ssrc)
         os.makedirs(self.navigator_profile_dir, exist_ok=True)
         return self.navigator_profile_dir
 
@@ -65,19 +74,13 @@ class Navigator():
             log_and_save(f"❌ Error lanzando {self.navigator_name}: {e}", "ERROR", self.ssrc)
             return None
 
-    def launch_chrome_chromium(self, url, env):
-        """Lanza Google Chrome o Chromium en modo headless usando el perfil creado y el display indicado, con afinidad/prioridad si es Linux."""
-        from flags_nav_ffmpeg.flags_comunes import CPU_FLAGS
-        import platform
+    def chrome_chromium_command(self, url):
         profile_args = [f"--user-data-dir={self.navigator_profile_dir}"]
-        navigator_name = self.navigator_name.lower()
-        if navigator_name == "chrome":
-            base_cmd = ["google-chrome"]
-        else:
-            base_cmd = ["chromium"]
+        base_cmd = [browser_binary(self.navigator_name)]
         cmd = (
             base_cmd
             + CHROME_CHROMIUM_COMMON_FLAGS
+            + ([] if self.profile_cloned else INCOGNITO_FLAGS)
             + GRAPHICS_MIN_FLAGS
             + PRODUCTION_FLAGS
             + profile_args
@@ -86,9 +89,32 @@ class Navigator():
 
         """if self.headless:
             cmd.insert(1, "--headless")"""
-        
+        return cmd
+
+    def launch_chrome_chromium(self, url, env):
+        """Lanza Google Chrome o Chromium en modo headless usando el perfil creado y el display indicado, con afinidad/prioridad si es Linux."""
+        cmd = self.chrome_chromium_command(url)
+        if self.placement:
+            cmd = self.placement.browser_prefix() + cmd
         return subprocess.Popen(cmd, env=env)
 
+    def open_url(self, url, timeout=15):
+        """
+        Abre `url` en el navegador ya lanzado (pool de navegadores): una segunda
+        invocación con el mismo perfil se la pasa al proceso existente por su
+        singleton y termina enseguida, sin un arranque en frío.
+        """
+        env = os.environ.copy()
+        env["PULSE_SINK"] = self.sink_name
+        try:
+            subprocess.run(self.chrome_chromium_command(url), env=env, timeout=timeout, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            log_and_save(f"🌐 URL abierta en el navegador pre-lanzado: {url}", "INFO", self.ssrc)
+            return True
+        except Exception as e:
+            log_and_save(f"❌ No se pudo abrir {url} en el navegador pre-lanzado: {e}", "ERROR", self.ssrc)
+            return False
+
 
     def terminate_child_processes(self, browser_process):
         if browser_process.poll() is None:  # el padre sigue vivo
@@ -0,0 +1,270 @@
+"""
+Ubicación de procesos por core y prioridad (solo Linux).
+
+Plan por sesión (slot):
+- Camino de audio (ffmpeg/parec, o el hilo de captura de Python en modo native,
+  y el hilo del pacer en modo de envío paced): los primeros PLACEMENT_AUDIO_CORES cores, con prioridad elevada (nice negativo
+  o SCHED_FIFO si se configura y hay permisos).
+- Árbol del navegador: un bloque de PLACEMENT_BROWSER_CORES cores del resto,
+  rotando por slot para repartir el render en forma pareja, con nice positivo.
+Los valores de CPU_FLAGS (flags_nav_ffmpeg/flags_comunes.py) pisan los del camino
+de audio: "taskset" (lista de cores), "nice" y "chrt" (prioridad SCHED_FIFO).
+
+Los procesos nuevos se lanzan con un prefijo de argv (taskset, chrt, nice), como
+los CPU_FLAGS: cada herramienta hace exec del comando, así el pid es el del proceso
+final y sus hijos lo heredan. No se usa preexec_fn: los clientes tienen muchos
+hilos y un preexec_fn en el hijo de un fork puede trabarse. Los hilos se ubican con
+apply_to_current_thread (en Linux afinidad, nice y política son por hilo). Sin
+permisos para subir prioridad se sigue igual con la afinidad.
+
+Uso:
+    python placement.py audit      # afinidad/nice/política efectivas de todos los procesos de los clientes
+    python placement.py plan 8     # plan que recibirían los slots 0..7
+"""
+import ctypes
+import os
+import resource
+import shutil
+import sys
+from dataclasses import dataclass
+
+import psutil
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import log_and_save
+from config import PLACEMENT_AUDIO_CORES, PLACEMENT_BROWSER_CORES, PLACEMENT_AUDIO_NICE, PLACEMENT_BROWSER_NICE
+from flags_nav_ffmpeg.flags_comunes import CPU_FLAGS
+
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_SCRIPTS = {os.path.join(CLIENT_DIR, name) for name in ("main.py", "multi_client.py", "supervisor.py")}
+SCHED_POLICIES = {os.SCHED_OTHER: "OTHER", os.SCHED_FIFO: "FIFO", os.SCHED_RR: "RR",
+                  getattr(os, "SCHED_BATCH", 3): "BATCH", getattr(os, "SCHED_IDLE", 5): "IDLE"}
+
+
+@dataclass
+class Placement:
+    slot: int
+    audio_cores: set
+    browser_cores: set
+    audio_nice: int
+    browser_nice: int
+    audio_rt_priority: int = 0  # > 0: SCHED_FIFO con esa prioridad
+
+    def audio_prefix(self):
+        return command_prefix(self.audio_cores, self.audio_nice, self.audio_rt_priority)
+
+    def browser_prefix(self):
+        return command_prefix(self.browser_cores, self.browser_nice)
+
+
+def parse_cores(spec):
+    """'0,2-3' -> {0, 2, 3}"""
+    cores = set()
+    for part in str(spec).split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cores.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cores.add(int(part))
+    return cores
+
+
+def format_cores(cores):
+    """{0, 2, 3} -> '0,2-3'"""
+    ranges = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def session_slot(ssrc):
+    """Slot de la sesión: el que asigna el supervisor (AUDIO_CLIENT_SLOT) o uno derivado del SSRC."""
+    return int(os.environ.get("AUDIO_CLIENT_SLOT", ssrc))
+
+
+def plan(slot):
+    cores = sorted(os.sched_getaffinity(0))
+    audio = cores[:PLACEMENT_AUDIO_CORES] if len(cores) > PLACEMENT_AUDIO_CORES else cores
+    rest = [core for core in cores if core not in audio] or cores
+    size = min(PLACEMENT_BROWSER_CORES, len(rest))
+    # Bloques consecutivos rotando por slot: los navegadores quedan repartidos parejo
+    start = (slot * size) % len(rest)
+    browser = {rest[(start + i) % len(rest)] for i in range(size)}
+    audio_cores = parse_cores(CPU_FLAGS["taskset"]) if "taskset" in CPU_FLAGS else set(audio)
+    return Placement(slot, audio_cores, browser, CPU_FLAGS.get("nice", PLACEMENT_AUDIO_NICE), PLACEMENT_BROWSER_NICE,
+                     CPU_FLAGS.get("chrt", 0))
+
+
+def apply_current(cores, nice, rt_priority=0):
+    """Aplica afinidad y prioridad al hilo/proceso actual. Devuelve los errores (permisos) como texto."""
+    errors = []
+    try:
+        os.sched_setaffinity(0, cores)
+    except OSError as e:
+        errors.append(f"afinidad {format_cores(cores)}: {e}")
+    if rt_priority > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(rt_priority))
+            return errors
+        except OSError as e:
+            errors.append(f"SCHED_FIFO {rt_priority}: {e}")
+    try:
+        # PRIO_PROCESS con 0 en Linux es el hilo que llama
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+    except OSError as e:
+        errors.append(f"nice {nice}: {e}")
+    return errors
+
+
+def has_cap_sys_nice():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("CapEff:"):
+                    return bool(int(line.split()[1], 16) >> 23 & 1)  # CAP_SYS_NICE
+    except OSError:
+        pass
+    return False
+
+
+def can_prioritize(nice=0, rt_priority=0):
+    """Sin CAP_SYS_NICE solo se puede lo que permiten RLIMIT_RTPRIO y RLIMIT_NICE."""
+    if has_cap_sys_nice():
+        return True
+    if rt_priority > 0:
+        return resource.getrlimit(resource.RLIMIT_RTPRIO)[0] >= rt_priority
+    return nice >= 0 or nice >= 20 - resource.getrlimit(resource.RLIMIT_NICE)[0]
+
+
+def command_prefix(cores, nice, rt_priority=0):
+    """
+    Prefijo de argv que ubica el comando: taskset -c <cores> y chrt -f <prio> o nice -n <nice>.
+    Lo que no se puede aplicar (herramienta ausente o sin permisos) se omite: chrt
+    sin permisos no ejecutaría el comando.
+    """
+    prefix = []
+    if cores and shutil.which("taskset"):
+        prefix += ["taskset", "-c", format_cores(cores)]
+    if rt_priority > 0 and can_prioritize(rt_priority=rt_priority) and shutil.which("chrt"):
+        return prefix + ["chrt", "-f", str(rt_priority)]
+    if nice and can_prioritize(nice) and shutil.which("nice"):
+        prefix += ["nice", "-n", str(nice)]
+    return prefix
+
+
+def set_thread_name(name):
+    """Nombre del hilo para el kernel (/proc/<pid>/task/<tid>/comm), así se ve en la auditoría y en top -H."""
+    try:
+        ctypes.CDLL(None).prctl(15, name.encode()[:15], 0, 0, 0)  # PR_SET_NAME
+    except (OSError, AttributeError):
+        pass
+
+
+def apply_to_current_thread(placement, ssrc=None, name="audio-capture"):
+    """Ubica el hilo que llama (captura o pacer) en los cores y la prioridad del camino de audio."""
+    set_thread_name(name)
+    errors = apply_current(placement.audio_cores, placement.audio_nice, placement.audio_rt_priority)
+    log_and_save(f"📌 Hilo {name} en cores {format_cores(placement.audio_cores)}"
+                 + (f" (sin permisos: {'; '.join(errors)})" if errors else ""), "INFO", ssrc)
+
+
+def apply_to_tree(pid, cores, nice):
+    """Reubica un árbol ya lanzado (navegador pre-lanzado del pool): el proceso y todos sus hijos."""
+    try:
+        parent = psutil.Process(pid)
+        procs = [parent] + parent.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return
+    for proc in procs:
+        try:
+            proc.cpu_affinity(sorted(cores))
+            proc.nice(nice)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+
+
+# --- Auditoría ---
+def client_script(proc, cmdline):
+    """Ruta absoluta del script que corre `proc` (argv[1] resuelto contra su cwd), o None."""
+    if len(cmdline) < 2:
+        return None
+    try:
+        return os.path.normpath(os.path.join(proc.cwd(), cmdline[1]))
+    except (psutil.AccessDenied, psutil.NoSuchProcess):
+        return None
+
+
+def client_processes():
+    """Procesos de clientes (client/main.py, multi_client.py, supervisor.py) y todos sus descendientes."""
+    seen = {}
+    for proc in psutil.process_iter(["pid", "cmdline"]):
+        cmdline = proc.info["cmdline"] or []
+        # Por ruta y no por nombre: el servidor también corre un main.py
+        if client_script(proc, cmdline) in CLIENT_SCRIPTS:
+            for member in [proc] + proc.children(recursive=True):
+                seen[member.pid] = member
+    return sorted(seen.values(), key=lambda p: p.pid)
+
+
+def describe(tid):
+    """(cores, nice, política) de un proceso o hilo."""
+    try:
+        cores = format_cores(os.sched_getaffinity(tid))
+        nice = os.getpriority(os.PRIO_PROCESS, tid)
+        policy = SCHED_POLICIES.get(os.sched_getscheduler(tid), "?")
+        priority = os.sched_getparam(tid).sched_priority
+    except OSError:
+        return None
+    return cores, nice, f"{policy}{f' {priority}' if priority else ''}"
+
+
+def thread_name(pid, tid):
+    try:
+        with open(f"/proc/{pid}/task/{tid}/comm") as f:
+            return f.read().strip()
+    except OSError:
+        return "?"
+
+
+def audit():
+    print(f"{'pid':>8} {'tid':>8}  {'proceso':<28}{'cores':<14}{'nice':>5}  política")
+    for proc in client_processes():
+        try:
+            name = proc.name()
+            threads = proc.threads() if name.startswith("python") else []
+        except psutil.NoSuchProcess:
+            continue
+        info = describe(proc.pid)
+        if info is None:
+            continue
+        cores, nice, policy = info
+        print(f"{proc.pid:>8} {'':>8}  {name:<28}{cores:<14}{nice:>5}  {policy}")
+        # Los hilos de Python (captura, envío) pueden tener su propia ubicación
+        for thread in threads:
+            if thread.id == proc.pid:
+                continue
+            info = describe(thread.id)
+            if info and info != (cores, nice, policy):
+                print(f"{'':>8} {thread.id:>8}  {'└ ' + thread_name(proc.pid, thread.id):<28}{info[0]:<14}{info[1]:>5}  {info[2]}")
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == "audit":
+        audit()
+    elif len(sys.argv) == 3 and sys.argv[1] == "plan":
+        print(f"{'slot':>5}  {'audio':<10}{'nice':>5}  {'navegador':<10}{'nice':>5}")
+        for slot in range(int(sys.argv[2])):
+            p = plan(slot)
+            print(f"{slot:>5}  {format_cores(p.audio_cores):<10}{p.audio_nice:>5}  "
+                  f"{format_cores(p.browser_cores):<10}{p.browser_nice:>5}")
+    else:
+        print(f"Usage: {sys.argv[0]} audit | plan <sesiones>")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Plantilla de perfil de Chrome/Chromium.
+
+En lugar de arrancar cada navegador con un perfil vacío (primer arranque completo:
+Local State, componentes, caché de shaders, preferencias), se prepara una vez un
+perfil "tibio" con una corrida headless y cada instancia recibe una copia. La copia
+usa `cp --reflink=auto`: en btrfs/xfs es copy-on-write (casi gratis) y en el resto
+cae a copia normal. No se usan hardlinks: Chromium modifica archivos del perfil en
+el lugar (SQLite, cachés) y estropearía la plantilla compartida.
+"""
+import fcntl
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from my_logger import log
+from config import PROFILE_TEMPLATE_DIR, PROFILE_TEMPLATE_WARMUP_TIMEOUT
+from flags_nav_ffmpeg.flags_comunes import CHROME_CHROMIUM_COMMON_FLAGS, GRAPHICS_MIN_FLAGS, PRODUCTION_FLAGS
+
+# Archivo que indica que la plantilla terminó de prepararse
+TEMPLATE_READY_FILE = ".template-ready"
+
+
+def browser_binary(navigator_name):
+    return "google-chrome" if navigator_name.lower() == "chrome" else "chromium"
+
+
+def template_path(navigator_name):
+    return os.path.expanduser(f"{PROFILE_TEMPLATE_DIR}-{navigator_name.lower()}")
+
+
+def warm_profile(navigator_name, profile_dir):
+    """Corrida headless que deja el perfil inicializado y termina sola (--dump-dom)."""
+    cmd = (
+        [browser_binary(navigator_name), "--headless=new"]
+        + CHROME_CHROMIUM_COMMON_FLAGS
+        + GRAPHICS_MIN_FLAGS
+        + PRODUCTION_FLAGS
+        + [f"--user-data-dir={profile_dir}", "--dump-dom", "about:blank"]
+    )
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   timeout=PROFILE_TEMPLATE_WARMUP_TIMEOUT, check=True)
+    # Los archivos de bloqueo del singleton no deben viajar en las copias
+    for name in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+        try:
+            os.unlink(os.path.join(profile_dir, name))
+        except FileNotFoundError:
+            pass
+    # Sentinel de primer uso, por si la versión no lo escribe en headless
+    open(os.path.join(profile_dir, "First Run"), "a").close()
+    open(os.path.join(profile_dir, TEMPLATE_READY_FILE), "a").close()
+
+
+def ensure_profile_template(navigator_name):
+    """
+    Devuelve la ruta de la plantilla del navegador, creándola si hace falta, o None
+    si no se pudo. Varios clientes pueden llamarla a la vez: el primero la arma (en
+    un directorio temporal que después se renombra) y el resto espera el lock.
+    """
+    template = template_path(navigator_name)
+    if os.path.exists(os.path.join(template, TEMPLATE_READY_FILE)):
+        return template
+    os.makedirs(os.path.dirname(template), exist_ok=True)
+    with open(f"{template}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(template, TEMPLATE_READY_FILE)):
+            return template
+        log(f"🛠️ Preparando plantilla de perfil de {navigator_name} en {template}", "INFO")
+        staging = tempfile.mkdtemp(prefix=".template-", dir=os.path.dirname(template))
+        try:
+            warm_profile(navigator_name, staging)
+            shutil.rmtree(template, ignore_errors=True)
+            os.rename(staging, template)
+        except Exception as e:
+            log(f"⚠️ No se pudo preparar la plantilla de perfil: {e}", "WARN")
+            shutil.rmtree(staging, ignore_errors=True)
+            return None
+    log(f"✅ Plantilla de perfil lista: {template}", "SUCCESS")
+    return template
+
+
+def clone_profile(template, profile_dir):
+    """Copia la plantilla en `profile_dir` (que no debe existir). Devuelve True si pudo."""
+    try:
+        subprocess.run(["cp", "-a", "--reflink=auto", template, profile_dir],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        # cp sin --reflink (no GNU): copia normal
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        try:
+            shutil.copytree(template, profile_dir, symlinks=True)
+        except Exception as e:
+            log(f"⚠️ No se pudo clonar la plantilla de perfil: {e}", "WARN")
+            shutil.rmtree(profile_dir, ignore_errors=True)
+            return False
+    try:
+        os.unlink(os.path.join(profile_dir, TEMPLATE_READY_FILE))
+    except FileNotFoundError:
+        pass
+    return True
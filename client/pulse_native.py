@@ -0,0 +1,164 @@
+"""
+Backend nativo de PulseAudio (también sirve con PipeWire vía pipewire-pulse).
+
+- Captura: libpulse-simple por ctypes. Cada lectura llena un frame de 20 ms
+  directo en el buffer de captura de la sesión, sin proceso hijo (ffmpeg/parec)
+  ni pipe en el medio. NativeCapture imita la interfaz de subprocess.Popen que usa
+  AudioClientSession (stdout.readinto, poll, terminate, wait), así el resto del
+  camino de envío no cambia.
+- Sinks: pulsectl (opcional) para cargar/descargar el module-null-sink y consultar
+  sinks y sink-inputs sin lanzar `pactl`. Sin pulsectl se sigue usando pactl.
+"""
+import ctypes
+import ctypes.util
+import threading
+
+from config import FRAME_SIZE, SAMPLE_RATE
+
+try:
+    import pulsectl
+except ImportError:
+    pulsectl = None
+
+PA_STREAM_RECORD = 2
+PA_SAMPLE_S16LE = 3
+PA_UINT32_DEFAULT = 0xFFFFFFFF  # (uint32_t) -1: valor por defecto del servidor
+FRAME_BYTES = FRAME_SIZE * 2
+
+
+class PaSampleSpec(ctypes.Structure):
+    _fields_ = [("format", ctypes.c_int), ("rate", ctypes.c_uint32), ("channels", ctypes.c_uint8)]
+
+
+class PaBufferAttr(ctypes.Structure):
+    _fields_ = [("maxlength", ctypes.c_uint32), ("tlength", ctypes.c_uint32), ("prebuf", ctypes.c_uint32),
+                ("minreq", ctypes.c_uint32), ("fragsize", ctypes.c_uint32)]
+
+
+def _load_pulse_simple():
+    path = ctypes.util.find_library("pulse-simple")
+    if not path:
+        return None
+    lib = ctypes.CDLL(path)
+    lib.pa_simple_new.restype = ctypes.c_void_p
+    lib.pa_simple_new.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p,
+                                  ctypes.POINTER(PaSampleSpec), ctypes.c_void_p, ctypes.POINTER(PaBufferAttr),
+                                  ctypes.POINTER(ctypes.c_int)]
+    lib.pa_simple_read.restype = ctypes.c_int
+    lib.pa_simple_read.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_int)]
+    lib.pa_simple_free.restype = None
+    lib.pa_simple_free.argtypes = [ctypes.c_void_p]
+    # pa_strerror está en libpulse, que libpulse-simple ya carga
+    lib.pa_strerror.restype = ctypes.c_char_p
+    lib.pa_strerror.argtypes = [ctypes.c_int]
+    return lib
+
+
+try:
+    libpulse_simple = _load_pulse_simple()
+except OSError:
+    libpulse_simple = None
+
+
+def native_capture_available():
+    return libpulse_simple is not None
+
+
+class NativeCapture:
+    """
+    Grabación de una fuente de PulseAudio (el .monitor de nuestro sink) en el
+    proceso. Se usa como un Popen de captura: `stdout` es el propio objeto.
+    Leer y cerrar desde hilos distintos es seguro: el cierre espera la lectura en curso.
+    """
+
+    def __init__(self, source, stream_name="audio-capture"):
+        if libpulse_simple is None:
+            raise RuntimeError("libpulse-simple no está disponible")
+        spec = PaSampleSpec(PA_SAMPLE_S16LE, SAMPLE_RATE, 1)
+        # fragsize de un frame: el servidor entrega cada 20 ms, no en bloques grandes
+        attr = PaBufferAttr(PA_UINT32_DEFAULT, PA_UINT32_DEFAULT, PA_UINT32_DEFAULT, PA_UINT32_DEFAULT, FRAME_BYTES)
+        error = ctypes.c_int(0)
+        self.handle = libpulse_simple.pa_simple_new(None, b"audio-client", PA_STREAM_RECORD, source.encode(),
+                                                    stream_name.encode(), ctypes.byref(spec), None,
+                                                    ctypes.byref(attr), ctypes.byref(error))
+        if not self.handle:
+            raise RuntimeError(f"pa_simple_new({source}): {libpulse_simple.pa_strerror(error.value).decode()}")
+        self.stdout = self
+        self.returncode = None
+        self.lock = threading.Lock()
+
+    def readinto(self, buffer):
+        """Lee un frame (o lo que quepa si `buffer` es más chico). Devuelve 0 si se cerró o falló."""
+        nbytes = min(len(buffer), FRAME_BYTES)
+        if nbytes == 0:
+            return 0
+        target = (ctypes.c_char * nbytes).from_buffer(buffer)
+        error = ctypes.c_int(0)
+        with self.lock:
+            if not self.handle:
+                return 0
+            if libpulse_simple.pa_simple_read(self.handle, target, nbytes, ctypes.byref(error)) < 0:
+                self.returncode = -error.value
+                return 0
+        return nbytes
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.close()
+
+    def communicate(self, timeout=None):
+        self.close()
+        return None, None
+
+    def close(self):
+        with self.lock:
+            if self.handle:
+                libpulse_simple.pa_simple_free(self.handle)
+                self.handle = None
+            if self.returncode is None:
+                self.returncode = 0
+
+    def wait(self, timeout=None):
+        self.close()
+        return self.returncode
+
+
+# --- Gestión de sinks con pulsectl ---
+_pulse = None
+_pulse_lock = threading.Lock()  # pulsectl no es thread-safe
+
+
+def _pulse_client():
+    global _pulse
+    if _pulse is None or not _pulse.connected:
+        _pulse = pulsectl.Pulse("audio-client-sinks")
+    return _pulse
+
+
+def sink_management_available():
+    return pulsectl is not None
+
+
+def load_module(name, args):
+    with _pulse_lock:
+        return str(_pulse_client().module_load(name, args))
+
+
+def unload_module(module_id):
+    with _pulse_lock:
+        _pulse_client().module_unload(int(module_id))
+
+
+def sink_index(sink_name):
+    with _pulse_lock:
+        for sink in _pulse_client().sink_list():
+            if sink.name == sink_name:
+                return str(sink.index)
+    return None
+
+
+def has_sink_input(sink_index):
+    with _pulse_lock:
+        return any(str(stream.sink) == sink_index for stream in _pulse_client().sink_input_list())
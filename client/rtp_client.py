@@ -1,51 +1,255 @@
 import socket
 import os
+import struct
 import sys
-from rtp import RTP, PayloadType
+import threading
+import time
+
+import numpy as np
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
-from my_logger import log_and_save
-from config import FRAME_SIZE, RTP_VERSION, DEST_IP, DEST_PORT
-# PAYLOAD_TYPE termina sobreescribiendose con el de la clase de la libreria rtp
-# Configuración RTP
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-def send_rtp_stream_to_server(data, ssrc, sequence_number):
-    total_len = len(data)
-    offset = 0
-    frame_bytes = FRAME_SIZE * 2
-    while offset < total_len:
-        frame = data[offset:offset + frame_bytes]
-        if not frame:
-            break
-        rtp_packet = create_rtp_packet(bytearray(frame), sequence_number, ssrc)
-        sock.sendto(rtp_packet.toBytearray(), (DEST_IP, DEST_PORT))
-        if sequence_number % 50 == 0:
-            log_and_save(f"📤 Enviado paquete seq {sequence_number} (raw stream)", "DEBUG", ssrc)
-        sequence_number = (sequence_number + 1) % 65536
-        offset += frame_bytes
-    return sequence_number
-
-
-def create_rtp_packet(payload, sequence_number, ssrc):
-    # Asegurar que payload es bytearray
-    if not isinstance(payload, bytearray):
-        payload = bytearray(payload)
-    
-    # Usar timestamp basado en samples, no en tiempo real
-    timestamp = sequence_number * FRAME_SIZE  # Timestamp basado en samples procesados
-    
-    rtp_packet = RTP(
-        version=RTP_VERSION,  # Usar valor directo 2
-        payloadType=PayloadType.DYNAMIC_96,  # Usar PayloadType enum
-        sequenceNumber=sequence_number,      # camelCase
-        timestamp=timestamp % 2**32,         # Timestamp predecible basado en samples
-        ssrc=ssrc,
-        payload=payload
-    )
-    return rtp_packet
+from my_logger import log_and_save, log_rate_limited
+from config import (FRAME_SIZE, SAMPLE_RATE, RTP_VERSION, DEST_IP, DEST_PORT, CLIENT_SEND_MODE, AUDIO_CODEC,
+                    PACED_QUEUE_FRAMES, PACED_BUCKET_FRAMES, PACED_STATS_INTERVAL, VAD_ENABLED,
+                    VAD_THRESHOLD_DBFS, VAD_HANGOVER_FRAMES, VAD_KEEPALIVE_SECONDS)
+from audio_codecs import get_codec
+from placement import apply_to_current_thread
+
+RTP_HEADER = struct.Struct("!BBHII")  # V/P/X/CC, M/PT, seq, timestamp, ssrc
+RTP_SEQ_TS = struct.Struct("!HI")  # seq y timestamp, a partir del byte 2 de la cabecera
+RTP_MARKER = 0x80  # Bit M en el byte 1 de la cabecera
+FRAME_BYTES = FRAME_SIZE * 2
+FRAME_SECONDS = FRAME_SIZE / SAMPLE_RATE
+
+
+class VoiceActivityDetector:
+    """
+    Detector de silencio por energía: compara la suma de cuadrados del frame
+    (un producto punto vectorizado) contra VAD_THRESHOLD_DBFS. Después del último
+    frame con voz sigue reportando actividad durante `hangover` frames.
+    """
+
+    def __init__(self, threshold_dbfs=VAD_THRESHOLD_DBFS, hangover=VAD_HANGOVER_FRAMES):
+        level = 32768 * 10 ** (threshold_dbfs / 20)
+        self.threshold = level * level  # Potencia media por sample
+        self.hangover = hangover
+        self.quiet_frames = hangover + 1  # Arranca como silencio
+
+    def is_active(self, frame):
+        samples = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        if np.dot(samples, samples) > self.threshold * len(samples):
+            self.quiet_frames = 0
+            return True
+        self.quiet_frames += 1
+        return self.quiet_frames <= self.hangover
+
+
+class RTPSender:
+    """
+    Emisor RTP sin asignaciones por paquete.
+
+    Mantiene una única cabecera de 12 bytes preasignada: por cada frame solo se
+    reescriben seq y timestamp en su lugar, y cabecera + payload salen juntos con
+    sendmsg (scatter-gather) por un socket UDP conectado, sin construir un objetos
+    RTP ni copiar el frame a un bytearray nuevo.
+
+    Con `sock` se usa un socket compartido entre varias sesiones (sin conectar,
+    cada sendmsg lleva el destino); ese socket no se cierra en close().
+    El frame PCM se codifica con `codec` (AUDIO_CODEC) y el payload type es el del codec.
+
+    Con `vad` los frames silenciosos no se envían: el timestamp avanza igual pero el
+    seq no (RFC 3551, 4.1), y el primer paquete después del silencio lleva el bit M.
+    Cada VAD_KEEPALIVE_SECONDS se envía un frame aunque sea silencio.
+    """
+
+    def __init__(self, ssrc, sequence_number=0, dest=(DEST_IP, DEST_PORT), codec=AUDIO_CODEC, sock=None,
+                 vad=VAD_ENABLED):
+        self.ssrc = ssrc
+        self.sequence_number = sequence_number
+        # Timestamp en samples, independiente del seq: da la vuelta en 2**32 como pide RFC 3550
+        self.timestamp = (sequence_number * FRAME_SIZE) % 2**32
+        self.codec = get_codec(codec)
+        self.encode = self.codec.encode
+        self.header = bytearray(RTP_HEADER.size)
+        RTP_HEADER.pack_into(self.header, 0, RTP_VERSION << 6, self.codec.payload_type & 0x7F,
+                             sequence_number, self.timestamp, ssrc)
+        self.owns_socket = sock is None
+        if self.owns_socket:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.connect(dest)
+            self.address = None
+        else:
+            self.sock = sock
+            self.address = dest
+        self.packets_sent = 0
+        self.send_errors = 0
+        self.vad = VoiceActivityDetector() if vad else None
+        self.suppressing = False
+        self.frames_suppressed = 0
+        self.last_sent = 0.0
+
+    def send_frame(self, frame):
+        """Envía un frame de audio (bytes, bytearray o memoryview) como un paquete RTP."""
+        if self.vad is not None and not self.vad.is_active(frame):
+            now = time.monotonic()
+            if now - self.last_sent < VAD_KEEPALIVE_SECONDS:
+                # Silencio suprimido: el frame ocupa su lugar en el tiempo pero no se envía
+                self.timestamp = (self.timestamp + FRAME_SIZE) & 0xFFFFFFFF
+                self.frames_suppressed += 1
+                self.suppressing = True
+                return
+        if self.suppressing:
+            self.header[1] |= RTP_MARKER
+        RTP_SEQ_TS.pack_into(self.header, 2, self.sequence_number, self.timestamp)
+        try:
+            payload = self.encode(frame)
+            if self.address is None:
+                self.sock.sendmsg((self.header, payload))
+            else:
+                self.sock.sendmsg((self.header, payload), (), 0, self.address)
+        except ConnectionRefusedError:
+            # En un socket conectado el ICMP "port unreachable" de un envío anterior vuelve
+            # como error: el servidor todavía no escucha, el frame se pierde igual que con sendto
+            self.send_errors += 1
+        if self.suppressing:
+            self.header[1] &= ~RTP_MARKER
+            self.suppressing = False
+        if self.vad is not None:
+            self.last_sent = time.monotonic()
+        if self.sequence_number % 50 == 0:
+            log_rate_limited(("tx", self.ssrc), f"📤 Enviado paquete seq {self.sequence_number} (raw stream)",
+                             "DEBUG", self.ssrc)
+        self.sequence_number = (self.sequence_number + 1) & 0xFFFF
+        self.timestamp = (self.timestamp + FRAME_SIZE) & 0xFFFFFFFF
+        self.packets_sent += 1
+
+    def close(self):
+        if self.vad is not None:
+            total = self.packets_sent + self.frames_suppressed
+            log_and_save(f"🔇 Frames de silencio no enviados: {self.frames_suppressed}/{total}", "INFO", self.ssrc)
+        if self.owns_socket:
+            self.sock.close()
+
+
+class PacedRTPSender:
+    """
+    Emisor RTP con pacing al reloj de frames.
+
+    send_frame() solo copia el frame a una cola circular preasignada; un hilo la
+    drena con un token bucket que se recarga a un token por frame (20 ms). Tras un
+    corte del pipe, los frames acumulados salen a ritmo real y a lo sumo
+    `bucket` seguidos para ponerse al día, en lugar de una ráfaga de decenas de
+    paquetes. Si la cola se llena se descarta el frame más viejo.
+
+    Métricas: profundidad de cola (actual/máxima), error de pacing (cuánto tarde
+    despierta el hilo respecto del token), frames enviados para ponerse al día
+    (a menos de medio frame del anterior) y frames descartados.
+    """
+
+    def __init__(self, ssrc, sequence_number=0, dest=(DEST_IP, DEST_PORT),
+                 queue_frames=PACED_QUEUE_FRAMES, bucket=PACED_BUCKET_FRAMES, sock=None, placement=None):
+        self.sender = RTPSender(ssrc, sequence_number, dest, sock=sock)
+        self.ssrc = ssrc
+        self.placement = placement  # placement.Placement: el pacer va con el camino de audio
+        self.capacity = queue_frames
+        self.queue = bytearray(queue_frames * FRAME_BYTES)
+        self.view = memoryview(self.queue)
+        self.head = 0
+        self.count = 0
+        self.bucket = bucket
+        self.closing = False
+        self.cond = threading.Condition()
+        self.stats = {
+            'sent': 0, 'dropped': 0, 'catchup_frames': 0, 'max_depth': 0,
+            'pacing_error_ms_avg': 0.0, 'pacing_error_ms_max': 0.0,
+        }
+        self.pacing_error_total = 0.0
+        self.pacing_waits = 0
+        self.thread = threading.Thread(target=self._run, name=f"rtp-pacer-{ssrc}", daemon=True)
+        self.thread.start()
+
+    @property
+    def sequence_number(self):
+        return self.sender.sequence_number
+
+    def send_frame(self, frame):
+        with self.cond:
+            if self.count == self.capacity:
+                # Cola llena: se descarta el más viejo para acotar la latencia
+                self.head = (self.head + 1) % self.capacity
+                self.count -= 1
+                self.stats['dropped'] += 1
+            tail = (self.head + self.count) % self.capacity * FRAME_BYTES
+            self.view[tail:tail + FRAME_BYTES] = frame
+            self.count += 1
+            if self.count > self.stats['max_depth']:
+                self.stats['max_depth'] = self.count
+            self.cond.notify()
+
+    def _record_pacing_error(self, error):
+        self.pacing_waits += 1
+        self.pacing_error_total += error
+        self.stats['pacing_error_ms_avg'] = round(1000 * self.pacing_error_total / self.pacing_waits, 3)
+        self.stats['pacing_error_ms_max'] = round(max(self.stats['pacing_error_ms_max'], 1000 * error), 3)
+
+    def _run(self):
+        if self.placement:
+            apply_to_current_thread(self.placement, self.ssrc, "rtp-pacer")
+        tokens = float(self.bucket)
+        last = time.monotonic()
+        last_stats = last
+        last_send = 0.0
+        while True:
+            with self.cond:
+                while not self.count and not self.closing:
+                    self.cond.wait()
+                if not self.count:
+                    break
+            now = time.monotonic()
+            tokens = min(self.bucket, tokens + (now - last) / FRAME_SECONDS)
+            last = now
+            if tokens < 1:
+                # Sin tokens: esperar al próximo tick del reloj de frames
+                target = now + (1 - tokens) * FRAME_SECONDS
+                time.sleep(target - now)
+                now = time.monotonic()
+                self._record_pacing_error(max(0.0, now - target))
+                tokens = min(self.bucket, tokens + (now - last) / FRAME_SECONDS)
+                last = now
+            elif now - last_send < FRAME_SECONDS / 2:
+                self.stats['catchup_frames'] += 1
+            tokens -= 1
+            last_send = now
+            with self.cond:
+                start = self.head * FRAME_BYTES
+                self.sender.send_frame(self.view[start:start + FRAME_BYTES])
+                self.head = (self.head + 1) % self.capacity
+                self.count -= 1
+            self.stats['sent'] += 1
+            if now - last_stats >= PACED_STATS_INTERVAL:
+                last_stats = now
+                log_and_save(f"⏱️ Pacer: {self.get_stats()}", "DEBUG", self.ssrc)
+
+    def get_stats(self):
+        with self.cond:
+            return dict(self.stats, depth=self.count, send_errors=self.sender.send_errors)
 
+    def close(self):
+        """Envía (con pacing) lo que quedó en la cola y cierra el socket."""
+        with self.cond:
+            self.closing = True
+            self.cond.notify()
+        self.thread.join(timeout=2 * self.capacity * FRAME_SECONDS)
+        log_and_save(f"⏱️ Pacer cerrado: {self.get_stats()}", "INFO", self.ssrc)
+        self.sender.close()
 
 
+def create_rtp_sender(ssrc, sequence_number=0, mode=CLIENT_SEND_MODE, sock=None, placement=None):
+    """
+    Devuelve el emisor RTP del modo configurado ("burst" o "paced"). En modo paced
+    `placement` ubica el hilo del pacer; en burst se envía desde el hilo de captura.
+    """
+    if mode == "paced":
+        return PacedRTPSender(ssrc, sequence_number, sock=sock, placement=placement)
+    return RTPSender(ssrc, sequence_number, sock=sock)
@@ -0,0 +1,284 @@
+"""
+Supervisor de clientes: levanta un client/main.py por canal y los vigila.
+
+A diferencia de levantar_varios_clientes.py (una terminal por cliente y 20 s fijos
+entre uno y otro):
+- Los arranques se escalonan según la carga medida del host (CPU y loadavg) y
+  cuántas sesiones siguen arrancando, no con un tiempo fijo.
+- Cada sesión que termina se reinicia: enseguida si pidió relanzarse (código
+  SUPERVISOR_EXIT_RECYCLE, el reciclado por RAM/tiempo de main.py), y con backoff
+  exponencial si falló. Una sesión sin consumo de CPU por SUPERVISOR_STALL_SECONDS
+  se considera colgada y se reinicia.
+- Cada SUPERVISOR_REPORT_INTERVAL se reporta uptime, reinicios y CPU/RSS de todo
+  el árbol de procesos (navegador, captura) de cada sesión.
+La salida de cada cliente va a client/logs/supervisor-<canal>.log.
+
+Uso:
+    python supervisor.py <Navegador> <Formato> <canales.txt | URL [URL ...]>
+    python supervisor.py Chromium ffmpeg canales.txt
+canales.txt: una URL por línea (las líneas vacías y las que empiezan con # se ignoran).
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import flush_logs, log
+from config import (SUPERVISOR_EXIT_RECYCLE, SUPERVISOR_MAX_CPU_PERCENT, SUPERVISOR_MAX_LOAD_PER_CORE,
+                    SUPERVISOR_MAX_STARTING, SUPERVISOR_STARTUP_GRACE, SUPERVISOR_MIN_LAUNCH_GAP,
+                    SUPERVISOR_HEALTHY_SECONDS, SUPERVISOR_BACKOFF_BASE, SUPERVISOR_BACKOFF_MAX,
+                    SUPERVISOR_STALL_SECONDS, SUPERVISOR_REPORT_INTERVAL)
+
+from main import extract_channel_name
+
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+
+
+def read_channels(args):
+    if len(args) == 1 and os.path.isfile(args[0]):
+        with open(args[0], encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+    return args
+
+
+def tree_usage(process):
+    """(segundos de CPU, RSS en bytes) sumados sobre el proceso y todos sus hijos."""
+    cpu = 0.0
+    rss = 0
+    try:
+        children = process.children(recursive=True)
+    except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+        # Terminó entre el poll() y esta medición: el próximo poll() lo reinicia
+        return cpu, rss
+    for proc in [process] + children:
+        try:
+            times = proc.cpu_times()
+            cpu += times.user + times.system
+            rss += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+            pass
+    return cpu, rss
+
+
+class Session:
+    """Un client/main.py supervisado."""
+
+    def __init__(self, url, slot):
+        self.url = url
+        self.slot = slot  # Índice fijo de la sesión: placement.py lo usa para repartir cores
+        self.name = extract_channel_name(url)
+        self.process = None
+        self.ps = None
+        self.started_at = None
+        self.next_start = 0.0  # monotonic: cuándo se puede (re)arrancar
+        self.restarts = 0
+        self.recycles = 0
+        self.failures = 0  # Fallos consecutivos, para el backoff
+        self.last_exit = None
+        # Vigilancia de CPU: detectar sesiones colgadas y medir entre reportes
+        self.cpu_seen = 0.0
+        self.cpu_seen_at = 0.0
+        self.cpu_reported = 0.0
+        self.reported_at = 0.0
+        self.rss = 0
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def starting(self, now):
+        return self.running and now - self.started_at < SUPERVISOR_STARTUP_GRACE
+
+    def start(self, navigator_name, formato):
+        env = os.environ.copy()
+        env["AUDIO_CLIENT_SUPERVISED"] = "1"
+        env["AUDIO_CLIENT_SLOT"] = str(self.slot)
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(os.path.join(LOG_DIR, f"supervisor-{self.name}.log"), "a") as output:
+            # start_new_session: Ctrl+C en la terminal del supervisor no le llega directo a los clientes
+            self.process = subprocess.Popen([sys.executable, CLIENT_SCRIPT, self.url, navigator_name, formato],
+                                            cwd=os.path.dirname(CLIENT_SCRIPT), env=env, stdout=output,
+                                            stderr=subprocess.STDOUT, start_new_session=True)
+        self.ps = psutil.Process(self.process.pid)
+        now = time.monotonic()
+        self.started_at = now
+        self.cpu_seen, self.rss = tree_usage(self.ps)
+        self.cpu_seen_at = self.reported_at = now
+        self.cpu_reported = self.cpu_seen
+        log(f"🚀 [Supervisor] {self.name} arrancado (pid {self.process.pid})", "INFO")
+
+    def stop(self, timeout=15):
+        if not self.running:
+            return
+        # El cliente hace su cleanup (navegador, sink, perfil) con SIGTERM
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            log(f"⚠️ [Supervisor] {self.name} no terminó, matando su grupo", "WARN")
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+
+    def stalled(self, now):
+        """True si el árbol no consumió CPU en SUPERVISOR_STALL_SECONDS (captura y envío siempre consumen algo)."""
+        cpu, self.rss = tree_usage(self.ps)
+        if cpu > self.cpu_seen:
+            self.cpu_seen, self.cpu_seen_at = cpu, now
+            return False
+        return now - self.started_at > SUPERVISOR_STARTUP_GRACE and now - self.cpu_seen_at > SUPERVISOR_STALL_SECONDS
+
+    def exited(self, now):
+        """Procesa la salida del cliente y programa el reinicio según la política."""
+        code = self.process.returncode
+        uptime = now - self.started_at
+        self.last_exit = code
+        self.process = None
+        self.ps = None
+        if code == SUPERVISOR_EXIT_RECYCLE:
+            # Reciclado pedido por el cliente: relanzar ya, no es un fallo
+            self.recycles += 1
+            self.failures = 0
+            self.next_start = now
+            log(f"♻️ [Supervisor] {self.name} pidió relanzamiento tras {uptime:.0f}s", "INFO")
+            return
+        self.restarts += 1
+        self.failures = 1 if uptime >= SUPERVISOR_HEALTHY_SECONDS else self.failures + 1
+        delay = min(SUPERVISOR_BACKOFF_MAX, SUPERVISOR_BACKOFF_BASE * 2 ** (self.failures - 1))
+        self.next_start = now + delay
+        log(f"❌ [Supervisor] {self.name} terminó con código {code} tras {uptime:.0f}s; "
+            f"reinicio en {delay:.0f}s (fallo consecutivo {self.failures})", "WARN")
+
+
+class Supervisor:
+    def __init__(self, navigator_name, formato, urls):
+        self.navigator_name = navigator_name
+        self.formato = formato
+        self.sessions = [Session(url, slot) for slot, url in enumerate(urls)]
+        self.shutdown_event = threading.Event()
+        self.last_launch = 0.0
+        self.cores = psutil.cpu_count() or 1
+
+    def host_busy(self, now):
+        """Motivo para no arrancar otra sesión ahora, o None."""
+        if now - self.last_launch < SUPERVISOR_MIN_LAUNCH_GAP:
+            return "separación mínima"
+        starting = sum(session.starting(now) for session in self.sessions)
+        if starting >= SUPERVISOR_MAX_STARTING:
+            return f"{starting} sesiones arrancando"
+        cpu = psutil.cpu_percent(interval=None)
+        if cpu > SUPERVISOR_MAX_CPU_PERCENT:
+            return f"CPU {cpu:.0f}%"
+        load = os.getloadavg()[0] / self.cores
+        if load > SUPERVISOR_MAX_LOAD_PER_CORE:
+            return f"load {load:.2f}/core"
+        return None
+
+    def check(self, now):
+        for session in self.sessions:
+            if session.process is None:
+                continue
+            if session.process.poll() is not None:
+                session.exited(now)
+            elif session.stalled(now):
+                log(f"🧊 [Supervisor] {session.name} sin actividad de CPU hace {SUPERVISOR_STALL_SECONDS}s, reiniciando",
+                    "WARN")
+                session.stop()
+                session.exited(now)
+
+    def launch_next(self, now):
+        """Arranca como mucho una sesión pendiente por vuelta, si el host lo permite."""
+        pending = [s for s in self.sessions if s.process is None and s.next_start <= now]
+        if not pending:
+            return
+        reason = self.host_busy(now)
+        if reason:
+            log(f"⏳ [Supervisor] {len(pending)} sesiones esperando ({reason})", "DEBUG")
+            return
+        session = min(pending, key=lambda s: s.next_start)
+        try:
+            session.start(self.navigator_name, self.formato)
+        except Exception as e:
+            log(f"❌ [Supervisor] No se pudo arrancar {session.name}: {e}", "ERROR")
+            session.failures += 1
+            session.next_start = now + min(SUPERVISOR_BACKOFF_MAX, SUPERVISOR_BACKOFF_BASE * 2 ** (session.failures - 1))
+        self.last_launch = now
+
+    def report(self, now):
+        lines = [f"{'canal':<20}{'pid':>8}{'uptime':>10}{'reinicios':>11}{'reciclados':>12}{'CPU %':>8}{'RSS MB':>9}"]
+        total_cpu = total_rss = 0.0
+        for session in self.sessions:
+            if session.running:
+                cpu, rss = tree_usage(session.ps)
+                elapsed = max(now - session.reported_at, 1e-6)
+                cpu_pct = 100 * (cpu - session.cpu_reported) / elapsed
+                session.cpu_reported, session.reported_at = cpu, now
+                total_cpu += cpu_pct
+                total_rss += rss
+                lines.append(f"{session.name:<20}{session.process.pid:>8}{max(0.0, now - session.started_at):>9.0f}s"
+                             f"{session.restarts:>11}{session.recycles:>12}{cpu_pct:>8.1f}{rss / 1024 / 1024:>9.1f}")
+            else:
+                wait = max(0.0, session.next_start - now)
+                lines.append(f"{session.name:<20}{'-':>8}{'-':>10}{session.restarts:>11}{session.recycles:>12}"
+                             f"{'':>8}{'':>9}  detenido (código {session.last_exit}, próximo intento en {wait:.0f}s)")
+        lines.append(f"{'total':<20}{'':>8}{'':>10}{'':>11}{'':>12}{total_cpu:>8.1f}{total_rss / 1024 / 1024:>9.1f}")
+        log("📊 [Supervisor] Estado de las sesiones:\n" + "\n".join(lines), "INFO")
+
+    def run(self):
+        psutil.cpu_percent(interval=None)
+        last_report = time.monotonic()
+        while not self.shutdown_event.is_set():
+            now = time.monotonic()
+            self.check(now)
+            self.launch_next(now)
+            if now - last_report >= SUPERVISOR_REPORT_INTERVAL:
+                last_report = now
+                self.report(now)
+            self.shutdown_event.wait(1)
+
+    def stop_all(self):
+        log("🛑 [Supervisor] Deteniendo todas las sesiones...", "WARN")
+        running = [session for session in self.sessions if session.running]
+        for session in running:
+            session.process.terminate()
+        for session in running:
+            session.stop()
+        log("✅ [Supervisor] Todas las sesiones detenidas.", "SUCCESS")
+
+
+def main():
+    if len(sys.argv) < 4:
+        print(f"Usage: {sys.argv[0]} <Navegador> <Formato> <canales.txt | URL [URL ...]>")
+        print(f"\nExample: {sys.argv[0]} Chromium ffmpeg canales.txt")
+        sys.exit(1)
+
+    urls = read_channels(sys.argv[3:])
+    if not urls:
+        print("No hay canales para supervisar")
+        sys.exit(1)
+    supervisor = Supervisor(sys.argv[1], sys.argv[2].lower(), urls)
+
+    def signal_handler(sig, frame):
+        supervisor.shutdown_event.set()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    log(f"🎯 [Supervisor] Supervisando {len(urls)} canales", "INFO")
+    try:
+        supervisor.run()
+    finally:
+        supervisor.stop_all()
+    flush_logs()
+
+
+if __name__ == "__main__":
+    main()
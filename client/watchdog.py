@@ -0,0 +1,189 @@
+"""
+Watchdog de recursos del árbol completo del navegador.
+
+El proceso padre de Chromium tiene poca memoria: la mayor parte está en los
+renderers, el proceso GPU y las utilidades. Cada WATCHDOG_INTERVAL se suma sobre
+todo el árbol (psutil, recursivo):
+- PSS (la memoria compartida entre procesos del árbol se reparte en lugar de
+  contarse varias veces) y USS; si /proc/<pid>/smaps no es legible, RSS.
+- CPU en % de un core.
+Con las muestras de los últimos WATCHDOG_TREND_SECONDS se estima la tasa de
+crecimiento de PSS (mínimos cuadrados) y cuándo se cruzaría el límite.
+
+Decisión:
+- "now": límite de PSS o de tiempo ya alcanzado, o CPU sostenida arriba del
+  máximo: se recicla enseguida.
+- "soon": el cruce predicho cae dentro de WATCHDOG_LEAD_SECONDS. Se recicla en el
+  primer momento de bajo impacto (audio en pausa y host sin carga) o, como tarde,
+  WATCHDOG_SAFETY_SECONDS antes del cruce predicho.
+Si la memoria no crece no se recicla: solo el límite de tiempo como red de seguridad.
+"""
+import os
+import sys
+import time
+from collections import deque
+
+import psutil
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import log_and_save
+from config import (WATCHDOG_INTERVAL, WATCHDOG_MAX_PSS_MB, WATCHDOG_MAX_RUNTIME, WATCHDOG_MAX_CPU_PERCENT,
+                    WATCHDOG_CPU_SUSTAIN, WATCHDOG_TREND_SECONDS, WATCHDOG_LEAD_SECONDS, WATCHDOG_SAFETY_SECONDS,
+                    WATCHDOG_QUIET_SECONDS, WATCHDOG_HOST_CPU_MAX, WATCHDOG_LOG_EVERY)
+
+MB = 1024 * 1024
+
+
+def format_eta(seconds):
+    if seconds == float("inf"):
+        return "sin cruce"
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}h{minutes % 60:02d}m" if minutes >= 60 else f"{minutes}m{int(seconds % 60):02d}s"
+
+
+def tree_memory(proc):
+    """(pss, uss) de un proceso; RSS en ambos si smaps no es legible."""
+    try:
+        info = proc.memory_full_info()
+        return getattr(info, "pss", info.rss), getattr(info, "uss", info.rss)
+    except psutil.AccessDenied:
+        rss = proc.memory_info().rss
+        return rss, rss
+
+
+class ResourceWatchdog:
+    def __init__(self, pid, ssrc=None, max_pss_mb=WATCHDOG_MAX_PSS_MB, max_runtime=WATCHDOG_MAX_RUNTIME,
+                 max_cpu_percent=WATCHDOG_MAX_CPU_PERCENT):
+        self.ssrc = ssrc
+        self.max_pss = max_pss_mb * MB
+        self.max_runtime = max_runtime
+        self.max_cpu_percent = max_cpu_percent
+        self.recycles = 0
+        self.reset(pid)
+
+    def reset(self, pid):
+        """Empieza a vigilar un árbol nuevo (tras un reciclado)."""
+        self.root = psutil.Process(pid)
+        self.started_at = time.monotonic()
+        self.samples = deque()  # (t, pss)
+        self.cpu_by_pid = {}  # pid -> segundos de CPU en la muestra anterior
+        self.sampled_at = None
+        self.hot_samples = 0
+        self.sample_count = 0
+        self.deadline = None  # Reciclado "soon" programado para como tarde este momento
+
+    def sample(self):
+        """Suma PSS/USS/CPU sobre todo el árbol. Lanza psutil.NoSuchProcess si el navegador terminó."""
+        now = time.monotonic()
+        procs = [self.root] + self.root.children(recursive=True)
+        pss = uss = 0
+        cpu_delta = 0.0
+        cpu_by_pid = {}
+        for proc in procs:
+            try:
+                proc_pss, proc_uss = tree_memory(proc)
+                times = proc.cpu_times()
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                if proc is self.root:
+                    raise
+                continue
+            pss += proc_pss
+            uss += proc_uss
+            cpu = times.user + times.system
+            cpu_by_pid[proc.pid] = cpu
+            # Los procesos nuevos cuentan desde su creación recién en la próxima muestra
+            cpu_delta += cpu - self.cpu_by_pid.get(proc.pid, cpu)
+        cpu_percent = 100 * cpu_delta / (now - self.sampled_at) if self.sampled_at else 0.0
+        self.cpu_by_pid = cpu_by_pid
+        self.sampled_at = now
+        self.samples.append((now, pss))
+        while self.samples and now - self.samples[0][0] > WATCHDOG_TREND_SECONDS:
+            self.samples.popleft()
+        self.hot_samples = self.hot_samples + 1 if cpu_percent > self.max_cpu_percent else 0
+        self.sample_count += 1
+        return {"procs": len(procs), "pss": pss, "uss": uss, "cpu": cpu_percent}
+
+    def growth_rate(self):
+        """Pendiente de PSS en bytes/s (mínimos cuadrados); 0 sin historia suficiente."""
+        if len(self.samples) < 3 or self.samples[-1][0] - self.samples[0][0] < WATCHDOG_TREND_SECONDS / 4:
+            return 0.0
+        n = len(self.samples)
+        mean_t = sum(t for t, _ in self.samples) / n
+        mean_m = sum(m for _, m in self.samples) / n
+        var = sum((t - mean_t) ** 2 for t, _ in self.samples)
+        if var == 0:
+            return 0.0
+        return sum((t - mean_t) * (m - mean_m) for t, m in self.samples) / var
+
+    def assess(self, usage):
+        """("ok" | "soon" | "now", motivo, segundos hasta el límite más cercano)."""
+        uptime = time.monotonic() - self.started_at
+        if usage["pss"] >= self.max_pss:
+            return "now", f"PSS {usage['pss'] / MB:.0f} MB ≥ {self.max_pss / MB:.0f} MB", 0.0
+        if uptime >= self.max_runtime:
+            return "now", f"tiempo de vida {format_eta(uptime)}", 0.0
+        if self.hot_samples >= WATCHDOG_CPU_SUSTAIN:
+            return "now", f"CPU {usage['cpu']:.0f}% sostenida", 0.0
+        rate = self.growth_rate()
+        eta_memory = (self.max_pss - usage["pss"]) / rate if rate > 0 else float("inf")
+        eta = min(eta_memory, self.max_runtime - uptime)
+        if eta <= WATCHDOG_LEAD_SECONDS:
+            reason = (f"PSS creciendo {rate * 60 / MB:.1f} MB/min" if eta_memory <= eta
+                      else "fin del tiempo de vida")
+            return "soon", f"{reason}, límite en {format_eta(eta)}", eta
+        return "ok", "", eta
+
+    def low_impact_moment(self, quiet_seconds):
+        """Momento barato para reciclar: el audio está en pausa y el host tiene CPU libre."""
+        if quiet_seconds() < WATCHDOG_QUIET_SECONDS:
+            return False
+        return psutil.cpu_percent(interval=None) < WATCHDOG_HOST_CPU_MAX
+
+    def run(self, stop_event, recycle, quiet_seconds=lambda: 0.0, on_soon=None):
+        """
+        Bucle del watchdog. `recycle()` devuelve el proceso del navegador nuevo o None;
+        con None el bucle termina y devuelve el motivo (el llamador relanza todo).
+        `quiet_seconds()` dice hace cuánto el audio está en pausa; `on_soon(bool)`
+        avisa cuando hay un reciclado pendiente (para empezar a medir el audio).
+        Devuelve None si terminó por stop_event.
+        """
+        log_and_save(f"🐕 Watchdog del árbol del navegador (PSS máx {self.max_pss / MB:.0f} MB, "
+                     f"vida máx {format_eta(self.max_runtime)})", "INFO", self.ssrc)
+        psutil.cpu_percent(interval=None)
+        while not stop_event.wait(WATCHDOG_INTERVAL):
+            usage = self.sample()
+            state, reason, eta = self.assess(usage)
+            if self.sample_count % WATCHDOG_LOG_EVERY == 0:
+                log_and_save(f"🐕 Navegador: {usage['procs']} procesos, PSS {usage['pss'] / MB:.0f} MB "
+                             f"(USS {usage['uss'] / MB:.0f}), {self.growth_rate() * 60 / MB:+.1f} MB/min, "
+                             f"límite en {format_eta(eta)}, CPU {usage['cpu']:.0f}%", "INFO", self.ssrc)
+            if state == "soon":
+                now = time.monotonic()
+                if self.deadline is None:
+                    self.deadline = now + max(0.0, eta - WATCHDOG_SAFETY_SECONDS)
+                    log_and_save(f"⏳ Reciclado programado ({reason}): en el próximo momento de bajo impacto, "
+                                 f"a más tardar en {format_eta(self.deadline - now)}", "INFO", self.ssrc)
+                    if on_soon:
+                        on_soon(True)
+                if self.low_impact_moment(quiet_seconds):
+                    reason += "; momento de bajo impacto"
+                elif now < self.deadline:
+                    continue
+                else:
+                    reason += "; se agotó la espera de un momento de bajo impacto"
+            elif state == "ok":
+                if self.deadline is not None and on_soon:
+                    on_soon(False)  # La tendencia se calmó
+                self.deadline = None
+                continue
+            log_and_save(f"♻️ Reciclando navegador: {reason} (PSS {usage['pss'] / MB:.0f} MB, "
+                         f"vida {format_eta(time.monotonic() - self.started_at)})", "WARN", self.ssrc)
+            if on_soon:
+                on_soon(False)
+            process = recycle()
+            if not process:
+                return reason
+            self.recycles += 1
+            self.reset(process.pid)
+        return None
@@ -1,70 +1,143 @@
 """
 Gestión del servidor X virtual (Xvfb) para el proyecto de automatización.
+
+El display lo asigna el pool del servidor (server/display_pool.py) y puede tocarle
+a varios clientes: el primero arranca Xvfb y los demás reusan el que ya está
+corriendo. Los usuarios de cada display se anotan en /tmp/xvfb-<n>.json (bajo
+flock); el último en salir lo detiene. Xvfb arranca en su propia sesión para no
+morir con el cliente que lo lanzó mientras otros lo siguen usando.
+
+La disponibilidad se verifica conectando al socket /tmp/.X11-unix/X<n> en lugar de
+lanzar un xdpyinfo por intento.
 """
+import fcntl
+import json
 import os
+import signal
+import socket
 import subprocess
 import time
 import sys
-import threading
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 from my_logger import log
-from config import XVFB_SCREEN, XVFB_RESOLUTION
+from config import XVFB_SCREEN, XVFB_RESOLUTION, XVFB_READY_TIMEOUT
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def display_ready(number):
+    """True si el servidor X del display acepta conexiones en su socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(f"/tmp/.X11-unix/X{number}")
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
 
 class Xvfb_manager():
     def __init__(self, display_number):
         self.xvfb_process = None
-        self.display_number = display_number
+        self.display_number = display_number  # ":12"
+        self.number = display_number.lstrip(":")
+        self.state_path = f"/tmp/xvfb-{self.number}.json"
+
+    def locked_state(self, update):
+        """Lee, modifica con update(state) y guarda el registro de usuarios del display bajo flock."""
+        with open(f"/tmp/xvfb-{self.number}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {"xvfb": None, "users": []}
+            state["users"] = [pid for pid in state["users"] if pid != os.getpid() and pid_alive(pid)]
+            result = update(state)
+            with open(self.state_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(self.state_path + ".tmp", self.state_path)
+            return result
+
+    def wait_ready(self, timeout=XVFB_READY_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if display_ready(self.number):
+                return True
+            if self.xvfb_process and self.xvfb_process.poll() is not None:
+                return False
+            time.sleep(0.05)
+        return False
 
     def start_xvfb(self,):
         """
-        Inicia el servidor X virtual (Xvfb).
-        
+        Inicia el servidor X virtual (Xvfb) o se suma al que ya corre en el display.
+
         Returns:
-            subprocess.Popen: Proceso de Xvfb iniciado
+            subprocess.Popen | bool: Proceso de Xvfb iniciado, True si se reusa uno existente, None si falla
         """
-        log(f"Iniciando Xvfb con DISPLAY: {self.display_number}")
-        xvfb_proc = subprocess.Popen([
-            "Xvfb", self.display_number, 
-            "-screen", XVFB_SCREEN, XVFB_RESOLUTION,
-            "-nolisten", "tcp",  # No escuchar conexiones TCP
-            "-noreset",          # No reiniciar cuando se desconecta el último cliente
-            "+extension", "RANDR"  # Extensión para cambio de resolución
-        ])
+        def register(state):
+            state["users"].append(os.getpid())
+            if display_ready(self.number):
+                return "shared"
+            log(f"Iniciando Xvfb con DISPLAY: {self.display_number}")
+            self.xvfb_process = subprocess.Popen([
+                "Xvfb", self.display_number,
+                "-screen", XVFB_SCREEN, XVFB_RESOLUTION,
+                "-nolisten", "tcp",  # No escuchar conexiones TCP
+                "-noreset",          # No reiniciar cuando se desconecta el último cliente
+                "+extension", "RANDR"  # Extensión para cambio de resolución
+            ], start_new_session=True)
+            state["xvfb"] = self.xvfb_process.pid
+            # Se espera con el lock tomado: otro cliente del mismo display no lanza un segundo Xvfb
+            return "started" if self.wait_ready() else "failed"
+
+        started_at = time.monotonic()
+        result = self.locked_state(register)
         os.environ["DISPLAY"] = self.display_number
-        
-        # Verificación activa en lugar de sleep fijo
-        log("Esperando que Xvfb esté listo...")
-        for attempt in range(10):  # Máximo 2 segundos (10 * 0.2s)
-            try:
-                # Verificar si Xvfb está respondiendo
-                result = subprocess.run(
-                    ["xdpyinfo", "-display", self.display_number], 
-                    capture_output=True, 
-                    timeout=0.5
-                )
-                if result.returncode == 0:
-                    log(f"Xvfb listo en {(attempt + 1) * 0.2:.1f}s", "SUCCESS")
-                    return xvfb_proc
-            except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
-                log("❌ Xvfb no está listo", "ERROR")
-                return None
-            time.sleep(0.2)
-        
-        # Fallback: si no se puede verificar, asumir que está listo
-        log("Xvfb iniciado (verificación timeout)", "SUCCESS")
-        return xvfb_proc
+        if result == "shared":
+            log(f"♻️ Xvfb ya corriendo en {self.display_number}: se comparte", "SUCCESS")
+            return True
+        if result == "failed":
+            log(f"❌ Xvfb no está listo en {self.display_number}", "ERROR")
+            self.stop_xvfb()
+            return None
+        log(f"Xvfb listo en {time.monotonic() - started_at:.2f}s", "SUCCESS")
+        return self.xvfb_process
 
 
     def stop_xvfb(self,):
         """
-        Detiene el servidor X virtual (Xvfb).
-        
-        Args:
-            xvfb_proc (subprocess.Popen): Proceso de Xvfb a detener
+        Deja el display; si no quedan otros usuarios detiene Xvfb.
         """
+        def unregister(state):
+            if state["users"]:
+                return "in-use"
+            pid, state["xvfb"] = state["xvfb"], None
+            return pid
+
+        pid = self.locked_state(unregister)
+        if pid == "in-use":
+            log(f"✅ Cleanup: Xvfb {self.display_number} sigue en uso por otros clientes.", "SUCCESS")
+            return
+        if pid is None:  # Xvfb lanzado fuera del cliente: no es nuestro
+            return
         log("Closing Xvfb...")
-        self.xvfb_process.terminate()
-        self.xvfb_process.wait()
-        log("✅ Cleanup: Xvfb complete.", "SUCCESS")
\ No newline at end of file
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        if self.xvfb_process:
+            self.xvfb_process.wait()
+        log("✅ Cleanup: Xvfb complete.", "SUCCESS")
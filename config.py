@@ -10,17 +10,23 @@ SAMPLE_FORMAT = "int16"
 # Configuracion para el Cliente: Dirección IP y puerto del servidor RTP
 DEST_IP = "192.168.47.128"  
 DEST_PORT = 6001
-METADATA_PORT = 6002
+CONTROL_PORT = 6002  # Plano de control: registro SSRC -> canal y leases de display (request/response con ack)
 # Configuracion para el Servidor: Dirección IP y puerto del cliente RTP
 LISTEN_IP = "192.168.47.128" # Debe ser la de la misma máquina Host 192.168.47.128
 LISTEN_PORT = 6001 # Puerto de escucha del cliente RTP, debe ser el mismo que DEST_PORT
-NUM_DISPLAY_PORT = 6003
 
 # Configuracion para XVFB
 XVFB_DISPLAY = None
 XVFB_SCREEN = "0"
 #XVFB_RESOLUTION = "1920x1080x24"
 XVFB_RESOLUTION = "1024x768x24"
+XVFB_READY_TIMEOUT = 5  # Espera máxima a que el socket del display acepte conexiones (s)
+# Pool de displays del servidor (leases por SSRC en lugar de len(channel_map) + 10)
+DISPLAY_POOL_BASE = 10  # Primer número de display del pool
+DISPLAY_POOL_SIZE = 100  # Cantidad de displays del pool
+DISPLAY_LEASE_SECONDS = 120  # Un lease sin renovar vence y el display vuelve al pool
+DISPLAY_RENEW_INTERVAL = 30  # Cada cuánto renueva el cliente su lease (s)
+DISPLAY_BROWSERS_PER_DISPLAY = 4  # Navegadores que comparten un mismo Xvfb (1 = uno por cliente)
 # Configuracion para el WAV y el JITTER BUFFER
 INACTIVITY_TIMEOUT = 3 # segundos de inactividad para cerrar WAV
 
@@ -30,5 +36,104 @@ PREFILL_MS = 200  # queremos 200 ms
 JITTER_BUFFER_SIZE = int(PREFILL_MS / FRAME_DURATION_MS)
 
 MAX_WAIT = 0.2  # Máximo tiempo de espera para procesar paquetes en el jitter buffer
+JITTER_RING_CAPACITY = 256  # Paquetes por stream en el anillo del jitter buffer (256 * 20 ms = 5.12 s)
+JITTER_MODE = "fixed"  # "fixed" (prefill JITTER_BUFFER_SIZE y espera fija) o "adaptive" (según el jitter de cada SSRC)
+ADAPTIVE_MIN_DEPTH = 2  # Profundidad mínima (y prefill) en modo adaptativo, en paquetes
+ADAPTIVE_MAX_DEPTH = 50  # Profundidad máxima en modo adaptativo (50 * 20 ms = 1 s)
+ADAPTIVE_JITTER_K = 4  # Margen de espera en múltiplos del jitter estimado
+ADAPTIVE_MIN_WAIT = 0.04  # Espera mínima antes de declarar un paquete perdido (s)
+ADAPTIVE_MAX_WAIT = 1.0  # Espera máxima antes de declarar un paquete perdido (s)
+DTX_MAX_FILL_SECONDS = 10  # Hueco máximo de silencio suprimido (bit M) que se rellena; más grande es una discontinuidad
 WAV_SEGMENT_SECONDS = 180  # Segundos de cada segmento WAV
+WAV_FLUSH_BYTES = FRAME_SIZE * 2 * 50  # Buffer por cliente antes de escribir a disco (1 s de audio)
+WAV_FLUSH_INTERVAL = 1.0  # Segundos máximos que un frame puede quedar en el buffer sin bajar a disco
+SEGMENT_FORMAT = "wav"  # "wav", "wav-mmap" (preasignado y mapeado), "flac" (libsndfile) o "flac-process" (encoder externo)
+FLAC_ENCODER_CMD = [  # Encoder para "flac-process": lee PCM s16le crudo por stdin (se agrega "-o <archivo> -")
+    "flac", "--silent", "--force", "--force-raw-format", "--endian=little", "--sign=signed",
+    f"--channels={CHANNELS}", "--bps=16", f"--sample-rate={SAMPLE_RATE}", "-5",
+]
+DISK_WRITER_THREADS = 2  # Hilos escritores dueños de los archivos WAV
+DISK_QUEUE_BLOCKS = 256  # Bloques PCM encolados como máximo por hilo escritor
+DISK_QUEUE_TIMEOUT = 0.05  # Espera máxima de un worker con la cola llena antes de descartar el bloque (s)
+DISK_BLOCK_BYTES = FRAME_SIZE * 2 * 10  # Tamaño de bloque que cada worker entrega al escritor (200 ms)
+DISK_BLOCK_MAX_DELAY = 0.2  # Antigüedad máxima de un bloque parcial antes de entregarlo (s)
 
+
+# Arranque del cliente por readiness (en lugar de sleeps fijos)
+CONTROL_TIMEOUT = 0.5  # Espera de la respuesta del plano de control por intento (s)
+CONTROL_RETRIES = 5  # Reintentos de un pedido de control sin respuesta (todos los pedidos son idempotentes)
+READINESS_TIMEOUT = 60  # Espera máxima a que el navegador reproduzca en nuestro sink antes de capturar igual (s)
+READINESS_AUDIO_GATE = True  # No enviar nada hasta el primer frame con audio (se descarta el silencio inicial)
+
+# Reciclado del navegador al llegar al límite de RAM/tiempo
+BROWSER_RECYCLE_MODE = "hot-swap"  # "hot-swap" (navegador nuevo en un segundo sink, mismo SSRC) o "relaunch" (os.execv del script)
+HOT_SWAP_SWITCH_TIMEOUT = 5  # Espera a que el hilo de captura tome el stream nuevo (s)
+
+# Watchdog del árbol del navegador (client/watchdog.py)
+WATCHDOG_INTERVAL = 10  # Segundos entre muestras de PSS/CPU de todo el árbol
+WATCHDOG_MAX_PSS_MB = 1500  # PSS máximo del árbol completo (renderers y GPU incluidos)
+WATCHDOG_MAX_RUNTIME = 6 * 3600  # Red de seguridad: vida máxima de un navegador aunque no crezca (s)
+WATCHDOG_MAX_CPU_PERCENT = 300  # CPU del árbol (% de un core) que, sostenida, indica un renderer desbocado
+WATCHDOG_CPU_SUSTAIN = 6  # Muestras seguidas sobre el máximo de CPU para reciclar
+WATCHDOG_TREND_SECONDS = 900  # Ventana para estimar la tasa de crecimiento de PSS
+WATCHDOG_LEAD_SECONDS = 900  # Si el cruce predicho cae dentro de esta ventana, se programa el reciclado
+WATCHDOG_SAFETY_SECONDS = 120  # El reciclado programado ocurre, como tarde, esto antes del cruce predicho
+WATCHDOG_QUIET_DBFS = -45  # Nivel bajo el cual el audio se considera en pausa (momento de bajo impacto)
+WATCHDOG_QUIET_SECONDS = 0.5  # Pausa mínima del audio para reciclar en ella
+WATCHDOG_HOST_CPU_MAX = 60  # Y CPU del host por debajo de este %
+WATCHDOG_LOG_EVERY = 6  # Cada cuántas muestras se loguea el estado del árbol
+
+# Perfiles y pool de navegadores
+PROFILE_TEMPLATE_ENABLED = True  # Clonar cada perfil de una plantilla ya inicializada en lugar de uno vacío
+PROFILE_TEMPLATE_DIR = "~/.config/chrome-autoplay-template"  # Se le agrega -<navegador>
+PROFILE_TEMPLATE_WARMUP_TIMEOUT = 30  # Corrida headless que prepara la plantilla (s)
+BROWSER_POOL_SIZE = 0  # Navegadores ociosos pre-lanzados para arranques y reciclados (0 = sin pool)
+BROWSER_POOL_LAUNCH_DELAY = 5  # Segundos entre lanzamientos del pool
+
+# Supervisor de clientes (client/supervisor.py)
+SUPERVISOR_EXIT_RECYCLE = 75  # Código con el que un cliente supervisado pide ser relanzado (en lugar de os.execv)
+SUPERVISOR_MAX_CPU_PERCENT = 70  # No se arranca otra sesión si la CPU del host supera este %
+SUPERVISOR_MAX_LOAD_PER_CORE = 0.8  # Ni si el loadavg de 1 min por core lo supera
+SUPERVISOR_MAX_STARTING = 1  # Sesiones arrancando a la vez (el arranque del navegador es el pico de CPU)
+SUPERVISOR_STARTUP_GRACE = 30  # Segundos que una sesión se considera "arrancando"
+SUPERVISOR_MIN_LAUNCH_GAP = 2  # Separación mínima entre arranques aunque el host esté libre (s)
+SUPERVISOR_HEALTHY_SECONDS = 120  # Una sesión que vivió esto ya no cuenta como fallo consecutivo
+SUPERVISOR_BACKOFF_BASE = 5  # Espera antes de reiniciar tras un fallo; se duplica por fallo consecutivo (s)
+SUPERVISOR_BACKOFF_MAX = 300  # Tope del backoff (s)
+SUPERVISOR_STALL_SECONDS = 60  # Sin CPU consumida en el árbol durante este tiempo = sesión colgada
+SUPERVISOR_REPORT_INTERVAL = 30  # Segundos entre reportes de uptime/reinicios/CPU/RSS por sesión
+
+# Ubicación de procesos por core (client/placement.py, solo Linux)
+PLACEMENT_ENABLED = False  # Afinidad/prioridad por sesión para navegador, captura e hilo de audio
+PLACEMENT_AUDIO_CORES = 1  # Cores reservados al camino de audio (los primeros del host)
+PLACEMENT_BROWSER_CORES = 2  # Cores por árbol de navegador, rotando por sesión sobre el resto
+PLACEMENT_AUDIO_NICE = -5  # Nice del camino de audio (negativo necesita CAP_SYS_NICE; sin permisos queda igual)
+PLACEMENT_BROWSER_NICE = 5  # Nice del navegador: el render cede ante la captura
+
+# Configuracion del logging (my_logger.py)
+LOG_LEVEL = "DEBUG"  # Nivel mínimo que se imprime/guarda: "DEBUG", "INFO", "WARN" o "ERROR"
+LOG_ASYNC = True  # Los hilos encolan y un hilo escritor por proceso escribe en lotes (False = escritura directa)
+LOG_QUEUE_SIZE = 10000  # Registros encolados como máximo; si se llena se descartan en lugar de bloquear
+LOG_BATCH_MAX = 512  # Registros por lote del hilo escritor
+LOG_RATE_LIMIT_SECONDS = 5.0  # Intervalo mínimo entre mensajes de caminos calientes con la misma clave
+
+# Configuracion del envío RTP del cliente
+VAD_ENABLED = False  # Supresión de silencio: los frames silenciosos no se envían y el bit M marca la vuelta
+VAD_THRESHOLD_DBFS = -60  # Nivel RMS por debajo del cual un frame se considera silencio
+VAD_HANGOVER_FRAMES = 10  # Frames que se siguen enviando tras el último con voz (no cortar colas, 200 ms)
+VAD_KEEPALIVE_SECONDS = 1.0  # Durante el silencio se envía un frame cada tanto para que el servidor no cierre por inactividad
+AUDIO_CODEC = "l16"  # Payload: "l16" (PCM crudo), "pcmu" (μ-law, 2x más chico) o "adpcm" (IMA-ADPCM, 4x más chico)
+CLIENT_SEND_MODE = "burst"  # "burst" (cada frame sale apenas se lee) o "paced" (cola drenada al ritmo de 20 ms)
+PACED_QUEUE_FRAMES = 50  # Frames encolados como máximo en modo paced; si se llena se descarta el más viejo (1 s)
+PACED_BUCKET_FRAMES = 4  # Tokens del bucket: frames que pueden salir seguidos para ponerse al día
+PACED_STATS_INTERVAL = 10  # Segundos entre logs de métricas del pacer
+MULTI_CLIENT_LAUNCH_DELAY = 10  # Segundos entre navegadores lanzados por client/multi_client.py
+MULTI_CLIENT_STATS_INTERVAL = 30  # Segundos entre logs de memoria/CPU por canal en modo multi-canal
+
+
+# Configuracion del receptor RTP del servidor
+RECEIVER_MODE = "thread"  # "thread" (recvfrom bloqueante), "asyncio" (DatagramProtocol por lotes) o "recv_into" (pool de buffers)
+ASYNC_RX_BATCH = 64  # Máximo de datagramas procesados por tick del event loop en modo asyncio
+RECV_POOL_SLOTS = 4096  # Slots preasignados del pool de recepción en modo recv_into (4096 * 2 KB = 8 MB)
+RECV_SLOT_SIZE = 2048  # Debe superar el datagrama RTP más grande (12 + FRAME_SIZE * 2 bytes)
+INGEST_SHARDS = 1  # Procesos de ingesta con SO_REUSEPORT (1 = un solo proceso, 0 = uno por core)
@@ -1,6 +1,13 @@
+import atexit
 import logging
 import datetime
 import os
+import queue
+import sys
+import threading
+import time
+
+from config import LOG_LEVEL, LOG_ASYNC, LOG_QUEUE_SIZE, LOG_BATCH_MAX, LOG_RATE_LIMIT_SECONDS
 
 # Configuración del logger
 logger = logging.getLogger('my_logger')
@@ -19,28 +26,156 @@ class Colors:
     UNDERLINE = '\033[4m'
     END = '\033[0m'  # Reset color
 
+COLOR_MAP = {
+    "INFO": Colors.CYAN,
+    "WARN": Colors.YELLOW,
+    "ERROR": Colors.RED,
+    "SUCCESS": Colors.GREEN,
+    "DEBUG": Colors.MAGENTA,
+    "HEADER": Colors.BLUE + Colors.BOLD
+}
+LEVELS = {"DEBUG": 10, "INFO": 20, "HEADER": 20, "SUCCESS": 20, "WARN": 30, "ERROR": 40}
+MIN_LEVEL = LEVELS.get(LOG_LEVEL, 10)
+LOG_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "client/logs")
+
+# --- Backend asíncrono ---
+# Los hilos de audio solo encolan (timestamp, nivel, mensaje, ssrc) sin bloquear; un hilo
+# escritor por proceso saca los registros en lotes y hace un write por destino
+# (consola y archivo de cada SSRC, que queda abierto). El hilo se crea con el primer
+# log de cada proceso, así los procesos hijos de un fork tienen el suyo.
+_records = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+_FLUSH = object()
+log_stats = {'dropped': 0, 'rate_limited': 0}
+_rate_limits = {}  # clave -> [último envío, suprimidos desde entonces]
+
+
+def _format_console(created, level, message):
+    timestamp = datetime.datetime.fromtimestamp(created).strftime("%H:%M:%S")
+    color = COLOR_MAP.get(level, Colors.WHITE)
+    return f"{color}[{timestamp}] [{level}] {message}{Colors.END}\n"
+
+
+def _open_log_file(files, ssrc):
+    handle = files.get(ssrc)
+    if handle is None:
+        if len(files) >= 256:
+            # Demasiados archivos abiertos: se cierran y se reabren a demanda
+            for old in files.values():
+                old.close()
+            files.clear()
+        os.makedirs(LOG_DIR, exist_ok=True)
+        handle = open(os.path.join(LOG_DIR, f"{ssrc}-client.log"), "a", encoding="utf-8")
+        files[ssrc] = handle
+    return handle
+
+
+def _write_batch(batch, files):
+    console = []
+    per_file = {}
+    for created, level, message, ssrc in batch:
+        console.append(_format_console(created, level, message))
+        if ssrc is not None:
+            per_file.setdefault(ssrc, []).append(f"[{level}] {message}\n")
+    sys.stdout.write("".join(console))
+    sys.stdout.flush()
+    for ssrc, lines in per_file.items():
+        handle = _open_log_file(files, ssrc)
+        handle.write("".join(lines))
+        handle.flush()
+
+
+def _writer(records):
+    files = {}
+    while True:
+        batch = [records.get()]
+        while len(batch) < LOG_BATCH_MAX:
+            try:
+                batch.append(records.get_nowait())
+            except queue.Empty:
+                break
+        flushes = [record for record in batch if record[0] is _FLUSH]
+        batch = [record for record in batch if record[0] is not _FLUSH]
+        try:
+            if batch:
+                _write_batch(batch, files)
+        except Exception as e:
+            sys.stderr.write(f"[my_logger] Error escribiendo logs: {e}\n")
+        for _, done, _, _ in flushes:
+            done.set()
+
+
+def _queue():
+    global _records, _writer_pid
+    pid = os.getpid()
+    if _writer_pid != pid:
+        with _writer_lock:
+            if _writer_pid != pid:
+                _records = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+                threading.Thread(target=_writer, args=(_records,), name="log-writer", daemon=True).start()
+                _writer_pid = pid
+    return _records
+
+
+def _emit(message, level, ssrc):
+    if LEVELS.get(level, 20) < MIN_LEVEL:
+        return
+    if not LOG_ASYNC:
+        _write_sync(message, level, ssrc)
+        return
+    try:
+        _queue().put_nowait((time.time(), level, message, ssrc))
+    except queue.Full:
+        # Nunca bloquear a un hilo de audio por el log
+        log_stats['dropped'] += 1
+
+
+def _write_sync(message, level, ssrc):
+    sys.stdout.write(_format_console(time.time(), level, message))
+    if ssrc is not None:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        with open(os.path.join(LOG_DIR, f"{ssrc}-client.log"), "a", encoding="utf-8") as f:
+            f.write(f"[{level}] {message}\n")
+
+
 def log(message, level="INFO"):
     """Sistema de logging con colores usando hora local y guardado en archivo."""
-    now = datetime.datetime.now()
-    timestamp = now.strftime("%H:%M:%S")
-
-    color_map = {
-        "INFO": Colors.CYAN,
-        "WARN": Colors.YELLOW,
-        "ERROR": Colors.RED,
-        "SUCCESS": Colors.GREEN,
-        "DEBUG": Colors.MAGENTA,
-        "HEADER": Colors.BLUE + Colors.BOLD
-    }
-    color = color_map.get(level, Colors.WHITE)
-    print(f"{color}[{timestamp}] [{level}] {message}{Colors.END}")
+    _emit(message, level, None)
 
 def log_and_save(message, level, ssrc):
-    log(message, level)
-    base_dir = os.path.abspath(os.path.dirname(__file__))
-    log_dir = os.path.join(base_dir, "client/logs")
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    log_file = f"{log_dir}/{ssrc}-client.log"
-    with open(log_file, "a", encoding="utf-8") as f:
-        f.write(f"[{level}] {message}\n")
\ No newline at end of file
+    _emit(message, level, ssrc)
+
+
+def log_rate_limited(key, message, level="INFO", ssrc=None, interval=LOG_RATE_LIMIT_SECONDS):
+    """
+    Log para caminos calientes: como mucho un mensaje por `key` cada `interval`
+    segundos. Al siguiente que pasa se le agrega cuántos se suprimieron.
+    """
+    if LEVELS.get(level, 20) < MIN_LEVEL:
+        return
+    now = time.monotonic()
+    state = _rate_limits.get(key)
+    if state is not None and now - state[0] < interval:
+        state[1] += 1
+        log_stats['rate_limited'] += 1
+        return
+    if state is not None and state[1]:
+        message = f"{message} (+{state[1]} suprimidos)"
+    _rate_limits[key] = [now, 0]
+    _emit(message, level, ssrc)
+
+
+def flush_logs(timeout=2.0):
+    """Espera a que el hilo escritor vacíe la cola (antes de os._exit o al cerrar)."""
+    if not LOG_ASYNC or _writer_pid != os.getpid():
+        return
+    done = threading.Event()
+    try:
+        _records.put((_FLUSH, done, None, None), timeout=timeout)
+    except queue.Full:
+        return
+    done.wait(timeout)
+
+
+atexit.register(flush_logs)
@@ -0,0 +1,50 @@
+import collections
+import os
+import sys
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from config import RECV_POOL_SLOTS, RECV_SLOT_SIZE
+
+
+class RecvSlot:
+    """
+    Buffer de recepción preasignado. El payload RTP que se guarda en el jitter
+    buffer es un memoryview sobre `buf`, por eso el slot no puede reutilizarse
+    hasta que el worker haya escrito ese payload y llame a release().
+    """
+    __slots__ = ("buf", "view", "pool")
+
+    def __init__(self, size, pool):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.pool = pool
+
+    def release(self):
+        self.pool.free.append(self)
+
+
+class RecvBufferPool:
+    """
+    Pool fijo de slots para sock.recvfrom_into(). La memoria total es
+    slots * slot_size sin importar cuántos SSRC haya conectados; si el pool se
+    agota acquire() devuelve None (el listener recibe ese datagrama con un
+    recvfrom normal) y se cuenta en `overflow`.
+    """
+
+    def __init__(self, slots=RECV_POOL_SLOTS, slot_size=RECV_SLOT_SIZE):
+        self.capacity = slots
+        self.slot_size = slot_size
+        # deque: append/pop son atómicos, el listener adquiere y los workers liberan
+        self.free = collections.deque(RecvSlot(slot_size, self) for _ in range(slots))
+        self.overflow = 0
+
+    def acquire(self):
+        try:
+            return self.free.pop()
+        except IndexError:
+            self.overflow += 1
+            return None
+
+    def in_use(self):
+        return self.capacity - len(self.free)
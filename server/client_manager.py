@@ -1,57 +1,264 @@
 import os
+import queue
 import sys
 import threading
 import time
-import gc
 
 from jitter_buffer import JitterBuffer
-from metadata import channel_map
+from metadata import channel_map, codec_map, channel_map_listeners
+from segment_writer import SEGMENT_PCM_BYTES, open_segment_writer
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 from my_logger import log
-from config import SAMPLE_RATE, CHANNELS, INACTIVITY_TIMEOUT, JITTER_BUFFER_SIZE, WAV_SEGMENT_SECONDS
+from audio_codecs import CODECS_BY_PAYLOAD_TYPE, get_codec
+from config import (SAMPLE_RATE, CHANNELS, INACTIVITY_TIMEOUT, JITTER_BUFFER_SIZE, JITTER_MODE,
+                    SEGMENT_FORMAT, WAV_FLUSH_INTERVAL, DISK_WRITER_THREADS, DISK_QUEUE_BLOCKS, DISK_QUEUE_TIMEOUT,
+                    DISK_BLOCK_BYTES, DISK_BLOCK_MAX_DELAY)
 
 
 clients_lock = threading.Lock()
-clients = dict()  # addr_str -> dict con 'wavefile' y 'lock'
+clients = dict()  # ssrc (str) -> dict con 'jitter_buffer', 'pending' y 'lock'
+
+SEGMENT_BYTES = SEGMENT_PCM_BYTES  # Audio por segmento WAV
+RECORDS_DIR = "records"
 
 def create_wav_file(ssrc, wav_index = 0):
-    import wave
-    """Crea un WAV nuevo para el cliente en un directorio propio dentro de 'records'."""
-    base_dir = "records"
+    """
+    Crea un segmento nuevo para el cliente en un directorio propio dentro de 'records'.
+    El formato (WAV o FLAC) lo define SEGMENT_FORMAT.
+    """
     # Obtener el nombre del canal desde channel_map, o usar el ssrc si no existe
+    # (si el registro llega después, DiskWriterPool.rename mueve el segmento a la carpeta del canal)
     channel_name = channel_map.get(str(ssrc), str(ssrc))
-    client_dir = os.path.join(base_dir, channel_name)
+    client_dir = os.path.join(RECORDS_DIR, channel_name)
     if not os.path.exists(client_dir):
         os.makedirs(client_dir)
         log(f"📂 Creando directorio para canal: {channel_name}", "ERROR")
-    name_wav = os.path.join(client_dir, f"record-{time.strftime('%Y%m%d-%H%M%S')}-{ssrc}-{channel_name}-{wav_index}.wav")
-    wf = wave.open(name_wav, "wb")
-    wf.setnchannels(CHANNELS)
-    wf.setsampwidth(2)
-    wf.setframerate(SAMPLE_RATE)
-    log(f"💾 [Cliente {ssrc}] WAV abierto: {name_wav}", "INFO")
+    name_base = os.path.join(client_dir, f"record-{time.strftime('%Y%m%d-%H%M%S')}-{ssrc}-{channel_name}-{wav_index}")
+    wf = open_segment_writer(name_base)
+    log(f"💾 [Cliente {ssrc}] Segmento abierto: {wf.name}", "INFO")
     return wf
 
 
-def handle_inactivity(client, ssrc):
+class DiskWriterPool:
     """
-    Maneja la inactividad de un cliente, cerrando su archivo WAV si ha estado inactivo durante más de INACTIVITY_TIMEOUT segundos.
+    Etapa de escritura a disco separada del drenado de los jitter buffers.
+
+    Los workers de cada cliente empujan bloques PCM ya ordenados a una cola acotada;
+    un grupo chico de hilos escritores es dueño de todos los archivos (abrir, rotar
+    cada SEGMENT_BYTES de audio y cerrar). Cada SSRC va siempre al mismo hilo, así el
+    orden de sus bloques se conserva. Si la cola está llena el worker espera como
+    máximo DISK_QUEUE_TIMEOUT y después descarta el bloque: los contadores de
+    espera y descarte muestran cuándo el disco es el cuello de botella.
     """
-    # aunque el buffer no esté vacío (para evitar clientes zombies)
-    if time.time() - client['last_time'] > INACTIVITY_TIMEOUT:
+
+    def __init__(self, num_threads=DISK_WRITER_THREADS, queue_blocks=DISK_QUEUE_BLOCKS):
+        self.queues = [queue.Queue(maxsize=queue_blocks) for _ in range(num_threads)]
+        # Pedidos de control aparte de la cola de datos: sin límite, encolar nunca bloquea
+        self.control = [queue.SimpleQueue() for _ in range(num_threads)]
+        self.threads = []
+        self.start_lock = threading.Lock()
+        self.stats = {'blocks': 0, 'bytes': 0, 'backpressure_waits': 0, 'dropped_blocks': 0, 'dropped_bytes': 0}
+        # Totales de codificación de los segmentos cerrados (compresión y CPU)
+        self.encoding = {'pcm_bytes': 0, 'file_bytes': 0, 'cpu_seconds': 0.0}
+        self.encoding_lock = threading.Lock()
+
+    def _queue_for(self, ssrc):
+        return self.queues[int(ssrc) % len(self.queues)]
+
+    def start(self):
+        # Arranque perezoso: los shards hacen fork antes de que existan estos hilos
+        if self.threads:
+            return
+        with self.start_lock:
+            if self.threads:
+                return
+            for index in range(len(self.queues)):
+                t = threading.Thread(target=self._run, args=(index,), name=f"disk-writer-{index}", daemon=True)
+                t.start()
+                self.threads.append(t)
+            log(f"💽 {len(self.queues)} hilos escritores de disco iniciados", "INFO")
+
+    def close(self, ssrc):
+        """Cierra el segmento después de los bloques ya encolados; nunca bloquea más de DISK_QUEUE_TIMEOUT."""
         try:
-            client['wavefile'].close()
-            client['wavefile'] = None  # Eliminar referencia para liberar memoria
-            gc.collect()  # Forzar recolección de basura
-            log(f"[Worker] Cliente {ssrc} inactivo por {INACTIVITY_TIMEOUT}s, WAV cerrado y recursos liberados.", "INFO")
-        except Exception as e:
-            log(f"[Worker] Error cerrando WAV de cliente {ssrc}: {e}", "ERROR")
-        with clients_lock:
-            clients.pop(ssrc, None)
+            self._queue_for(ssrc).put(('close', ssrc, None), timeout=DISK_QUEUE_TIMEOUT)
+        except queue.Full:
+            # Cola llena: el cierre va por la cola de control (si llegan bloques
+            # encolados después, abren un segmento nuevo en lugar de perderse)
+            self.control[int(ssrc) % len(self.control)].put_nowait(('close', ssrc, None))
+
+    def rename(self, ssrc, channel):
+        """
+        Registro tardío: los segmentos abiertos en records/<ssrc> pasan a la carpeta del canal.
+        Se llama desde el plano de control: no bloquea aunque la cola de datos esté llena.
+        El escritor lo atiende en su próxima vuelta; los segmentos que abra antes ya
+        toman el canal de channel_map, así que el orden respecto de los datos no importa.
+        """
+        # Sin hilos escritores este proceso no abrió segmentos (p. ej. el principal con shards)
+        if self.threads:
+            self.control[int(ssrc) % len(self.control)].put_nowait(('rename', ssrc, channel))
+
+    def write(self, ssrc, block):
+        """Encola un bloque PCM; devuelve False si se descartó por falta de espacio en la cola."""
+        q = self._queue_for(ssrc)
+        message = ('data', ssrc, block)
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            self.stats['backpressure_waits'] += 1
+            try:
+                q.put(message, timeout=DISK_QUEUE_TIMEOUT)
+            except queue.Full:
+                self.stats['dropped_blocks'] += 1
+                self.stats['dropped_bytes'] += len(block)
+                if self.stats['dropped_blocks'] % 100 == 1:
+                    log(f"[Disco] Cola de escritura llena, bloques descartados: {self.stats['dropped_blocks']}", "ERROR")
+                return False
+        self.stats['blocks'] += 1
+        self.stats['bytes'] += len(block)
         return True
-    return False
+
+    def shutdown(self):
+        """Cierra todos los segmentos abiertos y espera a que los escritores terminen."""
+        for q in self.queues:
+            q.put(('stop', None, None))
+        for t in self.threads:
+            t.join(timeout=10)
+        self.threads = []
+
+    def queue_depths(self):
+        return [q.qsize() for q in self.queues]
+
+    def encoding_summary(self):
+        """Compresión y CPU acumuladas de los segmentos cerrados, para elegir formato por despliegue."""
+        with self.encoding_lock:
+            encoding = dict(self.encoding)
+        audio_seconds = encoding['pcm_bytes'] / (SAMPLE_RATE * CHANNELS * 2)
+        return {
+            'format': SEGMENT_FORMAT,
+            'compression_ratio': round(encoding['pcm_bytes'] / encoding['file_bytes'], 3) if encoding['file_bytes'] else 0.0,
+            'cpu_pct_per_stream': round(100 * encoding['cpu_seconds'] / audio_seconds, 3) if audio_seconds else 0.0,
+        }
+
+    def _open_segment(self, segments, ssrc, index):
+        segments[ssrc] = {'writer': create_wav_file(ssrc, wav_index=index), 'index': index, 'bytes': 0}
+        return segments[ssrc]
+
+    def _close_segment(self, segment, ssrc):
+        try:
+            writer = segment['writer']
+            writer.close()
+            encoding = writer.encoding_stats()
+            with self.encoding_lock:
+                self.encoding['pcm_bytes'] += writer.pcm_bytes
+                self.encoding['file_bytes'] += encoding['file_bytes']
+                self.encoding['cpu_seconds'] += writer.cpu_seconds
+            log(f"[Disco] {ssrc} segmento {segment['index']} cerrado, flush stats: {writer.flush_stats()}", "DEBUG")
+            log(f"[Disco] {ssrc} segmento {segment['index']}: compresión x{encoding['compression_ratio']}, "
+                f"CPU {encoding['cpu_pct_per_stream']}% de un core", "INFO")
+        except Exception as e:
+            log(f"[Disco] Error cerrando WAV de cliente {ssrc}: {e}", "ERROR")
+
+    def _write_block(self, segments, ssrc, block):
+        segment = segments.get(ssrc) or self._open_segment(segments, ssrc, 0)
+        view = memoryview(block)
+        while view:
+            room = SEGMENT_BYTES - segment['bytes']
+            chunk = view[:room]
+            segment['writer'].writeframes(chunk)
+            segment['bytes'] += len(chunk)
+            view = view[room:]
+            if segment['bytes'] >= SEGMENT_BYTES:
+                # Rotación por cantidad de audio escrito: cada segmento dura WAV_SEGMENT_SECONDS
+                self._close_segment(segment, ssrc)
+                segment = self._open_segment(segments, ssrc, segment['index'] + 1)
+                log(f"[Segmentación] Nuevo segmento para {ssrc}, segmento {segment['index']}", "INFO")
+
+    def _close_ssrc(self, segments, ssrc):
+        segment = segments.pop(ssrc, None)
+        if segment:
+            self._close_segment(segment, ssrc)
+
+    def _rename_segments(self, segments, ssrc, channel):
+        old_dir = os.path.join(RECORDS_DIR, str(ssrc))
+        if channel == str(ssrc) or not os.path.isdir(old_dir):
+            return
+        new_dir = os.path.join(RECORDS_DIR, channel)
+        os.makedirs(new_dir, exist_ok=True)
+        segment = segments.get(ssrc)
+        names = os.listdir(old_dir)
+        for name in names:
+            old_path = os.path.join(old_dir, name)
+            new_path = os.path.join(new_dir, name.replace(f"-{ssrc}-{ssrc}-", f"-{ssrc}-{channel}-", 1))
+            os.replace(old_path, new_path)
+            # El segmento abierto sigue escribiendo por su descriptor; solo cambia el nombre
+            if segment and segment['writer'].name == old_path:
+                segment['writer'].name = new_path
+        try:
+            os.rmdir(old_dir)
+        except OSError:
+            pass
+        log(f"📂 [Cliente {ssrc}] Registro tardío: {len(names)} segmento(s) movidos a {new_dir}", "INFO")
+
+    def _run(self, index):
+        q = self.queues[index]
+        control = self.control[index]
+        segments = {}  # ssrc -> {'writer', 'index', 'bytes'}; solo lo toca este hilo
+        last_sweep = time.monotonic()
+        while True:
+            try:
+                kind, ssrc, payload = q.get(timeout=WAV_FLUSH_INTERVAL / 2)
+            except queue.Empty:
+                kind = None
+            try:
+                if kind == 'data':
+                    self._write_block(segments, ssrc, payload)
+                elif kind == 'close':
+                    self._close_ssrc(segments, ssrc)
+                elif kind == 'stop':
+                    for ssrc, segment in segments.items():
+                        self._close_segment(segment, ssrc)
+                    segments.clear()
+                    break
+                while not control.empty():
+                    kind, ssrc, payload = control.get_nowait()
+                    if kind == 'rename':
+                        self._rename_segments(segments, ssrc, payload)
+                    elif kind == 'close':
+                        self._close_ssrc(segments, ssrc)
+                # Flush por tiempo de los segmentos que no reciben datos
+                now = time.monotonic()
+                if now - last_sweep >= WAV_FLUSH_INTERVAL / 2:
+                    last_sweep = now
+                    for ssrc, segment in segments.items():
+                        segment['writer'].maybe_flush()
+            except Exception as e:
+                log(f"[Disco] Error procesando '{kind}' de cliente {ssrc}: {e}", "ERROR")
+
+
+disk_writer = DiskWriterPool()
+channel_map_listeners.append(disk_writer.rename)
+
+
+def retire_client(client, ssrc, pending):
+    """
+    Cliente inactivo por más de INACTIVITY_TIMEOUT segundos (aunque el buffer no esté
+    vacío, para evitar clientes zombies): cierra su WAV y libera los recursos.
+    Se llama sin el lock del cliente: la contrapresión del disco no frena a los receptores.
+    """
+    # Primero fuera del mapa: los paquetes nuevos de este SSRC crean un cliente nuevo
+    with clients_lock:
+        if clients.get(ssrc) is client:
+            clients.pop(ssrc)
+    # Y recién después se vacía: un receptor que ya tenía la referencia libera su slot al llegar
+    client['jitter_buffer'].close()
+    if pending:
+        disk_writer.write(ssrc, pending)
+    disk_writer.close(ssrc)
+    log(f"[Worker] Cliente {ssrc} inactivo por {INACTIVITY_TIMEOUT}s, WAV cerrado y recursos liberados.", "INFO")
+    log(f"[Worker] Cliente {ssrc} jitter buffer: {client['jitter_buffer'].get_stats()}", "INFO")
 
 
 
@@ -61,59 +268,107 @@ def start_worker_client(ssrc):
     jitter_buffer = client['jitter_buffer']
 
     while True:
+        block = None
+        tail = None
         with client['lock']:
+            if client['closed']:
+                break
             # Esperar a que el jitter buffer tenga prefill suficiente
-            if not jitter_buffer.ready_to_consume():
-                if handle_inactivity(client, ssrc):
-                    break
-                time.sleep(0.005)
-                continue
+            if jitter_buffer.ready_to_consume():
+                # Procesar todos los paquetes listos en orden
+                pending = client['pending']
+                decode = client['codec'].decode
+                while True:
+                    packet = jitter_buffer.pop_next()
+                    if packet is None:
+                        break
+                    if packet.get("is_silence", False):
+                        pending += packet["payload"]
+                    else:
+                        # Decodificar al PCM que se escribe (l16 lo deja tal cual)
+                        pending += decode(packet["payload"])
+                    if packet.get("slot") is not None:
+                        # Payload ya copiado al bloque pendiente: el slot de recepción vuelve al pool
+                        packet["slot"].release()
+                    if not packet.get("is_silence", False):
+                        client['last_time'] = time.time()
 
+                # El bloque sale hacia el escritor por tamaño o por antigüedad
+                if pending and (len(pending) >= DISK_BLOCK_BYTES
+                                or time.monotonic() - client['pending_since'] >= DISK_BLOCK_MAX_DELAY):
+                    block = pending
+                    client['pending'] = bytearray()
+                    client['pending_since'] = time.monotonic()
 
-            # Procesar todos los paquetes listos en orden
-            next_seq = client['next_seq']
-            while True:
-                packet = jitter_buffer.pop_next(next_seq)
-                if packet is None:
-                    break
-                now = time.time()
-                # Lógica de segmentación WAV por tiempo
-                if now - client['wav_start_time'] >= WAV_SEGMENT_SECONDS:
-                    client['wavefile'].close()
-                    client['wavefile'] = None
-                    gc.collect()
-                    client['wav_index'] += 1
-                    client['wavefile'] = create_wav_file(ssrc, wav_index=client['wav_index'])
-                    client['wav_start_time'] = time.time()
-                    log(f"[Segmentación] Nuevo archivo WAV para {ssrc}, segmento {client['wav_index']}", "INFO")
-
-                client['wavefile'].writeframes(packet["payload"])
-                if not packet.get("is_silence", False):
-                    client['last_time'] = now
-                next_seq = (next_seq + 1) % 65536
-            client['next_seq'] = next_seq
-
-            if handle_inactivity(client, ssrc):
-                break
+            if time.time() - client['last_time'] > INACTIVITY_TIMEOUT:
+                client['closed'] = True
+                tail = client['pending']
+                client['pending'] = bytearray()
 
+        # Encolar fuera del lock: la contrapresión del disco no frena al listener
+        if block is not None:
+            disk_writer.write(ssrc, block)
+        if tail is not None:
+            retire_client(client, ssrc, tail)
+            break
         time.sleep(0.005)
     log(f"[Worker] Terminando para cliente con SSRC: {ssrc}", "WARN")
 
+def update_client_codec(client, ssrc, payload_type):
+    """
+    El payload type del paquete no coincide con el codec anunciado en la metadata
+    (metadata perdida o cliente reiniciado con otro codec): se toma el del paquete.
+    Devuelve False si el payload type no corresponde a ningún codec conocido.
+    """
+    codec_class = CODECS_BY_PAYLOAD_TYPE.get(payload_type)
+    if codec_class is None:
+        return False
+    log(f"⚠️ [Cliente {ssrc}] Payload type {payload_type}: cambiando codec "
+        f"{client['codec'].name} -> {codec_class.name}", "WARN")
+    client['codec'] = codec_class()
+    return True
+
+def close_all_clients():
+    """Cierra los WAV de todos los clientes (shutdown del servidor o de un shard)."""
+    log("💾 Closing all WAV files...", "INFO")
+    # Bajo los locks solo se marcan y se sacan del mapa: encolar al escritor puede bloquear
+    retired = []
+    with clients_lock:
+        for client_id, client in list(clients.items()):
+            with client['lock']:
+                client['closed'] = True
+                pending, client['pending'] = client['pending'], bytearray()
+            retired.append((client_id, client, pending))
+        clients.clear()
+    for client_id, client, pending in retired:
+        client['jitter_buffer'].close()
+        if pending:
+            disk_writer.write(client_id, pending)
+        disk_writer.close(client_id)
+        log(f"Closed WAV for client {client_id}", "INFO")
+    disk_writer.shutdown()
+    log(f"[Disco] Estadísticas del escritor: {disk_writer.stats}", "INFO")
+    log(f"[Disco] Codificación: {disk_writer.encoding_summary()}", "INFO")
+
+
 def get_or_create_client(ssrc, seq_num):
     client = clients.get(ssrc)
     if client is not None:
         return client
     with clients_lock:
+        if ssrc in clients:
+            return clients[ssrc]
         clients[ssrc] = {
-            'jitter_buffer': JitterBuffer(prefill_min=JITTER_BUFFER_SIZE),
-            'wavefile': create_wav_file(ssrc, wav_index=0),
+            'jitter_buffer': JitterBuffer(prefill_min=JITTER_BUFFER_SIZE, adaptive=JITTER_MODE == "adaptive"),
+            'pending': bytearray(),          # PCM ordenado que todavía no se entregó al escritor
+            'pending_since': time.monotonic(),
             'lock': threading.Lock(),
-            'next_seq': seq_num,
             'last_time': time.time(),
-            'wav_start_time': time.time(),  # Marca el inicio del archivo actual
-            'wav_index': 0,                 # Contador de archivos para ese cliente
+            'closed': False,
+            'codec': get_codec(codec_map.get(ssrc, "l16")),
         }
-        log(f"[Init] Cliente nuevo {ssrc}: next_seq inicializado en {seq_num}", "INFO")
+        disk_writer.start()
+        log(f"[Init] Cliente nuevo {ssrc}: primer seq recibido {seq_num}", "INFO")
         t = threading.Thread(target=start_worker_client, args=(ssrc,), daemon=True)
         t.start()
     return clients[ssrc]
@@ -0,0 +1,115 @@
+"""
+Plano de control del servidor: un único endpoint UDP (asyncio) con request/response.
+
+Reemplaza a los listeners separados de metadata y de display. Cada pedido es un
+JSON {"id", "cmd", "ssrc", ...} y cada respuesta lleva el mismo "id" y "cmd" con
+"ok": true y los datos, u "ok": false y "error". Todos los comandos son
+idempotentes, así el cliente reintenta ante una pérdida sin efectos dobles:
+- REGISTER {channel, codec}: registra ssrc -> canal y lo propaga a los shards. Si
+  ya llegó audio antes del registro, sus segmentos (abiertos en records/<ssrc>)
+  se mueven a la carpeta del canal (DiskWriterPool.rename en client_manager).
+- GET_DISPLAY {prefer}: lease de display del DisplayPool.
+- RENEW_DISPLAY {prefer}: extiende el lease del display en uso (o lo vuelve a
+  tomar ahí si venció); nunca lo mueve a otro.
+- RELEASE_DISPLAY: devuelve el display al pool.
+- PING: verificación de que el servidor está vivo.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+
+from metadata import channel_map, codec_map, channel_map_lock, update_channel_map
+from display_pool import DisplayPool
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import log
+from audio_codecs import CODECS
+
+
+class ControlError(Exception):
+    """Pedido inválido: se responde con ok=false y el mensaje."""
+
+
+class ControlPlane(asyncio.DatagramProtocol):
+    def __init__(self, display_pool=None):
+        self.display_pool = display_pool or DisplayPool()
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        reply = {"id": None, "cmd": None, "ok": True}
+        try:
+            msg = json.loads(data.decode())
+            reply["id"], reply["cmd"] = msg.get("id"), msg.get("cmd")
+            handler = getattr(self, f"cmd_{str(msg.get('cmd')).lower()}", None)
+            if handler is None:
+                raise ControlError(f"comando desconocido: {msg.get('cmd')}")
+            if "ssrc" not in msg:
+                raise ControlError("falta el ssrc")
+            reply.update(handler(str(msg["ssrc"]), msg) or {})
+        except (ValueError, AttributeError, TypeError) as e:
+            reply.update(ok=False, error=f"mensaje inválido: {e}")
+            log(f"❌ Plano de control: mensaje inválido de {addr}: {e}", "ERROR")
+        except ControlError as e:
+            reply.update(ok=False, error=str(e))
+            log(f"❌ Plano de control: {e} ({addr})", "ERROR")
+        except Exception as e:
+            # Un pedido con ack siempre tiene respuesta: el cliente no debe reintentar contra el silencio
+            reply.update(ok=False, error=f"error interno: {e}")
+            log(f"❌ Plano de control: error procesando {reply['cmd']} de {addr}: {e!r}", "ERROR")
+        self.transport.sendto(json.dumps(reply).encode(), addr)
+
+    def cmd_ping(self, ssrc, msg):
+        return None
+
+    def cmd_register(self, ssrc, msg):
+        channel = msg.get("channel")
+        if not channel:
+            raise ControlError("falta el canal")
+        codec = msg.get("codec", "l16")
+        if codec not in CODECS:
+            log(f"⚠️ Codec desconocido '{codec}' para {ssrc}, se asume l16", "WARN")
+            codec = "l16"
+        with channel_map_lock:
+            known = (channel_map.get(ssrc), codec_map.get(ssrc))
+        # Un reintento del mismo registro no vuelve a propagarse a los shards
+        if known != (channel, codec):
+            update_channel_map(ssrc, channel, codec)
+            log(f"📡 Registro: {ssrc} -> {channel} ({codec})", "INFO")
+        return {"channel": channel, "codec": codec}
+
+    def cmd_get_display(self, ssrc, msg):
+        display_num = self.display_pool.acquire(ssrc, msg.get("prefer"))
+        if display_num is None:
+            raise ControlError(f"pool de displays lleno, sin display para {ssrc}")
+        log(f"🖥️ Display solicitado por el cliente: {ssrc}, asignado: {display_num}", "INFO")
+        return {"display": display_num}
+
+    def cmd_renew_display(self, ssrc, msg):
+        if msg.get("prefer") is None:
+            raise ControlError("RENEW_DISPLAY necesita el display en uso (prefer)")
+        display_num = self.display_pool.renew(ssrc, int(msg["prefer"]))
+        if display_num is None:
+            raise ControlError(f"display :{msg['prefer']} lleno, no se pudo renovar el lease de {ssrc}")
+        return {"display": display_num}
+
+    def cmd_release_display(self, ssrc, msg):
+        self.display_pool.release(ssrc)
+        log(f"🖥️ Display liberado por el cliente: {ssrc}", "INFO")
+        return None
+
+
+def start_control_plane(ip, port, display_pool=None):
+    """Levanta el plano de control en un hilo con su propio event loop. Devuelve el hilo."""
+    loop = asyncio.new_event_loop()
+    protocol = ControlPlane(display_pool)
+    loop.run_until_complete(loop.create_datagram_endpoint(lambda: protocol, local_addr=(ip, port)))
+    log(f"🎧 Plano de control escuchando en {ip}:{port}", "INFO")
+    thread = threading.Thread(target=loop.run_forever, name="control-plane", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,112 @@
+"""
+Pool de displays X para los clientes headless.
+
+Antes el número se calculaba como len(channel_map) + 10: dos clientes que pedían a
+la vez, o un cliente reiniciado, recibían el mismo display. Ahora cada SSRC toma un
+lease con vencimiento sobre un rango fijo de números:
+- Pedir de nuevo (reintento, renovación o reinicio que recuerda su display)
+  devuelve el mismo número y extiende el lease.
+- Un lease que no se renueva en DISPLAY_LEASE_SECONDS vence y el lugar se libera
+  (cliente caído sin avisar).
+- Un display admite hasta DISPLAY_BROWSERS_PER_DISPLAY navegadores: se llenan
+  primero los que ya están en uso, así su Xvfb (ya tibio) se comparte en lugar
+  de arrancar uno nuevo por cliente.
+"""
+import os
+import sys
+import threading
+import time
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from config import DISPLAY_POOL_BASE, DISPLAY_POOL_SIZE, DISPLAY_LEASE_SECONDS, DISPLAY_BROWSERS_PER_DISPLAY
+
+
+class DisplayPool:
+    def __init__(self, base=DISPLAY_POOL_BASE, size=DISPLAY_POOL_SIZE, lease_seconds=DISPLAY_LEASE_SECONDS,
+                 per_display=DISPLAY_BROWSERS_PER_DISPLAY):
+        self.base = base
+        self.size = size
+        self.lease_seconds = lease_seconds
+        self.per_display = per_display
+        self.leases = {}  # ssrc -> (display, vencimiento)
+        self.holders = {}  # display -> set de ssrc
+        self.lock = threading.Lock()
+
+    def expire(self, now):
+        for ssrc, (display, expires_at) in list(self.leases.items()):
+            if expires_at <= now:
+                self.drop(ssrc)
+
+    def drop(self, ssrc):
+        display, _ = self.leases.pop(ssrc)
+        holders = self.holders[display]
+        holders.discard(ssrc)
+        if not holders:
+            del self.holders[display]
+
+    def acquire(self, ssrc, prefer=None):
+        """
+        Lease de un display para `ssrc`. Idempotente: si ya tiene uno lo renueva.
+        `prefer` es el display que el cliente usaba (reinicio/renovación tras vencer).
+        Devuelve el número o None si el pool está lleno.
+        """
+        ssrc = str(ssrc)
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+            if ssrc in self.leases:
+                display = self.leases[ssrc][0]
+            else:
+                display = self.pick(prefer)
+                if display is None:
+                    return None
+                self.holders.setdefault(display, set()).add(ssrc)
+            self.leases[ssrc] = (display, now + self.lease_seconds)
+            return display
+
+    def has_room(self, display):
+        return self.base <= display < self.base + self.size and len(self.holders.get(display, ())) < self.per_display
+
+    def pick(self, prefer):
+        if prefer is not None and self.has_room(prefer):
+            return prefer
+        # Primero el display en uso más lleno que todavía tenga lugar: se comparte su Xvfb
+        shared = [d for d in self.holders if self.has_room(d)]
+        if shared:
+            return max(shared, key=lambda d: (len(self.holders[d]), -d))
+        for display in range(self.base, self.base + self.size):
+            if display not in self.holders:
+                return display
+        return None
+
+    def renew(self, ssrc, display):
+        """
+        Renovación de un cliente que ya está usando `display`. Si su lease venció
+        (o quedó en otro display) lo vuelve a tomar en ese mismo display. Si ahí no
+        hay lugar devuelve None sin asignarle otro: el cliente no se va a mover, y
+        un lease en otro display lo contaría donde no está.
+        """
+        ssrc = str(ssrc)
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+            current = self.leases.get(ssrc)
+            if current is None or current[0] != display:
+                if current is not None:
+                    self.drop(ssrc)
+                if not self.has_room(display):
+                    return None
+                self.holders.setdefault(display, set()).add(ssrc)
+            self.leases[ssrc] = (display, now + self.lease_seconds)
+            return display
+
+    def release(self, ssrc):
+        with self.lock:
+            if str(ssrc) in self.leases:
+                self.drop(str(ssrc))
+
+    def snapshot(self):
+        with self.lock:
+            self.expire(time.monotonic())
+            return {display: sorted(holders) for display, holders in self.holders.items()}
@@ -1,70 +1,289 @@
 import os
 import sys
+import threading
 import time
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
-from my_logger import log
-from config import JITTER_BUFFER_SIZE, MAX_WAIT, FRAME_SIZE, JITTER_BUFFER_SIZE
+from config import (FRAME_SIZE, JITTER_RING_CAPACITY, SAMPLE_RATE,
+                    ADAPTIVE_MIN_DEPTH, ADAPTIVE_MAX_DEPTH, ADAPTIVE_JITTER_K,
+                    ADAPTIVE_MIN_WAIT, ADAPTIVE_MAX_WAIT, DTX_MAX_FILL_SECONDS)
 
+# Constantes de RFC 3550, apéndice A.1 (validación de números de secuencia)
+RTP_SEQ_MOD = 1 << 16
+MAX_DROPOUT = 3000
+MAX_MISORDER = 100
+
+SILENCE_FRAME = bytes(2 * FRAME_SIZE)  # 2 bytes por sample, FRAME_SIZE samples
+FRAME_SECONDS = FRAME_SIZE / SAMPLE_RATE
+DTX_MAX_FILL_FRAMES = int(DTX_MAX_FILL_SECONDS / FRAME_SECONDS)
+EMPTY = -1
 
-import time
 
 class JitterBuffer:
-    def __init__(self, prefill_min=10, max_wait=0.5):
-        self.buffer = {}  # seq_num -> (timestamp, payload)
-        self.prefill_min = prefill_min
+    """
+    Jitter buffer de capacidad fija por stream.
+
+    Los paquetes se guardan en un anillo indexado por `seq extendido % capacity`,
+    donde el seq extendido (ciclos * 65536 + seq, RFC 3550 A.1) hace que el wraparound
+    de 16 bits sea transparente. Insertar, sacar y desalojar cuestan O(1); la memoria
+    queda acotada a `capacity` paquetes. Los paquetes que llegan después de que su
+    turno ya pasó se descartan y se cuentan como `too_late`.
+
+    En modo adaptativo (adaptive=True) se estima el jitter entre llegadas del stream
+    (RFC 3550, 6.4.1) comparando timestamps RTP con la hora de llegada, y con él se
+    ajustan la profundidad objetivo y el tiempo de espera antes de declarar pérdida:
+    un hueco se da por perdido cuando pasa ese tiempo o cuando ya hay `target_depth`
+    paquetes posteriores esperando. Crecen de inmediato y se achican despacio.
+
+    Supresión de silencio (RFC 3551, 4.1): el emisor deja de mandar frames silenciosos
+    sin gastar números de secuencia y marca con el bit M el primer paquete de cada
+    tramo de voz. Ese paquete llega con el seq esperado pero con el timestamp
+    adelantado: el hueco de timestamp se rellena con silencio en el momento, sin
+    esperar y sin contarlo como pérdida (`dtx_frames`). Con el buffer vacío tampoco
+    se declara pérdida: sin un paquete posterior no hay forma de saber si falta algo.
+    """
+
+    def __init__(self, prefill_min=10, max_wait=0.5, capacity=JITTER_RING_CAPACITY, adaptive=False):
+        self.capacity = capacity
+        self.ext_seqs = [EMPTY] * capacity
+        self.timestamps = [0] * capacity
+        self.payloads = [None] * capacity
+        self.slots = [None] * capacity
+        self.markers = [False] * capacity
+        self.count = 0
+        self.lock = threading.Lock()
+        self.closed = False  # Cliente retirado: los paquetes que lleguen tarde solo liberan su slot
+
+        self.adaptive = adaptive
+        self.prefill_min = ADAPTIVE_MIN_DEPTH if adaptive else prefill_min
         self.prefill_done = False
-        self.max_wait = max_wait
-        self.last_seq_time = None  # (seq_num, time.time())
+        self.max_wait = ADAPTIVE_MIN_WAIT if adaptive else max_wait
+        self.target_depth = self.prefill_min if adaptive else capacity
+        self.jitter = 0.0  # Jitter estimado en unidades de timestamp RTP (samples)
+        self.last_arrival = None
+        self.last_timestamp = None
+        self.last_shrink_time = 0.0
+        self.last_pop_time = None
+        self.expected_timestamp = None  # Timestamp RTP del próximo frame a entregar
+        self.next_ext_seq = None  # Próximo seq extendido a entregar
+        self.pending_fill = 0  # Frames de silencio suprimido que faltan entregar
+
+        # Estado de RFC 3550 A.1
+        self.max_seq = None
+        self.cycles = 0
+        self.bad_seq = None
+
+        self.stats = {
+            'received': 0, 'duplicates': 0, 'too_late': 0, 'evicted': 0,
+            'lost': 0, 'invalid_seq': 0, 'resyncs': 0, 'talkspurts': 0, 'dtx_frames': 0,
+        }
+
+    def _extend_seq(self, seq):
+        """Devuelve el seq extendido del paquete, o None si el salto no es válido (todavía)."""
+        if self.max_seq is None:
+            self.max_seq = seq
+            return seq
+        udelta = (seq - self.max_seq) & 0xFFFF
+        if udelta < MAX_DROPOUT:
+            # En orden (con huecos tolerables): si dio la vuelta, sumamos un ciclo
+            if seq < self.max_seq:
+                self.cycles += RTP_SEQ_MOD
+            self.max_seq = seq
+            return self.cycles + seq
+        if udelta <= RTP_SEQ_MOD - MAX_MISORDER:
+            # Salto grande: solo se acepta si el paquete siguiente lo confirma (emisor reiniciado)
+            if seq == self.bad_seq:
+                self._resync(seq)
+                return self.cycles + seq
+            self.bad_seq = (seq + 1) & 0xFFFF
+            return None
+        # Duplicado o desordenado: pertenece al ciclo anterior si está "por encima" de max_seq
+        ext = self.cycles + seq
+        if seq > self.max_seq:
+            ext -= RTP_SEQ_MOD
+        return ext
+
+    def _resync(self, seq):
+        self.stats['resyncs'] += 1
+        self._drop_all()
+        self.max_seq = seq
+        self.bad_seq = None
+        self.next_ext_seq = self.cycles + seq
         self.expected_timestamp = None
+        self.pending_fill = 0
+
+    def _evict(self, index):
+        slot = self.slots[index]
+        if slot is not None:
+            slot.release()
+        self.ext_seqs[index] = EMPTY
+        self.payloads[index] = None
+        self.slots[index] = None
+        self.count -= 1
 
-    def add_packet(self, seq_num, timestamp, payload):
-        self.buffer[seq_num] = (timestamp, payload)
-        # Opcional: actualizar expected_timestamp si es el primer paquete
-        if self.expected_timestamp is None:
-            self.expected_timestamp = timestamp
+    def _drop_all(self):
+        for index in range(self.capacity):
+            if self.ext_seqs[index] != EMPTY:
+                self._evict(index)
+
+    def _update_jitter(self, timestamp):
+        """Estimador de jitter de RFC 3550: J += (|D| - J) / 16, con D en samples."""
+        arrival = time.monotonic() * SAMPLE_RATE
+        if self.last_arrival is not None:
+            # Diferencia de timestamps con signo, tolerando el wraparound de 32 bits
+            ts_delta = ((timestamp - self.last_timestamp + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+            delta = abs((arrival - self.last_arrival) - ts_delta)
+            self.jitter += (delta - self.jitter) / 16
+        self.last_arrival = arrival
+        self.last_timestamp = timestamp
+
+        jitter_seconds = self.jitter / SAMPLE_RATE
+        margin = ADAPTIVE_JITTER_K * jitter_seconds
+        depth = min(ADAPTIVE_MAX_DEPTH, max(ADAPTIVE_MIN_DEPTH, int(margin / FRAME_SECONDS) + 1))
+        wait = min(ADAPTIVE_MAX_WAIT, max(ADAPTIVE_MIN_WAIT, FRAME_SECONDS + margin))
+        if depth > self.target_depth:
+            self.target_depth = depth
+        elif depth < self.target_depth:
+            # Achicar de a un paquete por segundo para no oscilar
+            now = time.monotonic()
+            if now - self.last_shrink_time >= 1.0:
+                self.target_depth -= 1
+                self.last_shrink_time = now
+        if wait > self.max_wait:
+            self.max_wait = wait
+        else:
+            self.max_wait -= (self.max_wait - wait) / 64
+
+    def add_packet(self, seq_num, timestamp, payload, slot=None, marker=False):
+        with self.lock:
+            if self.closed:
+                if slot is not None:
+                    slot.release()
+                return
+            self.stats['received'] += 1
+            ext = self._extend_seq(seq_num)
+            if ext is None:
+                self.stats['invalid_seq'] += 1
+                if slot is not None:
+                    slot.release()
+                return
+            if self.next_ext_seq is None:
+                self.next_ext_seq = ext
+            if self.expected_timestamp is None and ext == self.next_ext_seq:
+                self.expected_timestamp = timestamp
+            if ext < self.next_ext_seq:
+                # Su turno ya pasó (se escribió silencio en su lugar)
+                self.stats['too_late'] += 1
+                if slot is not None:
+                    slot.release()
+                return
+            if ext >= self.next_ext_seq + self.capacity:
+                # El consumidor va atrasado más de un anillo: se adelanta la lectura
+                # desalojando lo más viejo (cada posición se desaloja una sola vez)
+                new_next = ext - self.capacity + 1
+                if new_next - self.next_ext_seq >= self.capacity:
+                    self.stats['evicted'] += self.count
+                    self._drop_all()
+                else:
+                    for skipped in range(self.next_ext_seq, new_next):
+                        index = skipped % self.capacity
+                        if self.ext_seqs[index] == skipped:
+                            self.stats['evicted'] += 1
+                            self._evict(index)
+                self.next_ext_seq = new_next
+                self.expected_timestamp = None  # Se vuelve a tomar del próximo paquete entregado
+                self.pending_fill = 0
+
+            index = ext % self.capacity
+            if self.ext_seqs[index] == ext:
+                self.stats['duplicates'] += 1
+                if slot is not None:
+                    slot.release()
+                return
+            # Solo los paquetes válidos que se insertan alimentan el estimador: duplicados,
+            # tardíos y los que descarta la validación de A.1 inflarían la profundidad
+            if self.adaptive:
+                self._update_jitter(timestamp)
+            self.ext_seqs[index] = ext
+            self.timestamps[index] = timestamp
+            self.payloads[index] = payload
+            self.slots[index] = slot
+            self.markers[index] = marker
+            self.count += 1
 
     def ready_to_consume(self):
-        if not self.prefill_done and len(self.buffer) >= self.prefill_min:
+        if not self.prefill_done and self.count >= self.prefill_min:
             self.prefill_done = True
         return self.prefill_done
 
-    def pop_next(self, next_seq):
-        now = time.time()
-        # Si el paquete esperado está, lo devolvemos
-        if next_seq in self.buffer:
-            timestamp, payload = self.buffer.pop(next_seq)
-            self.last_seq_time = (next_seq, now)
-            self.expected_timestamp = timestamp  # Actualiza el timestamp esperado
-            return {"payload": payload, "is_silence": False}
-        # Si no está, pero ya esperamos suficiente, insertamos silencio
-        elif self.last_seq_time and (now - self.last_seq_time[1]) > self.max_wait:
-            # Avanzamos secuencia y timestamp esperado
-            self.last_seq_time = (next_seq, now)
-            if self.expected_timestamp is not None:
-                self.expected_timestamp += 960  # Ejemplo: 20ms a 48kHz = 960 samples
-            silence = b'\x00' * 2 * 960  # 2 bytes por sample, 960 samples (ajusta según tu frame)
-            return {"payload": silence, "is_silence": True}
-        else:
+    def pop_next(self):
+        with self.lock:
+            if self.next_ext_seq is None:
+                return None
+            now = time.time()
+            index = self.next_ext_seq % self.capacity
+            present = self.ext_seqs[index] == self.next_ext_seq
+            if present and self.markers[index]:
+                # Inicio de un tramo de voz: el hueco de timestamp es silencio suprimido a propósito
+                self.markers[index] = False
+                self.stats['talkspurts'] += 1
+                if self.expected_timestamp is not None:
+                    gap = ((self.timestamps[index] - self.expected_timestamp + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+                    frames = gap // FRAME_SIZE
+                    if 0 < frames <= DTX_MAX_FILL_FRAMES:
+                        self.pending_fill = frames
+            if self.pending_fill:
+                self.pending_fill -= 1
+                self.stats['dtx_frames'] += 1
+                self.expected_timestamp = (self.expected_timestamp + FRAME_SIZE) & 0xFFFFFFFF
+                self.last_pop_time = now
+                return {"payload": SILENCE_FRAME, "is_silence": True}
+            # Si el paquete esperado está, lo devolvemos
+            if present:
+                payload = self.payloads[index]
+                slot = self.slots[index]
+                self.expected_timestamp = (self.timestamps[index] + FRAME_SIZE) & 0xFFFFFFFF
+                self.ext_seqs[index] = EMPTY
+                self.payloads[index] = None
+                self.slots[index] = None
+                self.count -= 1
+                self.next_ext_seq += 1
+                self.last_pop_time = now
+                return {"payload": payload, "is_silence": False, "slot": slot}
+            # Si no está, pero hay paquetes posteriores y ya esperamos suficiente (o en modo
+            # adaptativo ya hay target_depth esperando), insertamos silencio
+            if self.count and self.last_pop_time and ((now - self.last_pop_time) > self.max_wait
+                                                      or (self.adaptive and self.count >= self.target_depth)):
+                self.stats['lost'] += 1
+                self.next_ext_seq += 1
+                self.last_pop_time = now
+                if self.expected_timestamp is not None:
+                    self.expected_timestamp = (self.expected_timestamp + FRAME_SIZE) & 0xFFFFFFFF
+                return {"payload": SILENCE_FRAME, "is_silence": True}
             return None  # Esperar más
 
     def get_size(self):
-        return len(self.buffer)
+        return self.count
 
-    # Opcional: descartar paquetes muy viejos según timestamp
-    def discard_old(self, current_timestamp):
-        to_remove = [seq for seq, (ts, _) in self.buffer.items() if ts < current_timestamp - 10 * 960]
-        for seq in to_remove:
-            del self.buffer[seq]
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, buffered=self.count)
+            if self.adaptive:
+                stats.update(jitter_ms=round(1000 * self.jitter / SAMPLE_RATE, 2),
+                             target_depth=self.target_depth,
+                             loss_timeout_ms=round(1000 * self.max_wait, 1))
+            return stats
 
-# --- Jitter buffer configurable ---
+    def clear(self):
+        """Vacía el buffer devolviendo al pool los slots de recepción pendientes."""
+        with self.lock:
+            self._drop_all()
+            self.pending_fill = 0
 
-def check_prefill(buffer, prefill_done, client_id):
-    """
-    Verifica si el pre-llenado del jitter buffer ha sido completado.
-    """
-    if not prefill_done and len(buffer) > 0:
-        log(f"[JitterBuffer] Cliente {client_id}: pre-llenado completado con {len(buffer)} paquetes", "INFO")
-        return True
-    return prefill_done
+    def close(self):
+        """Vacía el buffer y rechaza lo que llegue después (sin retener slots del pool)."""
+        with self.lock:
+            self.closed = True
+            self._drop_all()
+            self.pending_fill = 0
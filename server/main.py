@@ -1,95 +1,62 @@
 import threading
-import gc
 import signal
 import sys
 import os
-import socket
-import threading
-import json
+import argparse
 
-from utils import log_buffer_sizes_periodically
-from rtp_server import udp_listener_jitter
-from client_manager import clients_lock, clients
-from metadata import channel_map, channel_map_lock
+from rtp_server import RECEIVERS
+from client_manager import close_all_clients
+from sharding import start_shards, stop_shards
+from control_plane import start_control_plane
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 from my_logger import log
-from config import METADATA_PORT, LISTEN_IP, NUM_DISPLAY_PORT
+from config import CONTROL_PORT, LISTEN_IP, RECEIVER_MODE, INGEST_SHARDS
+
+shard_processes = []
 
 def shutdown_handler(signum, frame):
     log("\n🛑 Shutting down server...", "WARN")
 
-    with clients_lock:
-        log("💾 Closing all WAV files...", "INFO")
-        for client_id, client in clients.items():
-            try:
-                client['wavefile'].close()
-                client['wavefile'] = None  # Eliminar referencia para liberar memoria
-                gc.collect()  # Forzar recolección de basura
-                log(f"Closed WAV for client {client_id}", "INFO")
-            except Exception as e:
-                log(f"Error closing WAV file for client {client_id}: {e}", "ERROR")
+    if shard_processes:
+        log("🧩 Deteniendo shards de ingesta...", "INFO")
+        stop_shards(shard_processes)
+    close_all_clients()
 
     log("✅ Cleanup complete.", "INFO")
     sys.exit(0)
 
 
-def metadata_listener(ip, port):
-    import json
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((ip, port))
-    log(f"🎧 Listening for metadata on {LISTEN_IP}:{port}", "INFO")
-    while True:
-        data, _ = sock.recvfrom(1024)
-        msg = json.loads(data.decode())
-        try:
-            ssrc = str(msg['ssrc'])
-            channel = msg['channel']
-            # Bloqueo para escritura
-            with channel_map_lock:
-                channel_map[ssrc] = channel
-            log(f"📡 Metadata received: {ssrc} -> {channel}", "INFO")
-        except Exception as e:
-            log(f"❌ Error processing metadata: {e}", "ERROR")
-
-
-def obtain_display_num_listener(ip, port):
-    import json
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((ip, port))
-    log(f"🎧 Listening for display number requests on {LISTEN_IP}:{port}", "INFO")
-    while True:
-        data, addr = sock.recvfrom(1024)
-        msg = json.loads(data.decode())
-        log(f"Received display request: {msg}", "INFO")
-        ssrc = str(msg["ssrc"])
-        log(f"🎧 Display request from client: {ssrc}", "INFO")
-        if msg.get("cmd") == "GET_DISPLAY_NUM":
-            log(f"🔍 Display request : {msg.get('cmd')}", "INFO")
-            with channel_map_lock:
-                display_num = len(channel_map) + 10
-            sock.sendto(str(display_num).encode(), addr)
-            log(f"🖥️ Display solicitado por el cliente: {ssrc}, asignado: {display_num}", "INFO")
-        else:
-            log(f"❌ Mensaje JSON no reconocido Display Listener: {msg}", "ERROR")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Servidor RTP: recibe audio por SSRC y lo guarda en WAV.")
+    parser.add_argument("--receiver", choices=sorted(RECEIVERS), default=RECEIVER_MODE,
+                        help=f"Modo de recepción RTP (default: {RECEIVER_MODE})")
+    parser.add_argument("--shards", type=int, default=INGEST_SHARDS,
+                        help="Procesos de ingesta con SO_REUSEPORT (1 = sin shards, 0 = uno por core)")
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    num_shards = args.shards or os.cpu_count()
+    # El fork de los shards debe hacerse antes de levantar cualquier hilo
+    if num_shards > 1:
+        shard_processes = start_shards(num_shards, args.receiver)
+
     signal.signal(signal.SIGINT, shutdown_handler)
     signal.signal(signal.SIGTERM, shutdown_handler)
 
-    metadata_thread = threading.Thread(target=metadata_listener, args=(LISTEN_IP, METADATA_PORT,), daemon=True)
-    metadata_thread.start()
-
-    num_display_thread = threading.Thread(target=obtain_display_num_listener, args=(LISTEN_IP, NUM_DISPLAY_PORT,), daemon=True)
-    num_display_thread.start()
+    # Registro de canales y leases de display: un único endpoint con respuesta a cada pedido
+    start_control_plane(LISTEN_IP, CONTROL_PORT)
 
     """log_buffer_size_thread = threading.Thread(target=log_buffer_sizes_periodically, daemon=True)
     log_buffer_size_thread.start()"""
 
-    listener_thread = threading.Thread(target=udp_listener_jitter, daemon=True)
-    listener_thread.start()
+    if not shard_processes:
+        log(f"📥 Modo de recepción RTP: {args.receiver}", "INFO")
+        listener_thread = threading.Thread(target=RECEIVERS[args.receiver], daemon=True)
+        listener_thread.start()
 
     # Mantener el programa vivo esperando señal para cerrar
     signal.pause()
@@ -1,4 +1,21 @@
 import threading
 
 channel_map = {}   # ssrc (str) -> channel_name (str)
+codec_map = {}     # ssrc (str) -> codec del payload anunciado en la metadata ("l16", "pcmu", "adpcm")
 channel_map_lock = threading.Lock()
+
+# Colas de procesos shard que reciben cada actualización de channel_map
+channel_map_subscribers = []
+# Funciones (ssrc, channel) llamadas en este proceso tras cada registro
+channel_map_listeners = []
+
+
+def update_channel_map(ssrc, channel, codec="l16"):
+    """Registra ssrc -> channel (y su codec) y lo propaga a los shards de ingesta, si los hay."""
+    with channel_map_lock:
+        channel_map[str(ssrc)] = channel
+        codec_map[str(ssrc)] = codec
+    for queue in channel_map_subscribers:
+        queue.put((str(ssrc), channel, codec))
+    for listener in channel_map_listeners:
+        listener(str(ssrc), channel)
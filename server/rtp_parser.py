@@ -0,0 +1,49 @@
+"""
+Parser RTP de cabecera fija (RFC 3550) sin dependencias ni copias.
+
+Lee los campos directamente de un memoryview sobre el datagrama recibido y
+devuelve el payload como slice del mismo buffer, en lugar de construir un
+objeto rtp.RTP a partir de una copia bytearray del paquete.
+"""
+import struct
+
+RTP_HEADER = struct.Struct("!BBHII")   # V/P/X/CC, M/PT, seq, timestamp, ssrc
+RTP_EXT_HEADER = struct.Struct("!HH")  # profile, longitud en palabras de 32 bits
+RTP_HEADER_LEN = 12
+
+
+def parse_rtp_header(data):
+    """
+    Parsea un datagrama RTP versión 2.
+
+    Devuelve una tupla (ssrc, seq, timestamp, marker, payload_type, payload) donde
+    payload es un memoryview sobre `data` (sin copia), o None si el datagrama no es
+    RTP válido. El rechazo es barato: longitud y versión se comprueban antes que nada,
+    así los datagramas de texto como "HANDSHAKE:<ssrc>" (primer byte 'H' = versión 1)
+    se descartan sin pasar por excepciones.
+    """
+    size = len(data)
+    if size < RTP_HEADER_LEN:
+        return None
+    view = memoryview(data)
+    b0, b1, seq, timestamp, ssrc = RTP_HEADER.unpack_from(view)
+    if b0 & 0xC0 != 0x80:
+        return None
+
+    # CSRC count: 4 bytes por cada CSRC tras la cabecera fija
+    offset = RTP_HEADER_LEN + ((b0 & 0x0F) << 2)
+    if b0 & 0x10:
+        # Extensión de cabecera: 4 bytes de cabecera + longitud * 4 bytes
+        if offset + 4 > size:
+            return None
+        offset += 4 + (RTP_EXT_HEADER.unpack_from(view, offset)[1] << 2)
+    end = size
+    if b0 & 0x20:
+        # Padding: el último byte indica cuántos bytes descartar
+        padding = view[size - 1]
+        if padding == 0:
+            return None
+        end -= padding
+    if offset > end:
+        return None
+    return ssrc, seq, timestamp, b1 >> 7, b1 & 0x7F, view[offset:end]
@@ -1,60 +1,194 @@
+import asyncio
 import os
 import socket
 import sys
-import time
 
-from rtp import RTP
-
-from client_manager import get_or_create_client
+from buffer_pool import RecvBufferPool
+from client_manager import get_or_create_client, update_client_codec
+from rtp_parser import parse_rtp_header
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
-from my_logger import log    
-from config import BUFFER_SIZE, LISTEN_IP, LISTEN_PORT
+from my_logger import log, log_rate_limited
+from config import LISTEN_IP, LISTEN_PORT, ASYNC_RX_BATCH
 
-def parse_rtp_packet(data):
-    """
-    Analiza un paquete RTP y devuelve un objeto RTP.
-    """
-    try:
-        rtp_packet = RTP()
-        rtp_packet.fromBytearray(bytearray(data))
-        return rtp_packet
-    except Exception as e:
-        log(f"Error parsing RTP packet: {e}", "ERROR")
-        return None
+# Contadores globales del receptor (los lee el benchmark y el log periódico)
+rx_stats = {'packets': 0, 'invalid': 0, 'batches': 0}
+# Pool de buffers del modo recv_into (se crea al arrancar ese listener)
+recv_pool = None
 
 
-def udp_listener_jitter():
+def create_rtp_socket(ip=LISTEN_IP, port=LISTEN_PORT, reuseport=False, verbose=True):
     """
-    Escucha paquetes UDP y los procesa como flujos de audio RTP.
+    Crea el socket UDP de recepción RTP con el buffer del kernel ampliado.
+    Con reuseport=True varios sockets (uno por shard) comparten el mismo puerto.
+    Con verbose=False no loguea: el primer log arranca el hilo escritor y los
+    sockets de los shards se crean antes del fork, sin hilos.
     """
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if reuseport:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     # Aumentar el buffer UDP a 8 MB para soportar más tráfico simultáneo
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8<<20)
+    sock.bind((ip, port))
+    if verbose:
+        log_socket_ready(sock)
+    return sock
+
+
+def log_socket_ready(sock):
     actual_buf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    ip, port = sock.getsockname()[:2]
     log(f"[UDP] Buffer de recepción configurado: {actual_buf // (1024*1024)} MB", "INFO")
-    sock.bind((LISTEN_IP, LISTEN_PORT))
-    log(f"🎧 Listening for RTP audio on {LISTEN_IP}:{LISTEN_PORT}", "INFO")
+    log(f"🎧 Listening for RTP audio on {ip}:{port}", "INFO")
     log("🔊 Saving incoming audio streams to .wav files...", "INFO")
+
+
+def handle_datagram(data, addr, slot=None):
+    """
+    Procesa un datagrama: lo parsea como RTP, obtiene (o crea) el cliente por SSRC
+    y agrega el payload a su jitter buffer. Si el datagrama vive en un slot del
+    pool de recepción, el slot viaja con el payload hasta que el worker lo libera.
+    """
+    parsed = parse_rtp_header(data)
+    if parsed is None:
+        # Handshakes de texto, basura o paquetes truncados
+        rx_stats['invalid'] += 1
+        if slot is not None:
+            slot.release()
+        return
+    ssrc, seq_num, timestamp, marker, payload_type, payload = parsed
+    if seq_num % 100 == 0:
+        log_rate_limited("udp-key-packet", f"[UDP] Paquete clave recibido de {addr}, seq={seq_num}", "INFO")
+    client_id = str(ssrc)
+    client = get_or_create_client(client_id, seq_num)
+    if payload_type != client['codec'].payload_type and not update_client_codec(client, client_id, payload_type):
+        # Payload type sin codec conocido: no se puede decodificar
+        rx_stats['invalid'] += 1
+        if slot is not None:
+            slot.release()
+        return
+
+    jitter_buffer = client['jitter_buffer']
+    jitter_buffer.add_packet(seq_num, timestamp, payload, slot, marker)
+    rx_stats['packets'] += 1
+
+
+def udp_listener_jitter(sock=None):
+    """
+    Escucha paquetes UDP y los procesa como flujos de audio RTP.
+    """
+    if sock is None:
+        sock = create_rtp_socket()
     while True:
         try:
             data, addr = sock.recvfrom(8192)
-            rtp_packet = parse_rtp_packet(data)
-            if rtp_packet.sequenceNumber % 100 == 0:
-                log(f"[UDP] Paquete clave recibido de {addr}, seq={rtp_packet.sequenceNumber}", "INFO")
-            if not rtp_packet:
-                continue
-            client_id = str(rtp_packet.ssrc)
-            seq_num = rtp_packet.sequenceNumber
-            client = get_or_create_client(client_id, seq_num)
+            handle_datagram(data, addr)
+        except Exception as e:
+            if isinstance(e, OSError) and str(e) == 'Bad file descriptor':
+                break
+            log_rate_limited("udp-rx-error", f"❌ Error receiving or processing packet: {e}", "ERROR")
+    sock.close()
 
-            jitter_buffer = client['jitter_buffer']
-            jitter_buffer.add_packet(seq_num, rtp_packet.timestamp, rtp_packet.payload)
 
-            #handle_rtp_packet(client, client_id, seq_num, rtp_packet.payload)
+def udp_listener_recv_into(sock=None):
+    """
+    Igual que udp_listener_jitter pero sin asignar un bytes nuevo por datagrama:
+    drena el socket con recvfrom_into sobre slots preasignados de un pool fijo.
+    """
+    global recv_pool
+    if sock is None:
+        sock = create_rtp_socket()
+    recv_pool = RecvBufferPool()
+    log(f"♻️ Pool de recepción: {recv_pool.capacity} slots de {recv_pool.slot_size} bytes", "INFO")
+    acquire = recv_pool.acquire
+    slot_size = recv_pool.slot_size
+    while True:
+        slot = acquire()
+        try:
+            if slot is None:
+                # Pool agotado (workers atrasados): este datagrama va por el camino normal
+                data, addr = sock.recvfrom(8192)
+                handle_datagram(data, addr)
+                continue
+            nbytes, addr = sock.recvfrom_into(slot.buf)
+            if nbytes >= slot_size:
+                # El datagrama no entra en el slot: llegó truncado, se descarta
+                rx_stats['invalid'] += 1
+                slot.release()
+                continue
+            handle_datagram(slot.view[:nbytes], addr, slot)
         except Exception as e:
+            if slot is not None:
+                slot.release()
             if isinstance(e, OSError) and str(e) == 'Bad file descriptor':
                 break
-            print(f"Error receiving or processing packet: {e}")
-    sock.close()
\ No newline at end of file
+            log(f"❌ Error receiving or processing packet: {e}", "ERROR")
+    sock.close()
+
+
+class RTPDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Receptor RTP basado en asyncio.
+
+    Cada vez que el event loop entrega un datagrama, se drena además el socket
+    (no bloqueante) hasta ASYNC_RX_BATCH datagramas y se procesa el lote completo
+    en el mismo tick, evitando una vuelta de select() por paquete.
+    """
+
+    def __init__(self, sock, batch_size=ASYNC_RX_BATCH):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        batch = [(data, addr)]
+        recvfrom = self.sock.recvfrom
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(recvfrom(8192))
+        except (BlockingIOError, InterruptedError):
+            pass
+        rx_stats['batches'] += 1
+        for data, addr in batch:
+            try:
+                handle_datagram(data, addr)
+            except Exception as e:
+                log(f"Error processing packet from {addr}: {e}", "ERROR")
+
+    def error_received(self, exc):
+        log(f"[UDP] Error en el socket RTP (asyncio): {exc}", "ERROR")
+
+
+async def _serve_async(sock):
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: RTPDatagramProtocol(sock), sock=sock
+    )
+    log(f"⚡ Receptor asyncio activo (lotes de hasta {ASYNC_RX_BATCH} datagramas)", "INFO")
+    try:
+        await loop.create_future()
+    finally:
+        transport.close()
+
+
+def udp_listener_async(sock=None):
+    """
+    Igual que udp_listener_jitter pero con un DatagramProtocol de asyncio
+    que procesa los datagramas en lotes por tick del event loop.
+    """
+    if sock is None:
+        sock = create_rtp_socket()
+    sock.setblocking(False)
+    asyncio.run(_serve_async(sock))
+
+
+# Modos de recepción seleccionables desde server/main.py
+RECEIVERS = {
+    "thread": udp_listener_jitter,
+    "asyncio": udp_listener_async,
+    "recv_into": udp_listener_recv_into,
+}
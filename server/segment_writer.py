@@ -0,0 +1,330 @@
+"""
+Escritores de segmento del servidor.
+
+Todos implementan la misma interfaz (SegmentWriter): writeframes() con PCM s16le,
+maybe_flush(), close(), flush_stats() y encoding_stats(). El formato se elige con
+SEGMENT_FORMAT a través de open_segment_writer().
+"""
+from abc import ABC, abstractmethod
+import mmap
+import os
+import struct
+import subprocess
+import sys
+import time
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from config import (SAMPLE_RATE, CHANNELS, WAV_SEGMENT_SECONDS, WAV_FLUSH_BYTES, WAV_FLUSH_INTERVAL,
+                    SEGMENT_FORMAT, FLAC_ENCODER_CMD)
+
+SAMPLE_WIDTH = 2  # 16 bits
+WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")  # Cabecera PCM canónica de 44 bytes
+WAV_RIFF_SIZE_OFFSET = 4
+WAV_DATA_SIZE_OFFSET = 40
+UINT32 = struct.Struct("<I")
+SEGMENT_PCM_BYTES = WAV_SEGMENT_SECONDS * SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH  # Tope de audio por segmento
+
+
+def wav_header(data_bytes, channels=CHANNELS, sample_rate=SAMPLE_RATE, sample_width=SAMPLE_WIDTH):
+    block_align = channels * sample_width
+    return WAV_HEADER.pack(
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b"data", data_bytes,
+    )
+
+
+class SegmentWriter(ABC):
+    """
+    Interfaz común de los escritores de segmento. Reciben PCM s16le en
+    writeframes() y llevan la cuenta de bytes PCM y CPU gastada en codificar
+    para reportar la tasa de compresión y el costo por stream.
+    """
+    extension = ""
+
+    def __init__(self, path):
+        self.name = path
+        self.pcm_bytes = 0
+        self.cpu_seconds = 0.0
+
+    @property
+    @abstractmethod
+    def closed(self):
+        ...
+
+    @abstractmethod
+    def writeframes(self, data):
+        ...
+
+    def maybe_flush(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        ...
+
+    def flush_stats(self):
+        return {}
+
+    def encoding_stats(self):
+        """Tasa de compresión y CPU de codificación (% de un core por stream en tiempo real)."""
+        audio_seconds = self.pcm_bytes / (SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH)
+        try:
+            file_bytes = os.path.getsize(self.name)
+        except OSError:
+            file_bytes = 0
+        return {
+            'audio_seconds': round(audio_seconds, 2),
+            'file_bytes': file_bytes,
+            'compression_ratio': round(self.pcm_bytes / file_bytes, 3) if file_bytes else 0.0,
+            'cpu_seconds': round(self.cpu_seconds, 4),
+            'cpu_pct_per_stream': round(100 * self.cpu_seconds / audio_seconds, 3) if audio_seconds else 0.0,
+        }
+
+
+class BufferedWavWriter(SegmentWriter):
+    """
+    Escritor WAV con buffer propio preasignado.
+
+    A diferencia de wave.Wave_write, que reescribe la cabecera RIFF en cada
+    writeframes(), acumula los frames de un cliente y los baja a disco en bloques
+    grandes cuando el buffer se llena o pasa `flush_interval` segundos. La
+    cabecera solo se corrige en flush() y close().
+    """
+
+    extension = ".wav"
+
+    def __init__(self, path, buffer_bytes=WAV_FLUSH_BYTES, flush_interval=WAV_FLUSH_INTERVAL):
+        super().__init__(path)
+        self.file = open(path, "wb")
+        self.file.write(wav_header(0))
+        self.buffer = bytearray(buffer_bytes)
+        self.view = memoryview(self.buffer)
+        self.fill = 0
+        self.data_bytes = 0
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        # Estadísticas de latencia de flush
+        self.flushes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def writeframes(self, data):
+        size = len(data)
+        self.pcm_bytes += size
+        if self.fill + size > len(self.buffer):
+            self.flush()
+            if size > len(self.buffer):
+                # Bloque más grande que el buffer: va directo a disco
+                self.file.write(data)
+                self.data_bytes += size
+                return
+        self.view[self.fill:self.fill + size] = data
+        self.fill += size
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        """Hace flush si el buffer está lleno o si pasó flush_interval desde el último."""
+        if self.fill and (self.fill == len(self.buffer)
+                          or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if self.fill:
+            self.file.write(self.view[:self.fill])
+            self.data_bytes += self.fill
+            self.fill = 0
+        # Corregir los tamaños de la cabecera y volver al final
+        self.file.seek(WAV_RIFF_SIZE_OFFSET)
+        self.file.write(UINT32.pack(36 + self.data_bytes))
+        self.file.seek(WAV_DATA_SIZE_OFFSET)
+        self.file.write(UINT32.pack(self.data_bytes))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+        elapsed = time.perf_counter() - start
+        self.cpu_seconds += time.thread_time() - cpu_start
+        self.last_flush = time.monotonic()
+        self.flushes += 1
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+    def flush_stats(self):
+        return {
+            'flushes': self.flushes,
+            'avg_flush_ms': round(1000 * self.flush_seconds_total / self.flushes, 3) if self.flushes else 0.0,
+            'max_flush_ms': round(1000 * self.flush_seconds_max, 3),
+            'data_bytes': self.data_bytes + self.fill,
+        }
+
+
+class MmapWavWriter(SegmentWriter):
+    """
+    Escritor WAV sobre un archivo preasignado y mapeado en memoria.
+
+    Al abrir reserva el segmento completo (cabecera + SEGMENT_PCM_BYTES) con
+    posix_fallocate, así el filesystem lo ubica en extents contiguos aunque
+    cientos de streams roten a la vez, y lo mapea con mmap. writeframes() copia el
+    PCM directo al mapeo, sin una llamada write() por bloque; el kernel lo baja a
+    disco por su cuenta. Al cerrar se corrige la cabecera y se trunca el archivo
+    al largo real.
+    """
+
+    extension = ".wav"
+
+    def __init__(self, path, capacity=SEGMENT_PCM_BYTES):
+        super().__init__(path)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.size = WAV_HEADER.size + capacity
+        self._reserve(self.size)
+        self.map = mmap.mmap(self.fd, self.size)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.map[:WAV_HEADER.size] = wav_header(0)
+        self.offset = WAV_HEADER.size
+        self.remaps = 0
+        self.last_flush = time.monotonic()
+
+    def _reserve(self, size):
+        try:
+            os.posix_fallocate(self.fd, 0, size)
+        except OSError:
+            # Filesystem sin fallocate: al menos el archivo tiene el largo necesario para el mapeo
+            os.ftruncate(self.fd, size)
+
+    @property
+    def closed(self):
+        return self.map.closed
+
+    @property
+    def data_bytes(self):
+        return self.offset - WAV_HEADER.size
+
+    def writeframes(self, data):
+        cpu_start = time.thread_time()
+        size = len(data)
+        end = self.offset + size
+        if end > self.size:
+            # Más audio que el segmento previsto: se agranda de a un segmento
+            self.map.close()
+            self.size = max(end, self.size + SEGMENT_PCM_BYTES)
+            self._reserve(self.size)
+            self.map = mmap.mmap(self.fd, self.size)
+            self.remaps += 1
+        self.map[self.offset:end] = data
+        self.offset = end
+        self.pcm_bytes += size
+        self.cpu_seconds += time.thread_time() - cpu_start
+
+    def maybe_flush(self):
+        """Cada flush_interval deja la cabecera al día para que el archivo sea legible si el proceso muere."""
+        if time.monotonic() - self.last_flush >= WAV_FLUSH_INTERVAL:
+            self._patch_header()
+            self.last_flush = time.monotonic()
+
+    def _patch_header(self):
+        self.map[WAV_RIFF_SIZE_OFFSET:WAV_RIFF_SIZE_OFFSET + 4] = UINT32.pack(36 + self.data_bytes)
+        self.map[WAV_DATA_SIZE_OFFSET:WAV_DATA_SIZE_OFFSET + 4] = UINT32.pack(self.data_bytes)
+
+    def close(self):
+        if self.map.closed:
+            return
+        cpu_start = time.thread_time()
+        self._patch_header()
+        self.map.close()
+        # Devolver al filesystem lo preasignado que no se usó
+        os.ftruncate(self.fd, self.offset)
+        os.close(self.fd)
+        self.cpu_seconds += time.thread_time() - cpu_start
+
+    def flush_stats(self):
+        return {'data_bytes': self.data_bytes, 'preallocated_bytes': self.size, 'remaps': self.remaps}
+
+
+class FlacSegmentWriter(SegmentWriter):
+    """
+    FLAC en streaming codificado dentro del proceso con libsndfile (paquete
+    `soundfile`, dependencia opcional). libsndfile trabaja por bloques y las
+    llamadas de cffi liberan el GIL mientras codifica.
+    """
+    extension = ".flac"
+
+    def __init__(self, path):
+        import soundfile
+        super().__init__(path)
+        self.file = soundfile.SoundFile(path, "w", samplerate=SAMPLE_RATE, channels=CHANNELS,
+                                        format="FLAC", subtype="PCM_16")
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def writeframes(self, data):
+        cpu_start = time.thread_time()
+        self.file.buffer_write(data, dtype="int16")
+        self.cpu_seconds += time.thread_time() - cpu_start
+        self.pcm_bytes += len(data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        cpu_start = time.thread_time()
+        self.file.close()
+        self.cpu_seconds += time.thread_time() - cpu_start
+
+
+class FlacProcessSegmentWriter(SegmentWriter):
+    """
+    FLAC codificado por un proceso externo (FLAC_ENCODER_CMD, por defecto el CLI
+    `flac`) que lee PCM crudo por stdin. Saca el costo de codificación del GIL del
+    servidor; la CPU del encoder se obtiene de su rusage al terminar.
+    """
+    extension = ".flac"
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.process = subprocess.Popen(FLAC_ENCODER_CMD + ["-o", path, "-"],
+                                        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    @property
+    def closed(self):
+        return self.process.stdin.closed
+
+    def writeframes(self, data):
+        # Si el encoder se atrasa, el write bloquea y la contrapresión llega a la cola del escritor
+        self.process.stdin.write(data)
+        self.pcm_bytes += len(data)
+
+    def close(self):
+        if self.process.stdin.closed:
+            return
+        self.process.stdin.close()
+        _, status, rusage = os.wait4(self.process.pid, 0)
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        self.cpu_seconds = rusage.ru_utime + rusage.ru_stime
+
+
+SEGMENT_WRITERS = {
+    "wav": BufferedWavWriter,
+    "wav-mmap": MmapWavWriter,
+    "flac": FlacSegmentWriter,
+    "flac-process": FlacProcessSegmentWriter,
+}
+
+
+def open_segment_writer(base_path, segment_format=SEGMENT_FORMAT):
+    """Abre un escritor del formato pedido en `base_path` + la extensión del formato."""
+    writer_class = SEGMENT_WRITERS[segment_format]
+    return writer_class(base_path + writer_class.extension)
@@ -0,0 +1,140 @@
+"""
+Ingesta RTP repartida en varios procesos (shards) con SO_REUSEPORT.
+
+El proceso principal abre N sockets sobre LISTEN_PORT con SO_REUSEPORT, en orden,
+y les adjunta un programa cBPF que elige el socket por `ssrc % N`. Después hace
+fork de N procesos: cada shard se queda con su socket, su propio GIL, sus
+clientes (los SSRC que le corresponden) y sus archivos WAV. El proceso principal
+conserva el plano de control (registro y displays) y reenvía cada cambio de
+channel_map a todos los shards.
+"""
+import ctypes
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+
+import metadata
+from client_manager import close_all_clients
+from rtp_server import RECEIVERS, create_rtp_socket, log_socket_ready
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+from my_logger import flush_logs, log
+
+SO_ATTACH_REUSEPORT_CBPF = getattr(socket, "SO_ATTACH_REUSEPORT_CBPF", 51)
+
+# Instrucciones cBPF (linux/filter.h)
+BPF_LD_W_ABS = 0x20   # A = ntohl(*(u32 *)(payload + k))
+BPF_ALU_MOD_K = 0x94  # A %= k
+BPF_RET_A = 0x16      # return A
+RTP_SSRC_OFFSET = 8   # El programa ve el payload UDP: el SSRC está en el byte 8 de la cabecera RTP
+BPF_INSN = struct.Struct("HBBI")  # struct sock_filter { u16 code; u8 jt; u8 jf; u32 k; }
+
+
+def ssrc_steering_program(num_shards):
+    """Instrucciones cBPF (struct sock_filter empaquetadas) que devuelven `ssrc % num_shards`."""
+    program = [
+        (BPF_LD_W_ABS, 0, 0, RTP_SSRC_OFFSET),
+        (BPF_ALU_MOD_K, 0, 0, num_shards),
+        (BPF_RET_A, 0, 0, 0),
+    ]
+    return b"".join(BPF_INSN.pack(*ins) for ins in program)
+
+
+def attach_ssrc_steering(sock, num_shards):
+    """
+    Adjunta al grupo SO_REUSEPORT un programa cBPF que devuelve `ssrc % num_shards`
+    como índice de socket. Devuelve None si se adjuntó o el error si el kernel no
+    lo soporta; en ese caso el kernel reparte por hash de la 4-tupla, que igual
+    mantiene cada cliente (un socket emisor fijo) en un único shard. No loguea:
+    se llama antes del fork de los shards.
+    """
+    program = ssrc_steering_program(num_shards)
+    filter_buf = ctypes.create_string_buffer(program)
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack("HP", len(program) // BPF_INSN.size, ctypes.addressof(filter_buf))
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_REUSEPORT_CBPF, fprog)
+        return None
+    except OSError as e:
+        return e
+
+
+def apply_channel_map_updates(updates):
+    """Hilo del shard: aplica las actualizaciones de channel_map que envía el proceso principal."""
+    while True:
+        ssrc, channel, codec = updates.get()
+        metadata.update_channel_map(ssrc, channel, codec)
+
+
+def shard_main(index, sockets, updates, receiver_mode):
+    """Punto de entrada de cada proceso shard."""
+    num_shards = len(sockets)
+    sock = sockets[index]
+    # Heredados del fork: solo nos quedamos con nuestro socket y no reenviamos a otros shards
+    for other in sockets:
+        if other is not sock:
+            other.close()
+    metadata.channel_map_subscribers.clear()
+
+    def shard_shutdown(signum, frame):
+        log(f"[Shard {index}] Cerrando...", "WARN")
+        close_all_clients()
+        flush_logs()
+        os._exit(0)
+
+    # Ctrl+C llega a todo el grupo de procesos: el principal decide y nos manda SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, shard_shutdown)
+    threading.Thread(target=apply_channel_map_updates, args=(updates,), daemon=True).start()
+    log(f"[Shard {index}] PID {os.getpid()} recibiendo SSRC con ssrc % {num_shards} == {index}", "INFO")
+    RECEIVERS[receiver_mode](sock)
+
+
+def start_shards(num_shards, receiver_mode):
+    """
+    Crea los sockets SO_REUSEPORT y hace fork de un proceso de ingesta por shard.
+    Debe llamarse antes de arrancar otros hilos en el proceso principal.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("SO_REUSEPORT no está disponible en esta plataforma")
+
+    # Se hace bind en orden: el índice dentro del grupo reuseport coincide con el del shard.
+    # Nada de log hasta después del fork: el primer log arranca el hilo escritor
+    sockets = [create_rtp_socket(reuseport=True, verbose=False) for _ in range(num_shards)]
+    steering_error = attach_ssrc_steering(sockets[0], num_shards)
+
+    ctx = multiprocessing.get_context("fork")
+    processes = []
+    for index in range(num_shards):
+        updates = ctx.Queue()
+        process = ctx.Process(target=shard_main, args=(index, sockets, updates, receiver_mode),
+                              name=f"rtp-shard-{index}", daemon=True)
+        process.start()
+        processes.append(process)
+        metadata.channel_map_subscribers.append(updates)
+    if steering_error:
+        log(f"[Shards] No se pudo adjuntar el filtro cBPF por SSRC ({steering_error}), se usa el hash del kernel", "WARN")
+    log(f"[Shards] {num_shards} procesos de ingesta, reparto "
+        f"{'por hash del kernel' if steering_error else 'por SSRC (cBPF)'}", "INFO")
+    log_socket_ready(sockets[0])
+    # Los sockets ya pertenecen a los shards
+    for sock in sockets:
+        sock.close()
+    return processes
+
+
+def stop_shards(processes, timeout=10):
+    """Pide a cada shard que cierre sus WAV y espera a que terminen."""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=timeout)
+        if process.is_alive():
+            log(f"[Shards] {process.name} no terminó a tiempo, forzando cierre", "ERROR")
+            process.kill()
@@ -4,24 +4,34 @@ import os
 import sys
 import time
 
-from client_manager import clients, clients_lock
+import rtp_server
+from client_manager import clients, clients_lock, disk_writer
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
-from my_logger import log
+from my_logger import log, log_stats
 
 def log_buffer_sizes_periodically():
     while True:
         with clients_lock:
             for client_id, client in clients.items():
-                buffer_size = client['jitter_buffer'].get_size()
-                log(f"[Buffer] Cliente {client_id}: tamaño del buffer = {buffer_size}", "DEBUG")
+                stats = client['jitter_buffer'].get_stats()
+                log(f"[Buffer] Cliente {client_id}: tamaño del buffer = {stats['buffered']}, "
+                    f"duplicados = {stats['duplicates']}, tardíos = {stats['too_late']}, "
+                    f"perdidos = {stats['lost']}, desalojados = {stats['evicted']}", "DEBUG")
+
         # Log de objetos grandes en memoria (debug)
         all_objs = gc.get_objects()
         wave_objs = [o for o in all_objs if hasattr(o, 'writeframes')]
         # Solo contar los wave que realmente están abiertos
-        wave_open = [w for w in wave_objs if not (getattr(w, '_file', None) is None or getattr(w, 'closed', False))]
+        wave_open = [w for w in wave_objs if not getattr(w, 'closed', True)]
         wav_count = len(wave_open)
         log(f"[Mem] Objetos tipo wave abiertos: {wav_count}", "WARN")
+        log(f"[Disco] Escritor: {disk_writer.stats}, colas: {disk_writer.queue_depths()}", "DEBUG")
+        log(f"[Disco] Codificación: {disk_writer.encoding_summary()}", "DEBUG")
+        log(f"[Log] Registros descartados: {log_stats['dropped']}, limitados: {log_stats['rate_limited']}", "DEBUG")
+        if rtp_server.recv_pool is not None:
+            pool = rtp_server.recv_pool
+            log(f"[Pool] Slots en uso: {pool.in_use()}/{pool.capacity}, desbordes: {pool.overflow}", "DEBUG")
 
         time.sleep(30)
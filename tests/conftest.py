@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Los módulos del servidor se importan entre sí como hermanos (from rtp_parser import ...)
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, root_dir)
+sys.path.insert(0, os.path.join(root_dir, 'server'))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import audio_codecs
+from audio_codecs import ADPCMCodec, CODECS_BY_PAYLOAD_TYPE, PCMUCodec, get_codec
+
+
+def sine_pcm(samples=960, amplitude=12000, period=48):
+    t = np.arange(samples)
+    return (amplitude * np.sin(2 * np.pi * t / period)).astype("<i2").tobytes()
+
+
+def max_error(a, b):
+    return int(np.abs(np.frombuffer(a, "<i2").astype(int) - np.frombuffer(b, "<i2").astype(int)).max())
+
+
+def test_codecs_registered_by_payload_type():
+    for name in ("l16", "pcmu", "adpcm"):
+        codec = get_codec(name)
+        assert CODECS_BY_PAYLOAD_TYPE[codec.payload_type] is type(codec)
+
+
+def test_pcmu_round_trip():
+    pcm = sine_pcm()
+    payload = PCMUCodec().encode(pcm)
+    assert len(payload) == len(pcm) // 2
+    # μ-law: error relativo acotado por el tamaño del escalón del segmento más alto
+    assert max_error(PCMUCodec().decode(payload), pcm) <= 12000 // 16
+
+
+def test_pcmu_matches_audioop():
+    audioop = pytest.importorskip("audioop")
+    pcm = sine_pcm()
+    assert PCMUCodec().encode(pcm) == audioop.lin2ulaw(pcm, 2)
+    assert PCMUCodec().decode(audioop.lin2ulaw(pcm, 2)) == audioop.ulaw2lin(audioop.lin2ulaw(pcm, 2), 2)
+
+
+@pytest.mark.parametrize("use_audioop", [True, False])
+def test_adpcm_round_trip_across_packets(monkeypatch, use_audioop):
+    if not use_audioop:
+        monkeypatch.setattr(audio_codecs, "audioop", None)
+    elif audio_codecs.audioop is None:
+        pytest.skip("audioop no disponible")
+    encoder = ADPCMCodec()
+    pcm = sine_pcm(samples=960 * 3)
+    frames = [pcm[i:i + 1920] for i in range(0, len(pcm), 1920)]
+    payloads = [encoder.encode(frame) for frame in frames]
+    assert all(len(p) == 4 + 480 for p in payloads)
+    # Cada paquete se decodifica solo desde su cabecera DVI4 (pérdidas no arrastran estado)
+    decoded = [ADPCMCodec().decode(p) for p in reversed(payloads)][::-1]
+    assert all(len(out) == len(frame) for frame, out in zip(frames, decoded))
+    # El primer paquete arranca con paso mínimo y tarda unos samples en seguir la señal;
+    # los siguientes ya traen el estado adaptado en la cabecera
+    warmup = 2 * 100
+    assert max_error(decoded[0][warmup:], frames[0][warmup:]) < 500
+    assert all(max_error(out, frame) < 500 for frame, out in zip(frames[1:], decoded[1:]))
+
+
+def test_adpcm_table_fallback_matches_audioop(monkeypatch):
+    if audio_codecs.audioop is None:
+        pytest.skip("audioop no disponible")
+    pcm = sine_pcm()
+    payload = ADPCMCodec().encode(pcm)
+    decoded = ADPCMCodec().decode(payload)
+    monkeypatch.setattr(audio_codecs, "audioop", None)
+    assert ADPCMCodec().encode(pcm) == payload
+    assert ADPCMCodec().decode(payload) == decoded
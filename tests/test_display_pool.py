@@ -0,0 +1,53 @@
+import time
+
+from display_pool import DisplayPool
+
+
+def test_acquire_is_idempotent():
+    pool = DisplayPool(base=10, size=3, per_display=2)
+    assert pool.acquire(1) == 10
+    assert pool.acquire(1) == 10
+    assert pool.snapshot() == {10: ["1"]}
+
+
+def test_packs_into_displays_in_use():
+    pool = DisplayPool(base=10, size=3, per_display=2)
+    assert [pool.acquire(ssrc) for ssrc in range(5)] == [10, 10, 11, 11, 12]
+    assert pool.acquire(5) == 12
+    assert pool.acquire(6) is None
+
+
+def test_prefer_only_with_room():
+    pool = DisplayPool(base=10, size=3, per_display=1)
+    assert pool.acquire(1, prefer=12) == 12
+    assert pool.acquire(2, prefer=12) == 10
+    assert pool.acquire(3, prefer=99) == 11
+
+
+def test_release_frees_display():
+    pool = DisplayPool(base=10, size=1, per_display=1)
+    pool.acquire(1)
+    assert pool.acquire(2) is None
+    pool.release(1)
+    assert pool.acquire(2) == 10
+
+
+def test_lease_expires():
+    pool = DisplayPool(base=10, size=1, per_display=1, lease_seconds=0.01)
+    pool.acquire(1)
+    time.sleep(0.02)
+    assert pool.snapshot() == {}
+    assert pool.acquire(2) == 10
+
+
+def test_renew_never_moves_a_lease():
+    pool = DisplayPool(base=10, size=2, per_display=1, lease_seconds=0.01)
+    assert pool.acquire(1) == 10
+    assert pool.renew(1, 10) == 10
+    # Venció y otro cliente tomó su display: la renovación falla en lugar de darle otro
+    time.sleep(0.02)
+    assert pool.acquire(2) == 10
+    assert pool.renew(1, 10) is None
+    assert pool.snapshot() == {10: ["2"]}
+    # Con lugar, la renovación tras vencer vuelve a tomar el mismo display
+    assert pool.renew(3, 11) == 11
@@ -0,0 +1,112 @@
+import time
+
+from buffer_pool import RecvBufferPool
+from jitter_buffer import FRAME_SIZE, SILENCE_FRAME, JitterBuffer
+
+
+def drain(jb):
+    out = []
+    while (item := jb.pop_next()) is not None:
+        out.append(item["payload"])
+    return out
+
+
+def test_in_order():
+    jb = JitterBuffer(prefill_min=1)
+    for seq in range(5):
+        jb.add_packet(seq, seq * FRAME_SIZE, bytes([seq]))
+    assert jb.ready_to_consume()
+    assert drain(jb) == [bytes([seq]) for seq in range(5)]
+    assert jb.get_size() == 0
+
+
+def test_wraparound_with_reordering():
+    jb = JitterBuffer(prefill_min=1)
+    # 0 llega antes que 65535: tiene que salir después
+    for seq in (65534, 0, 65535, 1):
+        jb.add_packet(seq, seq * FRAME_SIZE, seq.to_bytes(2, "big"))
+    assert drain(jb) == [seq.to_bytes(2, "big") for seq in (65534, 65535, 0, 1)]
+    stats = jb.get_stats()
+    assert stats["lost"] == 0 and stats["invalid_seq"] == 0
+
+
+def test_loss_after_max_wait_and_late_packet():
+    pool = RecvBufferPool(slots=4, slot_size=16)
+    jb = JitterBuffer(prefill_min=1, max_wait=0.01)
+    jb.add_packet(1, 0, b"a", pool.acquire())
+    jb.add_packet(3, 2 * FRAME_SIZE, b"c", pool.acquire())
+    first = jb.pop_next()
+    assert first["payload"] == b"a"
+    first["slot"].release()
+    # Falta el 2: se espera max_wait antes de rellenar con silencio
+    assert jb.pop_next() is None
+    time.sleep(0.02)
+    assert jb.pop_next()["payload"] == SILENCE_FRAME
+    assert jb.get_stats()["lost"] == 1
+    # El 2 llega tarde: se descarta y su slot vuelve al pool
+    jb.add_packet(2, FRAME_SIZE, b"b", pool.acquire())
+    assert jb.get_stats()["too_late"] == 1
+    third = jb.pop_next()
+    assert third["payload"] == b"c"
+    third["slot"].release()
+    assert pool.in_use() == 0
+
+
+def test_no_loss_declared_while_empty():
+    jb = JitterBuffer(prefill_min=1, max_wait=0)
+    jb.add_packet(1, 0, b"a")
+    assert drain(jb) == [b"a"]
+    time.sleep(0.01)
+    assert jb.pop_next() is None
+    assert jb.get_stats()["lost"] == 0
+
+
+def test_duplicate_releases_slot():
+    pool = RecvBufferPool(slots=4, slot_size=16)
+    jb = JitterBuffer(prefill_min=1)
+    jb.add_packet(1, 0, b"a", pool.acquire())
+    jb.add_packet(1, 0, b"a", pool.acquire())
+    assert jb.get_stats()["duplicates"] == 1
+    assert pool.in_use() == 1
+
+
+def test_dtx_gap_filled_without_loss():
+    jb = JitterBuffer(prefill_min=1, max_wait=0)
+    jb.add_packet(1, 0, b"a")
+    # Tres frames suprimidos: el siguiente tramo de voz llega con el seq siguiente y el bit M
+    jb.add_packet(2, 4 * FRAME_SIZE, b"b", marker=True)
+    assert drain(jb) == [b"a", SILENCE_FRAME, SILENCE_FRAME, SILENCE_FRAME, b"b"]
+    stats = jb.get_stats()
+    assert stats["dtx_frames"] == 3 and stats["talkspurts"] == 1 and stats["lost"] == 0
+
+
+def test_large_jump_needs_confirmation():
+    jb = JitterBuffer(prefill_min=1)
+    jb.add_packet(100, 0, b"a")
+    assert drain(jb) == [b"a"]
+    jb.add_packet(40000, 0, b"x")
+    assert jb.get_stats()["invalid_seq"] == 1
+    # El siguiente en secuencia confirma el salto (emisor reiniciado)
+    jb.add_packet(40001, FRAME_SIZE, b"y")
+    assert jb.get_stats()["resyncs"] == 1
+    assert drain(jb) == [b"y"]
+
+
+def test_closed_buffer_releases_late_slots():
+    pool = RecvBufferPool(slots=4, slot_size=16)
+    jb = JitterBuffer(prefill_min=1)
+    jb.add_packet(1, 0, b"a", pool.acquire())
+    jb.close()
+    assert pool.in_use() == 0
+    jb.add_packet(2, FRAME_SIZE, b"b", pool.acquire())
+    assert pool.in_use() == 0
+    assert jb.pop_next() is None
+
+
+def test_adaptive_estimator_ignores_duplicates():
+    jb = JitterBuffer(adaptive=True)
+    jb.add_packet(1, 0, b"a")
+    jb.add_packet(1, 123456, b"a")
+    assert jb.last_timestamp == 0
+    jb.add_packet(2, FRAME_SIZE, b"b")
+    assert jb.last_timestamp == FRAME_SIZE
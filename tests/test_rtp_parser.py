@@ -0,0 +1,60 @@
+import struct
+
+from rtp_parser import parse_rtp_header
+
+
+def rtp_packet(payload=b"\x01\x02\x03\x04", seq=7, timestamp=960, ssrc=0xDEADBEEF, marker=False,
+               payload_type=96, csrcs=(), extension=None, padding=0):
+    b0 = 0x80 | len(csrcs)
+    if extension is not None:
+        b0 |= 0x10
+    if padding:
+        b0 |= 0x20
+    packet = struct.pack("!BBHII", b0, (marker << 7) | payload_type, seq, timestamp, ssrc)
+    packet += b"".join(struct.pack("!I", c) for c in csrcs)
+    if extension is not None:
+        packet += struct.pack("!HH", 0xBEDE, len(extension) // 4) + extension
+    packet += payload
+    if padding:
+        packet += bytes(padding - 1) + bytes([padding])
+    return packet
+
+
+def test_fixed_header():
+    ssrc, seq, timestamp, marker, payload_type, payload = parse_rtp_header(rtp_packet())
+    assert (ssrc, seq, timestamp, marker, payload_type) == (0xDEADBEEF, 7, 960, 0, 96)
+    assert bytes(payload) == b"\x01\x02\x03\x04"
+
+
+def test_marker_and_payload_type():
+    parsed = parse_rtp_header(rtp_packet(marker=True, payload_type=98))
+    assert parsed[3] == 1
+    assert parsed[4] == 98
+
+
+def test_payload_is_a_view_without_copy():
+    data = bytearray(rtp_packet())
+    payload = parse_rtp_header(data)[5]
+    data[-1] = 0xFF
+    assert payload[-1] == 0xFF
+
+
+def test_csrc_extension_and_padding_are_skipped():
+    packet = rtp_packet(payload=b"audio", csrcs=(1, 2), extension=bytes(8), padding=3)
+    assert bytes(parse_rtp_header(packet)[5]) == b"audio"
+
+
+def test_rejects_short_and_wrong_version():
+    assert parse_rtp_header(b"\x80\x60") is None
+    assert parse_rtp_header(b"HANDSHAKE:12345") is None
+    assert parse_rtp_header(b"\x40" + rtp_packet()[1:]) is None
+
+
+def test_rejects_truncated_extension_and_bad_padding():
+    # La extensión dice tener más palabras de las que trae el datagrama
+    packet = rtp_packet(payload=b"", extension=b"")
+    packet = packet[:12] + struct.pack("!HH", 0xBEDE, 10)
+    assert parse_rtp_header(packet) is None
+    # Padding de 0 bytes o más largo que el paquete
+    assert parse_rtp_header(rtp_packet(padding=1)[:-1] + b"\x00") is None
+    assert parse_rtp_header(rtp_packet(payload=b"", padding=1)[:-1] + b"\xff") is None
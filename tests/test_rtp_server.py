@@ -0,0 +1,39 @@
+import asyncio
+import socket
+
+import rtp_server
+from rtp_server import RTPDatagramProtocol
+
+
+def test_async_receiver_drains_burst_in_batches(monkeypatch):
+    received = []
+    monkeypatch.setattr(rtp_server, "handle_datagram", lambda data, addr: received.append(data))
+    monkeypatch.setitem(rtp_server.rx_stats, "batches", 0)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.setblocking(False)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    burst = [i.to_bytes(2, "big") for i in range(20)]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        # La ráfaga queda en el socket antes de que el event loop lo mire
+        for data in burst:
+            sender.sendto(data, sock.getsockname())
+        transport, _ = await loop.create_datagram_endpoint(lambda: RTPDatagramProtocol(sock, batch_size=8), sock=sock)
+        try:
+            for _ in range(100):
+                if len(received) == len(burst):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            transport.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        sender.close()
+        sock.close()
+    assert received == burst
+    # Lotes de hasta 8: 20 datagramas en 3 vueltas del event loop, no 20
+    assert rtp_server.rx_stats["batches"] == 3
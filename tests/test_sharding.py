@@ -0,0 +1,41 @@
+import socket
+import struct
+
+import pytest
+
+from sharding import attach_ssrc_steering, ssrc_steering_program
+
+
+def test_program_bytes():
+    assert ssrc_steering_program(4) == (struct.pack("HBBI", 0x20, 0, 0, 8)
+                                        + struct.pack("HBBI", 0x94, 0, 0, 4)
+                                        + struct.pack("HBBI", 0x16, 0, 0, 0))
+
+
+def test_steering_by_ssrc():
+    if not hasattr(socket, "SO_REUSEPORT"):
+        pytest.skip("SO_REUSEPORT no disponible")
+    num_shards = 2
+    sockets = []
+    port = 0
+    for _ in range(num_shards):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("127.0.0.1", port))
+        sock.settimeout(1)
+        port = sock.getsockname()[1]
+        sockets.append(sock)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        error = attach_ssrc_steering(sockets[0], num_shards)
+        if error is not None:
+            pytest.skip(f"cBPF de SO_REUSEPORT no soportado: {error}")
+        for ssrc in range(4):
+            sender.sendto(struct.pack("!BBHII", 0x80, 96, 0, 0, ssrc), ("127.0.0.1", port))
+            # El mismo socket emisor: sin el programa, el hash de la 4-tupla los mandaría todos al mismo
+            data = sockets[ssrc % num_shards].recv(64)
+            assert struct.unpack_from("!I", data, 8)[0] == ssrc
+    finally:
+        sender.close()
+        for sock in sockets:
+            sock.close()